@@ -1,32 +1,55 @@
 import asyncio
+import hashlib
+import importlib
 import json
 import os
+import socket
+import time
 from pathlib import Path
-from typing import Dict, List, Optional, Set
-from datetime import datetime
+from typing import TYPE_CHECKING, Deque, Dict, List, Optional, Set
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+
+# Everything below counts toward the import time reported by /health
+APP_IMPORT_STARTED = time.perf_counter()
 
-import google.generativeai as genai
 import httpx
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, StreamingResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
+import shutil
 import subprocess
 import tempfile
+import threading
+import uuid
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
-from youtube_transcript_api import YouTubeTranscriptApi
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
-from google_auth_oauthlib.flow import Flow
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
 from fastapi.responses import RedirectResponse
 import pickle
-import yt_dlp
-from openai import OpenAI
+
+from audio_chunks import detect_silences, extract_speech_audio, plan_chunks, probe_duration, split_audio
+from code_context import CodeContextIndex, editor_filename, estimate_tokens
+from context_diff import compact_patch
+from hint_bundle import HintBundle, code_fingerprint, is_hint_request
+from judge import Judge, ProblemRegistry
+from metrics import REGISTRY, Counter, Gauge, Histogram
+from model_router import ModelRouter, parse_prices, parse_routes, parse_spec
+from prefetch import LruCache, PrefetchGroup, SingleFlight
+from prompts import SYSTEM_PROMPT
+from state_backend import create_state_backend
+from static_assets import PrecompressedStaticFiles, asset_response
+from transcript_search import ChunkIndex, build_chunks
+from tracing import Trace, current_trace, log, mark, use_trace
+from transcript_store import SegmentIndex, TranscriptStore, normalize_segments
+from workspace_watch import IgnoreRules, PrunedWatcher, is_probably_binary
+from ws_codec import WireCodec
+
+# Heavy client libraries (Gemini, OpenAI, Google API/OAuth, yt-dlp,
+# youtube-transcript-api) are imported on first use; see import_async().
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
 
 
 load_dotenv()
@@ -35,6 +58,8 @@ BASE_DIR = Path(__file__).resolve().parent
 FRONTEND_DIR = BASE_DIR / "frontend"
 WORKSPACE_DIR = Path(os.getenv("WORKSPACE_DIR", BASE_DIR))
 
+startup_import_seconds = round(time.perf_counter() - APP_IMPORT_STARTED, 3)
+
 app = FastAPI(title="VelocityAI - Learn LeetCode at Lightning Speed")
 
 # Add CORS middleware to allow frontend requests
@@ -46,11 +71,38 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Mount static frontend assets
+# Requests that are too frequent or too cheap to be worth a trace line
+UNTRACED_PATH_PREFIXES = ("/static", "/health", "/metrics")
+
+
+@app.middleware("http")
+async def trace_requests(request, call_next):
+    """Give each HTTP request a trace id (X-Trace-Id) and a logged stage timeline."""
+    if request.url.path.startswith(UNTRACED_PATH_PREFIXES):
+        return await call_next(request)
+
+    trace = Trace("http", f"{request.method} {request.url.path}")
+    with use_trace(trace):
+        trace.mark("received")
+        status = 500
+        try:
+            response = await call_next(request)
+            trace.mark("done")
+            status = response.status_code
+            response.headers["X-Trace-Id"] = trace.trace_id
+            return response
+        finally:
+            # For streamed responses this is when the headers went out
+            trace.mark("sent")
+            trace.finish(status=status)
+
+
+# Mount static frontend assets (precompressed variants and cache headers,
+# see static_assets.py)
 if FRONTEND_DIR.exists():
     app.mount(
         "/static",
-        StaticFiles(directory=FRONTEND_DIR, html=True),
+        PrecompressedStaticFiles(directory=FRONTEND_DIR, html=True),
         name="frontend",
     )
 
@@ -58,40 +110,306 @@ if FRONTEND_DIR.exists():
 # Configuration
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+GEMINI_FAST_MODEL = os.getenv("GEMINI_FAST_MODEL", "gemini-2.5-flash-lite")
+GEMINI_STRONG_MODEL = os.getenv("GEMINI_STRONG_MODEL", "gemini-2.5-pro")
 ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY")
 ELEVENLABS_VOICE_ID = os.getenv("ELEVENLABS_VOICE_ID")
 YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY")
 YOUTUBE_OAUTH_CLIENT_SECRET = os.getenv("YOUTUBE_OAUTH_CLIENT_SECRET", "client_secret.json")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
+# Upstream endpoints, overridable so benchmarks can run against local stand-ins
+# (OPENAI_BASE_URL is read by the OpenAI client itself)
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")
+ELEVENLABS_API_BASE = os.getenv("ELEVENLABS_API_BASE", "https://api.elevenlabs.io").rstrip("/")
+TRANSCRIPT_SCRAPER_URL = os.getenv("TRANSCRIPT_SCRAPER_URL")  # GET {url}/{video_id} -> segments
+
+# Whisper chunking: speech-grade audio split at silences, transcribed in parallel
+WHISPER_AUDIO_BITRATE = os.getenv("WHISPER_AUDIO_BITRATE", "32k")
+WHISPER_CHUNK_SECONDS = float(os.getenv("WHISPER_CHUNK_SECONDS", "180"))
+WHISPER_MAX_PARALLEL = int(os.getenv("WHISPER_MAX_PARALLEL", "6"))
+
 # OAuth2 Configuration
 SCOPES = ['https://www.googleapis.com/auth/youtube.force-ssl']
 TOKEN_FILE = BASE_DIR / "youtube_token.pickle"
+YOUTUBE_TOKEN_REFRESH_MARGIN = int(os.getenv("YOUTUBE_TOKEN_REFRESH_MARGIN", "300"))  # seconds
+# Floor on the refresh loop's interval, so a tiny margin can't make it spin
+YOUTUBE_TOKEN_REFRESH_MIN_INTERVAL = 30  # seconds
 
-# Whisper transcription cache
+# Whisper working directory and legacy per-video JSON caches
 TRANSCRIPTS_CACHE_DIR = BASE_DIR / "transcripts_cache"
 TRANSCRIPTS_CACHE_DIR.mkdir(parents=True, exist_ok=True)
 
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
+# Transcript store (single SQLite database bundled into the image)
+TRANSCRIPTS_DB = Path(os.getenv("TRANSCRIPTS_DB", BASE_DIR / "transcripts.db"))
+transcript_store = TranscriptStore(TRANSCRIPTS_DB)
+
+# How long a transcript request waits on a running job before returning 202
+TRANSCRIPT_WAIT_SECONDS = float(os.getenv("TRANSCRIPT_WAIT_SECONDS", "20"))
+# How long video chat waits on a transcript fetch before answering without one
+VIDEO_CHAT_TRANSCRIPT_WAIT_SECONDS = float(os.getenv("VIDEO_CHAT_TRANSCRIPT_WAIT_SECONDS", "10"))
+
+# Number of BM25-ranked transcript chunks included in video chat prompts
+TRANSCRIPT_TOP_K = int(os.getenv("TRANSCRIPT_TOP_K", "4"))
+
+# /execute runs submissions in worker threads, this many at a time
+EXECUTE_MAX_PARALLEL = int(os.getenv("EXECUTE_MAX_PARALLEL", "4"))
+
+# Problem registry with hidden tests; /execute judges by problem_id (see judge.py)
+PROBLEMS_FILE = Path(os.getenv("PROBLEMS_FILE", BASE_DIR / "problems.json"))
+JUDGE_CACHE_DIR = Path(os.getenv("JUDGE_CACHE_DIR", Path(tempfile.gettempdir()) / "velocity-judge"))
+JUDGE_TEST_TIMEOUT = float(os.getenv("JUDGE_TEST_TIMEOUT", "5"))
+problem_registry = ProblemRegistry.load(PROBLEMS_FILE)
+judge = Judge(problem_registry, JUDGE_CACHE_DIR, JUDGE_TEST_TIMEOUT)
+
+# Speculative prefetch when a problem is opened (see prefetch.py). Prefetch
+# work takes one of PREFETCH_MAX_PARALLEL slots so it never crowds out real requests
+PREFETCH_MAX_PARALLEL = int(os.getenv("PREFETCH_MAX_PARALLEL", "2"))
+TTS_CACHE_BYTES = int(os.getenv("TTS_CACHE_BYTES", str(32 * 1024 * 1024)))
+prefetch_slots = asyncio.Semaphore(PREFETCH_MAX_PARALLEL)
+tts_cache = LruCache(max_entries=512, max_size=TTS_CACHE_BYTES)
+tts_flights = SingleFlight()
+opening_turns = LruCache(max_entries=128)  # problem slug -> mentor's opening turn
+opening_flights = SingleFlight()
+
+# Precomputed hint ladders from generate_hints.py (see hint_bundle.py); served
+# for hint requests while the student's code is still the starter code
+HINT_BUNDLE = Path(os.getenv("HINT_BUNDLE", BASE_DIR / "hints.bundle"))
+hint_bundle = HintBundle.load(HINT_BUNDLE)
+
+# Model tiers per request class, fastest-suitable first (see model_router.py).
+# MODEL_ROUTES / MODEL_P95_BUDGETS override single routes, e.g.
+# MODEL_ROUTES="mentor=gemini-2.5-flash"
+MODEL_ROUTES = {
+    "mentor": [GEMINI_FAST_MODEL, GEMINI_MODEL],
+    "visualization": [GEMINI_STRONG_MODEL, GEMINI_MODEL],
+    "video_chat": [GEMINI_MODEL, GEMINI_FAST_MODEL],
+    **parse_routes(os.getenv("MODEL_ROUTES", "")),
+}
+MODEL_P95_BUDGETS = {
+    "mentor": 3.0,
+    "visualization": 30.0,
+    "video_chat": 8.0,
+    **{route: float(v) for route, v in parse_spec(os.getenv("MODEL_P95_BUDGETS", "")).items()},
+}
+model_router = ModelRouter(
+    {route: list(dict.fromkeys(models)) for route, models in MODEL_ROUTES.items()},
+    MODEL_P95_BUDGETS,
+    max_error_rate=float(os.getenv("MODEL_MAX_ERROR_RATE", "0.25")),
+    window=int(os.getenv("MODEL_STATS_WINDOW", "50")),
+    min_samples=int(os.getenv("MODEL_MIN_SAMPLES", "10")),
+    cooldown=float(os.getenv("MODEL_TRIP_COOLDOWN", "60")),
+    prices=parse_prices(os.getenv("MODEL_PRICES", "")),
+)
+
+# Metrics (exposed at /metrics)
+gemini_latency = Histogram(
+    "velocity_gemini_request_seconds", "Gemini generate_content latency by call site.",
+    ["call_site", "outcome"],
+)
+model_latency = Histogram(
+    "velocity_model_request_seconds", "Model call latency by route and model.",
+    ["route", "model", "outcome"],
+)
+model_tokens = Counter(
+    "velocity_model_tokens_total", "Tokens used by route, model and direction.",
+    ["route", "model", "direction"],
+)
+model_cost = Counter(
+    "velocity_model_cost_usd_total", "Estimated model spend in USD by route and model.",
+    ["route", "model"],
+)
+model_failovers = Counter(
+    "velocity_model_failovers_total", "Calls retried on the next tier after an error.",
+    ["route", "model"],
+)
+model_trips = Counter(
+    "velocity_model_trips_total", "Tiers taken out of rotation, by reason.",
+    ["route", "model", "reason"],
+)
+tts_first_byte = Histogram(
+    "velocity_tts_first_byte_seconds", "Time from TTS request to the first audio byte.",
+)
+tts_stream_duration = Histogram(
+    "velocity_tts_stream_seconds", "Total TTS stream time.", ["outcome"],
+)
+transcript_lookups = Counter(
+    "velocity_transcript_lookups_total", "Transcript lookups by source method and cache tier.",
+    ["route", "method", "tier"],
+)
+execute_queue_wait = Histogram(
+    "velocity_execute_queue_seconds", "Time /execute submissions wait for a runner slot.",
+)
+execute_run_time = Histogram(
+    "velocity_execute_run_seconds", "Time spent running a submission's test cases.",
+)
+ws_connections = Gauge("velocity_ws_connections", "Open /ws connections.")
+ws_messages = Counter(
+    "velocity_ws_messages_total", "/ws messages by direction and type.", ["direction", "type"],
+)
+ws_bytes_sent = Counter("velocity_ws_bytes_sent_total", "Encoded bytes sent to /ws clients.")
+ws_frames_conflated = Counter(
+    "velocity_ws_frames_conflated_total", "Queued context frames replaced by newer content.",
+)
+ws_clients_dropped = Counter(
+    "velocity_ws_clients_dropped_total", "/ws clients disconnected for overflow or send failure.",
+)
+ws_queue_high_water = Gauge("velocity_ws_send_queue_high_water", "Deepest /ws send queue seen.")
+cache_lookups = Counter(
+    "velocity_cache_lookups_total", "Lookups in prefetch-warmed caches (hit, joined in-flight work, miss).",
+    ["cache", "result"],
+)
+hint_lookups = Counter(
+    "velocity_hint_lookups_total", "Hint requests by whether a precomputed hint was served.", ["result"],
+)
+prefetch_steps = Counter(
+    "velocity_prefetch_steps_total", "Prefetch steps by outcome.", ["step", "outcome"],
+)
+
+WS_MESSAGE_TYPES = {
+    "hello", "user_message", "request_context", "visualization_request",
+    "prefetch", "prefetch_cancel", "opening_turn",
+}
+
+# Reply frames that complete a traced /ws request (and may carry a "debug" timeline)
+TRACED_REPLY_TYPES = {"llm_message", "visualization_response"}
+
+# Modules imported in the background after startup so the first real request
+# doesn't pay for them (comma-separated; empty disables the warm-up)
+WARMUP_MODULES = [
+    m.strip() for m in os.getenv("WARMUP_MODULES", "google.generativeai,openai").split(",") if m.strip()
+]
+
+# Cold-start timings, reported by /health
+startup_report: Dict = {"import_seconds": startup_import_seconds, "startup_seconds": None, "watcher_seconds": None, "judge_seconds": None, "warmup": {}}
+
+
+# Fully imported lazy modules (sys.modules also holds ones still mid-import)
+_lazy_modules: Dict[str, object] = {}
+
+
+async def import_async(name: str):
+    """Import a module without blocking the event loop on its first import."""
+    module = _lazy_modules.get(name)
+    if module is None:
+        # Waits on the import lock if the warm-up is importing it right now
+        module = await asyncio.to_thread(importlib.import_module, name)
+        _lazy_modules[name] = module
+    return module
+
+
+_gemini_configured = False
+
+
+async def gemini_client():
+    """google.generativeai, configured on first use."""
+    global _gemini_configured
+    genai = await import_async("google.generativeai")
+    if not _gemini_configured:
+        if GEMINI_API_ENDPOINT:
+            genai.configure(
+                api_key=GEMINI_API_KEY,
+                transport="rest",
+                client_options={"api_endpoint": GEMINI_API_ENDPOINT},
+            )
+        else:
+            genai.configure(api_key=GEMINI_API_KEY)
+        _gemini_configured = True
+    return genai
 
 # OAuth2 Helper Functions
+# Credentials and the discovery-built YouTube client are kept in memory;
+# youtube_token.pickle is only read once and written after a refresh.
+_youtube_creds: Optional["Credentials"] = None
+_youtube_creds_loaded = False
+_youtube_service = None
+_youtube_lock = threading.Lock()
+
+
 def get_youtube_credentials():
-    """Get OAuth2 credentials for YouTube API."""
-    creds = None
+    """Get OAuth2 credentials for YouTube API, refreshing shortly before expiry.
+
+    Blocking (disk + token refresh); call via asyncio.to_thread from async code.
+    """
+    global _youtube_creds, _youtube_creds_loaded
+
+    with _youtube_lock:
+        # Load existing token
+        if not _youtube_creds_loaded:
+            if TOKEN_FILE.exists():
+                with open(TOKEN_FILE, 'rb') as token:
+                    _youtube_creds = pickle.load(token)
+            _youtube_creds_loaded = True
+
+        creds = _youtube_creds
+        if not creds:
+            return None
+
+        # Refresh if expired or about to expire
+        expires_soon = creds.expiry is not None and (
+            creds.expiry - datetime.utcnow() < timedelta(seconds=YOUTUBE_TOKEN_REFRESH_MARGIN)
+        )
+        if (creds.expired or expires_soon) and creds.refresh_token:
+            from google.auth.transport.requests import Request
+            creds.refresh(Request())
+            with open(TOKEN_FILE, 'wb') as token:
+                pickle.dump(creds, token)
+
+        return creds if creds.valid else None
 
-    # Load existing token
-    if TOKEN_FILE.exists():
-        with open(TOKEN_FILE, 'rb') as token:
-            creds = pickle.load(token)
 
-    # Refresh if expired
-    if creds and creds.expired and creds.refresh_token:
-        creds.refresh(Request())
+def set_youtube_credentials(creds: "Credentials"):
+    """Persist freshly authorized credentials and swap them in."""
+    global _youtube_creds, _youtube_creds_loaded, _youtube_service
+
+    with _youtube_lock:
         with open(TOKEN_FILE, 'wb') as token:
             pickle.dump(creds, token)
+        _youtube_creds = creds
+        _youtube_creds_loaded = True
+        _youtube_service = None
+
+
+def get_youtube_service(creds: "Credentials"):
+    """Return the YouTube Data API client, built once per set of credentials.
+
+    Refreshes update the Credentials object in place, so the client stays
+    valid until set_youtube_credentials() swaps in a new authorization.
+    """
+    global _youtube_service
 
-    return creds if creds and creds.valid else None
+    with _youtube_lock:
+        if _youtube_service is None:
+            from googleapiclient.discovery import build
+            _youtube_service = build('youtube', 'v3', credentials=creds, cache_discovery=False)
+        return _youtube_service
+
+
+def authorized_http(creds: "Credentials"):
+    """A per-call authorized transport; httplib2 connections aren't thread-safe."""
+    import httplib2
+    from google_auth_httplib2 import AuthorizedHttp
+    return AuthorizedHttp(creds, http=httplib2.Http(timeout=30))
+
+
+async def keep_youtube_credentials_fresh():
+    """Background loop that refreshes the OAuth token before it expires."""
+    interval = max(YOUTUBE_TOKEN_REFRESH_MARGIN / 2, YOUTUBE_TOKEN_REFRESH_MIN_INTERVAL)
+    while True:
+        try:
+            if await asyncio.to_thread(get_youtube_credentials) is None:
+                log("youtube_token_refresh_stopped", level="warning", reason="no valid credentials")
+                return
+        except Exception as e:
+            log("youtube_token_refresh_failed", level="warning", error=str(e))
+        await asyncio.sleep(interval)
+
+
+def start_youtube_refresher():
+    """Start the token refresh loop unless it is already running."""
+    task = getattr(app.state, "youtube_refresher", None)
+    if task is None or task.done():
+        app.state.youtube_refresher = asyncio.create_task(keep_youtube_credentials_fresh())
 
 
 async def transcribe_youtube_with_whisper(video_id: str):
@@ -99,43 +417,52 @@ async def transcribe_youtube_with_whisper(video_id: str):
     if not OPENAI_API_KEY:
         raise Exception("OpenAI API key not configured")
 
-    # Check cache first
-    cache_file = TRANSCRIPTS_CACHE_DIR / f"{video_id}.json"
-    if cache_file.exists():
-        print(f"📦 Using cached transcript for {video_id}")
-        with open(cache_file, 'r') as f:
-            return json.load(f)
+    # Check the store first
+    cached = await asyncio.to_thread(transcript_store.get, video_id)
+    if cached:
+        log("whisper_skipped_stored", video_id=video_id)
+        return cached['segments']
 
-    print(f"🎤 Transcribing {video_id} with Whisper...")
+    log("whisper_started", video_id=video_id)
 
-    # Download audio from YouTube
-    audio_file = TRANSCRIPTS_CACHE_DIR / f"{video_id}.mp3"
+    # Per-job scratch directory so concurrent jobs never share files
+    work_dir = Path(tempfile.mkdtemp(prefix=f"{video_id}-", dir=TRANSCRIPTS_CACHE_DIR))
 
+    # Download the smallest audio stream as-is; we re-encode once below
     ydl_opts = {
-        'format': 'bestaudio/best',
-        'postprocessors': [{
-            'key': 'FFmpegExtractAudio',
-            'preferredcodec': 'mp3',
-            'preferredquality': '192',
-        }],
-        'outtmpl': str(TRANSCRIPTS_CACHE_DIR / f'{video_id}.%(ext)s'),
+        'format': 'bestaudio[abr<=96]/bestaudio/best',
+        'outtmpl': str(work_dir / 'source.%(ext)s'),
         'quiet': True,
         # Bypass YouTube bot detection
         'extractor_args': {'youtube': {'player_client': ['android', 'web']}},
         'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
     }
 
-    try:
-        # Download audio
+    def prepare_chunks():
+        import yt_dlp
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
             ydl.download([f'https://www.youtube.com/watch?v={video_id}'])
+        source = next(work_dir.glob('source.*'))
 
-        print(f"📥 Downloaded audio, now transcribing...")
+        # Mono 16 kHz at a speech bitrate, then split at silences
+        audio_file = extract_speech_audio(source, work_dir / 'speech.mp3', WHISPER_AUDIO_BITRATE)
+        source.unlink()
+        duration = probe_duration(audio_file)
+        chunks = plan_chunks(duration, detect_silences(audio_file), WHISPER_CHUNK_SECONDS)
+        return chunks, split_audio(audio_file, chunks, work_dir)
+
+    try:
+        # Download and ffmpeg work run in a thread to avoid blocking
+        chunks, chunk_files = await asyncio.to_thread(prepare_chunks)
 
-        # Transcribe with Whisper (run in thread to avoid blocking)
-        def transcribe_audio():
-            client = OpenAI(api_key=OPENAI_API_KEY)
-            with open(audio_file, 'rb') as audio:
+        log("whisper_audio_ready", video_id=video_id, chunks=len(chunk_files))
+
+        openai = await import_async("openai")
+        client = openai.OpenAI(api_key=OPENAI_API_KEY)
+        semaphore = asyncio.Semaphore(WHISPER_MAX_PARALLEL)
+
+        def transcribe_audio(chunk_file: Path):
+            with open(chunk_file, 'rb') as audio:
                 return client.audio.transcriptions.create(
                     model="whisper-1",
                     file=audio,
@@ -143,113 +470,35 @@ async def transcribe_youtube_with_whisper(video_id: str):
                     timestamp_granularities=["segment"]
                 )
 
-        transcript_response = await asyncio.to_thread(transcribe_audio)
+        async def transcribe_chunk(chunk_file: Path):
+            async with semaphore:
+                return await asyncio.to_thread(transcribe_audio, chunk_file)
 
-        # Convert to our format
-        segments = []
-        for segment in transcript_response.segments:
-            segments.append({
-                'start': segment.start,
-                'duration': segment.end - segment.start,
-                'text': segment.text.strip()
-            })
+        responses = await asyncio.gather(*(transcribe_chunk(f) for f in chunk_files))
 
-        # Cache the result
-        with open(cache_file, 'w') as f:
-            json.dump(segments, f)
+        # Convert to our format, shifting each chunk by its offset in the video
+        segments = []
+        for (offset, _), transcript_response in zip(chunks, responses):
+            for segment in transcript_response.segments or []:
+                segments.append({
+                    'start': offset + segment.start,
+                    'duration': segment.end - segment.start,
+                    'text': segment.text.strip()
+                })
 
-        # Clean up audio file to save space
-        if audio_file.exists():
-            audio_file.unlink()
+        # Persist the result
+        await asyncio.to_thread(transcript_store.put, video_id, segments, "whisper")
 
-        print(f"✅ Whisper transcription complete: {len(segments)} segments")
+        log("whisper_complete", video_id=video_id, segments=len(segments))
         return segments
 
     except Exception as e:
-        # Clean up on error
-        if audio_file.exists():
-            audio_file.unlink()
-        print(f"❌ Whisper error details: {type(e).__name__}: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log("whisper_failed", level="error", video_id=video_id, error=f"{type(e).__name__}: {e}")
         raise Exception(f"Whisper transcription failed: {type(e).__name__}: {str(e)}")
 
-SYSTEM_PROMPT = """You are Vela, an expert AI coding mentor for LeetCode-style problems, focused on teaching through guided discovery.
-
-STRICT RULES YOU MUST FOLLOW:
-❌ Do NOT provide complete solutions or full code unless explicitly asked with phrases like "give me the solution" or "show me the code"
-❌ Do NOT jump to the final algorithm immediately
-❌ Do NOT assume missing constraints — always ask first
-❌ NEVER ask users to "paste their code" - you can ALREADY see it automatically!
-
-CODE CONTEXT AWARENESS:
-✅ You ALWAYS have access to the user's code automatically in the "Code context" section
-✅ When a user says "look at my code" or "I have an implementation" - CHECK the code context immediately
-✅ DO NOT ask them to paste code - you can already see it!
-✅ Reference their code directly: "I see you're using a hash map here..."
-✅ If no code is provided in the context, you can ask them to type it in the editor
-✅ The code updates automatically as they type
-
-YOUR RESPONSIBILITIES:
-1. START by asking clarifying questions about:
-   - Input constraints (size, range, special cases)
-   - Output format and expectations
-   - Edge cases they're considering
-   - Time/space complexity requirements
-
-2. GUIDE them to identify the core pattern:
-   - Ask: "What patterns do you see here?"
-   - Hint at categories: two pointers, sliding window, DP, graph, greedy, hash map, etc.
-   - Let THEM make the connection
-
-3. BREAK problems into small logical steps:
-   - Give progressive hints, not answers
-   - Ask: "What would be your first step?"
-   - Validate their thinking before moving forward
-
-4. LET THEM propose the approach first:
-   - Ask: "How would you approach this?"
-   - Listen to their ideas before offering guidance
-   - Build on their thinking
-
-5. IF their approach is wrong or inefficient:
-   - Explain WHY it won't work (with examples)
-   - Gently redirect: "Have you considered...?"
-   - Don't just give the right answer
-
-6. HIGHLIGHT edge cases and pitfalls:
-   - Ask: "What could go wrong here?"
-   - Point out common mistakes without solving them
-   - Let them figure out the fix
-
-7. ONLY when they explicitly say "give me the optimized solution" or similar, provide:
-   - The final algorithm explanation
-   - Clean, well-commented code
-   - Time and space complexity analysis
-   - Trade-offs and alternatives
-
-COMMUNICATION STYLE:
-- Keep responses SHORT for voice playback (1-3 sentences max)
-- Ask ONE question at a time, then WAIT for their response
-- DO NOT ask multiple questions in one response
-- After they answer, ask the NEXT question
-- Think: natural conversation, not an interview
-- Use the provided code context to reference their actual work
-- Be encouraging and collaborative, not condescending
-- Think like a pair programming partner, not a teacher lecturing
-
-VOICE CONVERSATION RULES:
-- ONE question per response (very important!)
-- Keep it conversational and natural
-- Let them answer before asking more
-- Build on their previous answer
-- Short, focused exchanges work best for voice
-- Avoid using quotes/backticks for emphasis - say words naturally instead
-- Example: Say "the nums array" NOT "the 'nums' array"
-- Example: Say "O of N squared" NOT "O(N^2)"
-
-Remember: Your goal is to make them THINK, not to make them COPY. Guide, don't solve. ONE question at a time!
-"""
+    finally:
+        # Clean up audio files to save space
+        shutil.rmtree(work_dir, ignore_errors=True)
 
 VISUALIZATION_PROMPT = """You are an expert algorithm visualization engine. Your job is to generate animated, step-by-step visualizations of data structures and algorithms with synchronized voice narration.
 
@@ -396,11 +645,220 @@ WATCHED_EXTENSIONS = {'.py', '.js', '.ts', '.jsx', '.tsx', '.java', '.cpp', '.c'
 
 # Context limits
 MAX_FILES_IN_CONTEXT = 5  # Only keep the most recent N files
-MAX_FILE_SIZE = 10000  # Max characters per file
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2500"))  # Code tokens per prompt
+
+# Per-connection /ws limits: model calls running at once (cheap messages like
+# request_context never wait for one), and requests queued + running
+WS_MAX_CONCURRENT_REQUESTS = int(os.getenv("WS_MAX_CONCURRENT_REQUESTS", "3"))
+WS_MAX_PENDING_REQUESTS = int(os.getenv("WS_MAX_PENDING_REQUESTS", "16"))
+
+# Per-connection outbound queue: size, overflow policy ("conflate" or "drop"),
+# and how long one frame may take to send before the client counts as dead
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "64"))
+WS_OVERFLOW_POLICY = os.getenv("WS_OVERFLOW_POLICY", "conflate")
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "10"))
+
+# Quiet period before a burst of file events for one path is processed
+WATCH_DEBOUNCE_SECONDS = float(os.getenv("WATCH_DEBOUNCE_SECONDS", "0.3"))
+
+# Files larger than this are never read into context
+WATCH_MAX_FILE_BYTES = int(os.getenv("WATCH_MAX_FILE_BYTES", "262144"))
+
+# Extra gitignore-style rules on top of the workspace .gitignore/.velocityignore
+WATCH_IGNORE_FILE = os.getenv("WATCH_IGNORE_FILE")
+# Cap on inotify watches before watching the whole workspace recursively
+WATCH_MAX_ROOTS = int(os.getenv("WATCH_MAX_ROOTS", "64"))
+
+# Shared context state for multi-worker / multi-instance runs (see state_backend.py).
+# Only the holder of the watcher lease watches the workspace and publishes updates.
+STATE_BACKEND_URL = os.getenv("STATE_BACKEND_URL", "memory://")
+WATCH_LEASE_SECONDS = int(os.getenv("WATCH_LEASE_SECONDS", "30"))
+# Longest wait between attempts after the watcher fails to start
+WATCH_START_MAX_BACKOFF = float(os.getenv("WATCH_START_MAX_BACKOFF", "300"))
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+state_backend = create_state_backend(STATE_BACKEND_URL)
+
+class ClientConnection:
+    """Per-socket state for a /ws client.
+
+    Inbound messages run as concurrent tasks; their model calls take one of
+    WS_MAX_CONCURRENT_REQUESTS slots, so cheap messages never queue behind them.
+    Outbound frames go through a bounded queue drained by this client's own
+    writer task, so a slow client never delays broadcasts to anyone else.
+    Frames are encoded with the codec negotiated by the client's hello
+    (JSON text until then; see ws_codec.py).
+    When the queue is full, WS_OVERFLOW_POLICY decides: "conflate" replaces a
+    queued context frame for the same file with the newest full content,
+    "drop" disconnects the client.
+    """
+
+    def __init__(self, websocket: WebSocket, accepts_patches: bool = False, debug: bool = False):
+        self.websocket = websocket
+        self.debug = debug  # attach stage timelines to every reply
+        # filename -> version this client holds; None if it doesn't take patches
+        self.file_versions: Optional[Dict[str, int]] = {} if accepts_patches else None
+        self.history: List[Dict[str, str]] = []
+        self.hint_steps: Dict[str, int] = {}  # problem slug -> precomputed hints served
+        # Mentor turns stay sequential so history is consistent
+        self.turn_lock = asyncio.Lock()
+        self.slots = asyncio.Semaphore(WS_MAX_CONCURRENT_REQUESTS)  # held only around upstream calls
+        self.tasks: Set[asyncio.Task] = set()
+        self.prefetch: Optional[PrefetchGroup] = None  # warm-up for the problem the client has open
+
+        self.outbox: Deque[Dict] = deque()
+        self.queued_context: Dict[str, Dict] = {}  # filename -> frame still in outbox
+        self.pending_traces: Dict[int, Trace] = {}  # id(reply frame) -> trace finished once sent
+        self.closed = False
+        self.codec = WireCodec()
+        # Takes over once the hello reply (still encoded with the old codec) is sent
+        self.pending_codec: Optional[WireCodec] = None
+        self._wakeup = asyncio.Event()
+        self.writer = asyncio.create_task(self._run_writer())
+
+    async def send(self, message: Dict, request_id: Optional[str] = None):
+        """Queue a reply frame for this client.
+
+        A final reply (TRACED_REPLY_TYPES) marks the active trace "done",
+        carries its timeline as "debug" when asked, and marks "sent" once the
+        writer has actually sent it.
+        """
+        if request_id is not None:
+            message = {**message, "request_id": request_id}
+        trace = current_trace()
+        if trace is not None and message.get("type") in TRACED_REPLY_TYPES:
+            trace.mark("done")
+            if trace.debug:
+                message = {**message, "debug": trace.to_dict()}
+            trace.awaiting_send = True
+            self.pending_traces[id(message)] = trace
+        self.offer(message)
+
+    def offer(self, message: Dict, filename: Optional[str] = None,
+              full_message: Optional[Dict] = None) -> bool:
+        """Queue a frame without waiting. Returns False if the client was dropped.
+
+        Context frames pass their filename and the full-content form, which
+        is what gets queued if the frame has to be conflated.
+        """
+        if self.closed:
+            return False
+
+        if len(self.outbox) >= WS_SEND_QUEUE_SIZE:
+            if WS_OVERFLOW_POLICY == "conflate" and filename is not None:
+                queued = self.queued_context.get(filename)
+                if queued is not None:
+                    # Swap the stale frame for the newest full state. Frames are
+                    # shared across connections, so replace it, never mutate it.
+                    replacement = dict(full_message or message)
+                    for i, frame in enumerate(self.outbox):
+                        if frame is queued:
+                            self.outbox[i] = replacement
+                            break
+                    self.queued_context[filename] = replacement
+                    ws_frames_conflated.inc()
+                    return True
+                # New file: allowed past the limit, bounded by the number of files
+            else:
+                ws_clients_dropped.inc()
+                self.close(code=1013, reason="Send queue overflow")
+                return False
+
+        self.outbox.append(message)
+        if filename is not None:
+            self.queued_context[filename] = message
+        ws_queue_high_water.set_max(len(self.outbox))
+        self._wakeup.set()
+        return True
+
+    async def _run_writer(self):
+        try:
+            while True:
+                while not self.outbox:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                message = self.outbox.popleft()
+                filename = message.get("filename")
+                if filename is not None and self.queued_context.get(filename) is message:
+                    del self.queued_context[filename]
+                data = self.codec.encode(message)
+                if isinstance(data, bytes):
+                    send = self.websocket.send_bytes(data)
+                else:
+                    send = self.websocket.send_text(data)
+                await asyncio.wait_for(send, timeout=WS_SEND_TIMEOUT)
+                ws_messages.inc(direction="out", type=message.get("type", "unknown"))
+                ws_bytes_sent.inc(len(data))
+
+                trace = self.pending_traces.pop(id(message), None)
+                if trace is not None:
+                    trace.mark("sent")
+                    trace.finish()
+
+                if message.get("type") == "hello" and self.pending_codec is not None:
+                    self.codec, self.pending_codec = self.pending_codec, None
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            # Dead or too slow to take a frame within WS_SEND_TIMEOUT
+            ws_clients_dropped.inc()
+            self.close(code=1011, reason="Send failed")
+
+    def negotiate(self, hello: Dict) -> Dict:
+        """Pick this connection's wire codec from a client hello; returns the reply."""
+        self.pending_codec = WireCodec.negotiate(hello)
+        return {"type": "hello", **self.pending_codec.describe()}
+
+    def decode(self, frame: Dict) -> Dict:
+        """Decode a raw ASGI receive() frame with the negotiated codec."""
+        codec = self.pending_codec or self.codec
+        if frame.get("text") is not None:
+            return codec.decode(frame["text"])
+        return codec.decode(frame.get("bytes") or b"")
+
+    def cancel_prefetch(self):
+        if self.prefetch is not None:
+            self.prefetch.cancel()
+            self.prefetch = None
+
+    def close(self, code: int = 1000, reason: str = ""):
+        if self.closed:
+            return
+        self.closed = True
+        active_connections.discard(self)
+        ws_connections.dec()
+        self.cancel_prefetch()
+        self.outbox.clear()
+        self.queued_context.clear()
+        for trace in self.pending_traces.values():
+            trace.finish(outcome="not_sent")
+        self.pending_traces.clear()
+        if asyncio.current_task() is not self.writer:
+            self.writer.cancel()
+
+        async def close_socket():
+            try:
+                await self.websocket.close(code=code, reason=reason)
+            except Exception:
+                pass
+        asyncio.ensure_future(close_socket())
+
+
+def websocket_stats() -> Dict:
+    """/ws connection and send-queue figures for /health."""
+    return {
+        "connections": len(active_connections),
+        "frames_sent": ws_messages.total(direction="out"),
+        "bytes_sent": ws_bytes_sent.value(),
+        "frames_conflated": ws_frames_conflated.value(),
+        "clients_dropped": ws_clients_dropped.value(),
+        "queue_high_water": ws_queue_high_water.value(),
+    }
+
 
 # Global state for connected clients and file context
-active_connections: Set[WebSocket] = set()
-current_file_context: Dict[str, Dict] = {}  # filename -> {content, timestamp, size}
+active_connections: Set[ClientConnection] = set()
+current_file_context: Dict[str, Dict] = {}  # filename -> {content, timestamp, size, version}
+file_versions: Dict[str, int] = {}  # filename -> last version (survives eviction)
 
 
 class TtsRequest(BaseModel):
@@ -408,105 +866,316 @@ class TtsRequest(BaseModel):
     voice_id: Optional[str] = None
 
 
+class PrefetchRequest(BaseModel):
+    problem_id: str
+    voice_id: Optional[str] = None
+
+
 class CodeExecutionRequest(BaseModel):
     code: str
     language: str = "python"
-    test_cases: List[Dict[str, str]] = []
+    problem_id: Optional[str] = None  # judge against the registry's full test suite
+    test_cases: List[Dict[str, str]] = []  # ad hoc tests when there is no problem_id
 
 
 class CodeFileWatcher(FileSystemEventHandler):
-    """Watches for file changes and updates context."""
-    
-    def __init__(self, workspace_path: Path):
+    """Watches for file changes and updates context.
+
+    Watchdog fires several events per save (truncate, write, chmod, create),
+    so events are coalesced per path: each path gets its own quiet-period
+    timer, the file is read once when the burst settles, and nothing is
+    broadcast if the content hash is unchanged.
+    """
+
+    def __init__(self, workspace_path: Path, loop: asyncio.AbstractEventLoop,
+                 rules: IgnoreRules, debounce_seconds: float = WATCH_DEBOUNCE_SECONDS):
         self.workspace_path = workspace_path
+        self.loop = loop
+        self.rules = rules
+        self.debounce_seconds = debounce_seconds
         self.last_update = datetime.now()
-        
+        self.tree: Optional[PrunedWatcher] = None  # set once watches are scheduled
+        # Only touched on the event loop thread
+        self._pending: Dict[str, asyncio.TimerHandle] = {}
+        self._hashes: Dict[str, str] = {}
+
     def should_watch(self, path: str) -> bool:
-        """Check if file should be watched based on extension."""
+        """Check if file should be watched based on extension and ignore rules."""
         p = Path(path)
-        if any(part.startswith('.') for part in p.parts):  # Skip hidden dirs
+        if p.suffix not in WATCHED_EXTENSIONS:
             return False
-        if 'node_modules' in p.parts or '__pycache__' in p.parts or '.venv' in p.parts:
+        try:
+            rel_path = p.relative_to(self.workspace_path).as_posix()
+        except ValueError:
             return False
-        return p.suffix in WATCHED_EXTENSIONS
-    
+        return not self.rules.is_ignored(rel_path)
+
     def on_modified(self, event):
         if event.is_directory or not self.should_watch(event.src_path):
             return
-        
+        # Called on the watchdog thread; hand off to the event loop
+        self.loop.call_soon_threadsafe(self._schedule, event.src_path)
+
+    def on_created(self, event):
+        if event.is_directory:
+            # New directories need their own (non-recursive) watch
+            if self.tree:
+                self.tree.on_directory_created(event.src_path)
+            return
+        self.on_modified(event)
+
+    def on_deleted(self, event):
+        if event.is_directory and self.tree:
+            self.tree.on_directory_removed(event.src_path)
+
+    def on_moved(self, event):
+        if event.is_directory:
+            if self.tree:
+                self.tree.on_directory_removed(event.src_path)
+                self.tree.on_directory_created(event.dest_path)
+            return
+        # Editors that save via rename deliver the new content as a move
+        if self.should_watch(event.dest_path):
+            self.loop.call_soon_threadsafe(self._schedule, event.dest_path)
+
+    def _schedule(self, path: str):
+        """Restart the quiet-period timer for a path."""
+        handle = self._pending.pop(path, None)
+        if handle:
+            handle.cancel()
+        self._pending[path] = self.loop.call_later(self.debounce_seconds, self._flush, path)
+
+    def _flush(self, path: str):
+        self._pending.pop(path, None)
+        asyncio.ensure_future(self._process(path))
+
+    async def _process(self, src_path: str):
         try:
-            path = Path(event.src_path)
-            rel_path = path.relative_to(self.workspace_path)
-            
-            # Read file content
-            with open(path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # Truncate if too large
-            if len(content) > MAX_FILE_SIZE:
-                content = content[:MAX_FILE_SIZE] + f"\n\n... (truncated, {len(content) - MAX_FILE_SIZE} more chars)"
-            
-            # Update global context with metadata
-            current_file_context[str(rel_path)] = {
+            path = Path(src_path)
+            rel_path = str(path.relative_to(self.workspace_path))
+
+            # Read file content (once per burst), skipping binary or oversized files
+            content = await asyncio.to_thread(read_watched_file, path)
+            if content is None:
+                return
+
+            # Skip if nothing actually changed since the last broadcast
+            digest = hashlib.sha1(content.encode('utf-8')).hexdigest()
+            if self._hashes.get(rel_path) == digest:
+                return
+            self._hashes[rel_path] = digest
+
+            # Bump the file's version and publish; every worker (this one
+            # included) applies it in apply_context_event
+            self.last_update = datetime.now()
+            record = {
                 'content': content,
-                'timestamp': datetime.now(),
-                'size': len(content)
+                'timestamp': self.last_update.isoformat(),
+                'size': len(content),
+                'version': file_versions.get(rel_path, 0) + 1,
             }
-            
+
             # Limit number of files in context (keep most recent)
-            if len(current_file_context) > MAX_FILES_IN_CONTEXT:
-                oldest_file = min(current_file_context.items(), key=lambda x: x[1]['timestamp'])[0]
-                del current_file_context[oldest_file]
-            
-            # Notify all connected clients
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                asyncio.ensure_future(broadcast_context_update(str(rel_path), content))
-            
-        except Exception as e:
-            print(f"Error reading file {event.src_path}: {e}")
-    
-    def on_created(self, event):
-        self.on_modified(event)
+            evicted = []
+            others = {name: meta for name, meta in current_file_context.items() if name != rel_path}
+            if len(others) >= MAX_FILES_IN_CONTEXT:
+                oldest_file = min(others.items(), key=lambda x: x[1]['timestamp'])[0]
+                evicted.append(oldest_file)
+                self._hashes.pop(oldest_file, None)
 
+            await state_backend.publish_file(rel_path, record, evicted)
 
-async def broadcast_context_update(filename: str, content: str):
-    """Send context update to all connected clients."""
+        except FileNotFoundError:
+            # Deleted or renamed away before the burst settled
+            pass
+        except Exception as e:
+            log("watch_read_failed", level="warning", path=src_path, error=str(e))
+
+
+async def apply_context_event(event: Dict):
+    """Apply a published file update to this worker's context and its clients."""
+    filename = event['filename']
+    record = event['record']
+    previous = current_file_context.get(filename)
+    if previous and previous['version'] >= record['version']:
+        return  # already applied (e.g. replayed during a snapshot load)
+
+    file_versions[filename] = max(file_versions.get(filename, 0), record['version'])
+    current_file_context[filename] = record
+    for name in event.get('evicted', []):
+        current_file_context.pop(name, None)
+        code_index.remove(name)
+
+    # Re-parse into functions/classes now so the prompt path never does
+    code_index.update(filename, record['content'])
+    context_cache.invalidate()
+
+    # Notify this worker's connected clients
+    await broadcast_context_update(filename, record['content'], record['version'], previous)
+
+
+async def load_context_snapshot():
+    """Seed this worker's context from the state backend (newest files first)."""
+    files = await state_backend.load_files()
+    newest = sorted(files.items(), key=lambda x: x[1]['timestamp'], reverse=True)
+    for filename, record in newest[:MAX_FILES_IN_CONTEXT]:
+        applied = current_file_context.get(filename)
+        if applied and applied['version'] >= record['version']:
+            continue
+        current_file_context[filename] = record
+        file_versions[filename] = record['version']
+        code_index.update(filename, record['content'])
+    for filename, record in newest[MAX_FILES_IN_CONTEXT:]:
+        file_versions[filename] = max(file_versions.get(filename, 0), record['version'])
+    context_cache.invalidate()
+
+
+def read_watched_file(path: Path) -> Optional[str]:
+    """Read a watched file, or None if it is too large or looks binary."""
+    if path.stat().st_size > WATCH_MAX_FILE_BYTES or is_probably_binary(path):
+        return None
+    return path.read_text(encoding='utf-8')
+
+
+async def broadcast_context_update(filename: str, content: str, version: int,
+                                   previous: Optional[Dict] = None):
+    """Send context update to all connected clients.
+
+    Patch-capable clients that hold the previous version get a compact
+    context_patch; everyone else gets the full content.
+    """
+    timestamp = datetime.now().isoformat()
     message = {
         "type": "context_update",
         "filename": filename,
         "content": content,
-        "timestamp": datetime.now().isoformat()
+        "version": version,
+        "timestamp": timestamp
     }
-    
-    disconnected = set()
-    for connection in active_connections:
-        try:
-            await connection.send_json(message)
-        except Exception:
-            disconnected.add(connection)
-    
-    # Remove disconnected clients
-    active_connections.difference_update(disconnected)
+
+    patch_message = None
+    base_version = previous['version'] if previous else None
+    ops = compact_patch(previous['content'] if previous else None, content)
+    if ops is not None:
+        patch_message = {
+            "type": "context_patch",
+            "filename": filename,
+            "base_version": base_version,
+            "version": version,
+            "ops": ops,
+            "timestamp": timestamp
+        }
+
+    # Put the frame on every client's queue at once; writers drain independently
+    for connection in list(active_connections):
+        known = connection.file_versions
+        use_patch = patch_message and known is not None and known.get(filename) == base_version
+        queued = connection.offer(
+            patch_message if use_patch else message,
+            filename=filename,
+            full_message=message,
+        )
+        if queued and known is not None:
+            known[filename] = version
+
+
+def context_snapshot(connection: ClientConnection) -> Dict:
+    """Build a context_sync message; patch clients also get a versioned per-file snapshot."""
+    message = {
+        "type": "context_sync",
+        "files": list(current_file_context.keys()),
+        "versions": {name: meta['version'] for name, meta in current_file_context.items()},
+        "context": get_current_context(),  # seeds the manual context textarea
+        "context_version": context_cache.version,
+        "context_tokens": context_cache.tokens,
+    }
+    known = connection.file_versions
+    if known is not None:
+        message["contents"] = {name: meta['content'] for name, meta in current_file_context.items()}
+        known.clear()
+        known.update(message["versions"])
+    return message
+
+
+class ContextCache:
+    """Formatted code context, rebuilt only after the watcher reports a real change.
+
+    `version` increases on every invalidation so callers can tell whether
+    anything changed; `tokens` is a rough size estimate (~4 chars/token).
+    """
+
+    def __init__(self):
+        self.version = 0
+        self._text: Optional[str] = None
+        self._prompt_block: Optional[str] = None
+        self._tokens = 0
+
+    def invalidate(self):
+        self.version += 1
+        self._text = None
+        self._prompt_block = None
+
+    def _build(self):
+        # Sort by most recent first
+        sorted_files = sorted(
+            current_file_context.items(),
+            key=lambda x: x[1]['timestamp'],
+            reverse=True
+        )
+
+        context_parts = []
+        for filename, metadata in sorted_files:
+            context_parts.append(f"### File: {filename}\n```\n{metadata['content']}\n```")
+
+        self._text = "\n\n".join(context_parts)
+        self._prompt_block = f"\nCode context:\n{self._text}\n" if self._text else ""
+        self._tokens = estimate_tokens(self._text)
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._build()
+        return self._text
+
+    @property
+    def prompt_block(self) -> str:
+        if self._prompt_block is None:
+            self._build()
+        return self._prompt_block
+
+    @property
+    def tokens(self) -> int:
+        if self._text is None:
+            self._build()
+        return self._tokens
+
+
+context_cache = ContextCache()
+code_index = CodeContextIndex()
 
 
 def get_current_context() -> str:
     """Get formatted context from all tracked files."""
-    if not current_file_context:
-        return ""
-    
-    # Sort by most recent first
-    sorted_files = sorted(
-        current_file_context.items(), 
-        key=lambda x: x[1]['timestamp'], 
-        reverse=True
-    )
-    
-    context_parts = []
-    for filename, metadata in sorted_files:
-        context_parts.append(f"### File: {filename}\n```\n{metadata['content']}\n```")
-    
-    return "\n\n".join(context_parts)
+    return context_cache.text
+
+
+def get_prompt_context(question: str) -> str:
+    """Code context block for a prompt, packed into CONTEXT_TOKEN_BUDGET.
+
+    When everything fits, the cached full context is used as-is; otherwise
+    the functions/classes most relevant to the question and most recently
+    edited are selected.
+    """
+    if context_cache.tokens <= CONTEXT_TOKEN_BUDGET:
+        return context_cache.prompt_block
+
+    file_order = [
+        name for name, _ in sorted(
+            current_file_context.items(), key=lambda x: x[1]['timestamp'], reverse=True
+        )
+    ]
+    packed = code_index.build(question, CONTEXT_TOKEN_BUDGET, file_order)
+    return f"\nCode context:\n{packed}\n" if packed else ""
 
 
 async def synthesize_tts(text: str, voice_id: Optional[str] = None):
@@ -523,7 +1192,7 @@ async def synthesize_tts(text: str, voice_id: Optional[str] = None):
             detail="No ElevenLabs voice id provided. Set ELEVENLABS_VOICE_ID or pass voice_id.",
         )
 
-    url = f"https://api.elevenlabs.io/v1/text-to-speech/{chosen_voice}/stream"
+    url = f"{ELEVENLABS_API_BASE}/v1/text-to-speech/{chosen_voice}/stream"
     headers = {
         "xi-api-key": ELEVENLABS_API_KEY,
         "Accept": "audio/mpeg",
@@ -539,37 +1208,144 @@ async def synthesize_tts(text: str, voice_id: Optional[str] = None):
     }
 
     async def audio_bytes():
-        async with httpx.AsyncClient(timeout=30) as client:
-            async with client.stream(
-                "POST",
-                url,
-                headers=headers,
-                json=payload,
-            ) as resp:
-                resp.raise_for_status()
-                async for chunk in resp.aiter_bytes():
-                    yield chunk
+        start = time.perf_counter()
+        first_byte = True
+        outcome = "error"
+        try:
+            async with httpx.AsyncClient(timeout=30) as client:
+                async with client.stream(
+                    "POST",
+                    url,
+                    headers=headers,
+                    json=payload,
+                ) as resp:
+                    resp.raise_for_status()
+                    async for chunk in resp.aiter_bytes():
+                        if first_byte and chunk:
+                            tts_first_byte.observe(time.perf_counter() - start)
+                            first_byte = False
+                        yield chunk
+            outcome = "ok"
+        finally:
+            tts_stream_duration.observe(time.perf_counter() - start, outcome=outcome)
 
     return audio_bytes()
 
 
+def tts_cache_key(text: str, voice_id: Optional[str] = None) -> str:
+    voice = voice_id or ELEVENLABS_VOICE_ID or ""
+    return hashlib.sha256(f"{voice}\0{text}".encode()).hexdigest()
+
+
+async def fetch_tts_audio(text: str, voice_id: Optional[str] = None) -> bytes:
+    """Synthesize a whole clip into the TTS cache (joining an in-flight one)."""
+    key = tts_cache_key(text, voice_id)
+
+    async def synthesize():
+        stream = await synthesize_tts(text, voice_id)
+        audio = b"".join([chunk async for chunk in stream])
+        tts_cache.put(key, audio)
+        return audio
+
+    return await tts_flights.run(key, synthesize)
+
+
+async def cache_audio(key: str, stream):
+    """Pass audio through to the client, caching the clip once it completes."""
+    chunks = []
+    async for chunk in stream:
+        chunks.append(chunk)
+        yield chunk
+    tts_cache.put(key, b"".join(chunks))
+
+
+async def generate_content(call_site: str, route: str, prompt: str,
+                           generation_config: Optional[Dict] = None):
+    """Run a blocking Gemini call in a worker thread on the route's best tier.
+
+    Records latency, tokens and cost per route and model. If a call fails,
+    the next tier is tried; the last tier's error is raised.
+    """
+    genai = await gemini_client()
+    candidates = model_router.candidates(route)
+    mark("upstream_start")
+    for attempt, model_name in enumerate(candidates):
+        # A tier with a fallback fails fast (no client-side retries, bounded
+        # wait) so the next tier gets the call; the last tier keeps the defaults
+        has_fallback = attempt < len(candidates) - 1
+        request_options = {"retry": None, "timeout": model_router.attempt_timeout(route)} if has_fallback else None
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            model = genai.GenerativeModel(model_name, generation_config=generation_config)
+            response = await asyncio.to_thread(model.generate_content, prompt, request_options=request_options)
+            # generate_content isn't streamed, so the first token arrives with the rest
+            mark("first_token")
+            outcome = "ok"
+        except asyncio.CancelledError:
+            # The caller went away (disconnect, cancelled prefetch); says nothing about the model
+            outcome = "cancelled"
+            raise
+        except Exception as e:
+            if not has_fallback:
+                raise
+            model_failovers.inc(route=route, model=model_name)
+            log("model_failover", level="warning", route=route, model=model_name,
+                next_model=candidates[attempt + 1], error=str(e))
+            continue
+        finally:
+            elapsed = time.perf_counter() - start
+            gemini_latency.observe(elapsed, call_site=call_site, outcome=outcome)
+            model_latency.observe(elapsed, route=route, model=model_name, outcome=outcome)
+            tripped = None
+            if outcome != "cancelled":
+                tripped = model_router.record(route, model_name, elapsed, outcome == "ok")
+            if tripped:
+                model_trips.inc(route=route, model=model_name, reason=tripped)
+                log("model_tripped", level="warning", route=route, model=model_name, reason=tripped,
+                    next_model=model_router.candidates(route)[0])
+
+        record_usage(route, model_name, response)
+        trace = current_trace()
+        if trace is not None:
+            trace.attrs["model"] = model_name
+        return response
+
+
+def record_usage(route: str, model_name: str, response):
+    usage = getattr(response, "usage_metadata", None)
+    prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+    output_tokens = getattr(usage, "candidates_token_count", 0) or 0
+    model_tokens.inc(prompt_tokens, route=route, model=model_name, direction="prompt")
+    model_tokens.inc(output_tokens, route=route, model=model_name, direction="output")
+    model_cost.inc(model_router.cost(model_name, prompt_tokens, output_tokens), route=route, model=model_name)
+
+
 async def call_gemini(
     user_text: str,
     code_context: Optional[str],
     history: List[Dict[str, str]],
+    language: Optional[str] = None,
 ) -> str:
     if not GEMINI_API_KEY:
         raise HTTPException(status_code=400, detail="GEMINI_API_KEY is not set.")
 
     # Use auto-tracked context if no manual context provided
     if not code_context:
-        code_context = get_current_context()
+        context_block = get_prompt_context(user_text)
+    elif estimate_tokens(code_context) > CONTEXT_TOKEN_BUDGET:
+        # Oversized editor buffer: keep the parts that matter for this question
+        editor = editor_filename(language)
+        editor_index = CodeContextIndex()
+        editor_index.update(editor, code_context)
+        context_block = f"\nCode context:\n{editor_index.build(user_text, CONTEXT_TOKEN_BUDGET, [editor])}\n"
+    else:
+        context_block = f"\nCode context:\n{code_context}\n"
 
     # Build a simple prompt using history and context.
     history_text = "\n".join(
         [f"User: {item['user']}\nAssistant: {item['assistant']}" for item in history]
     )
-    context_block = f"\nCode context:\n{code_context}\n" if code_context else ""
     history_block = f"Conversation so far:\n{history_text}\n" if history else ""
     prompt = (
         f"{SYSTEM_PROMPT}\n"
@@ -578,8 +1354,8 @@ async def call_gemini(
         f"Latest user message: {user_text}"
     )
 
-    model = genai.GenerativeModel(GEMINI_MODEL)
-    response = await asyncio.to_thread(model.generate_content, prompt)
+    mark("context_built")
+    response = await generate_content("call_gemini", "mentor", prompt)
     return response.text
 
 
@@ -603,25 +1379,23 @@ async def generate_visualization(
         f"Generate the complete visualization JSON now:"
     )
 
+    mark("context_built")
+
     # Configure model for JSON output with strict validation
-    model = genai.GenerativeModel(
-        GEMINI_MODEL,
-        generation_config={
-            "response_mime_type": "application/json",
-            "temperature": 0.3,  # Lower temperature for more structured output
-            "top_p": 0.8,  # More focused sampling
-        }
-    )
+    generation_config = {
+        "response_mime_type": "application/json",
+        "temperature": 0.3,  # Lower temperature for more structured output
+        "top_p": 0.8,  # More focused sampling
+    }
 
-    response = await asyncio.to_thread(model.generate_content, prompt)
+    response = await generate_content("generate_visualization", "visualization", prompt, generation_config)
 
     # Parse JSON response
     try:
         visualization_data = json.loads(response.text)
         return visualization_data
     except json.JSONDecodeError as e:
-        print(f"❌ JSON Parse Error: {str(e)}")
-        print(f"📄 Raw response (first 1000 chars): {response.text[:1000]}")
+        log("visualization_json_invalid", level="warning", error=str(e), raw=response.text[:1000])
 
         # Fallback: try to extract and fix JSON from response
         import re
@@ -643,13 +1417,13 @@ async def generate_visualization(
                 try:
                     repaired = repair_fn(json_str)
                     visualization_data = json.loads(repaired)
-                    print("✅ JSON repaired successfully!")
+                    log("visualization_json_repaired")
                     return visualization_data
                 except:
                     continue
 
         # Last resort: retry with simpler request
-        print("⚠️ Retrying with simplified request...")
+        log("visualization_retry", level="warning")
         simplified_prompt = f"""Generate a simple bubble sort visualization for array [5, 2, 8, 1, 9].
 
 CRITICAL: Output ONLY valid JSON. No markdown, no code blocks, just pure JSON.
@@ -680,11 +1454,13 @@ Follow this exact structure:
 Generate complete valid JSON now:"""
 
         try:
-            retry_response = await asyncio.to_thread(model.generate_content, simplified_prompt)
+            retry_response = await generate_content(
+                "generate_visualization", "visualization", simplified_prompt, generation_config
+            )
             visualization_data = json.loads(retry_response.text)
             return visualization_data
         except Exception as retry_error:
-            print(f"❌ Retry also failed: {retry_error}")
+            log("visualization_retry_failed", level="error", error=str(retry_error))
 
         raise HTTPException(
             status_code=500,
@@ -692,117 +1468,361 @@ Generate complete valid JSON now:"""
         )
 
 
+def precomputed_hint(conn: ClientConnection, problem_id, user_text: str,
+                     code_context: Optional[str]) -> Optional[str]:
+    """Next step of the problem's hint ladder, if this is a hint request on untouched starter code."""
+    if not problem_id or not is_hint_request(user_text):
+        return None
+    slug = problem_registry.resolve(str(problem_id))
+    ladder = hint_bundle.ladder(slug) if slug else None
+    if ladder is None:
+        hint_lookups.inc(result="no_ladder")
+        return None
+    if code_context is None or code_fingerprint(code_context) != ladder["starter"]:
+        hint_lookups.inc(result="code_changed")
+        return None
+    step = conn.hint_steps.get(slug, 0)
+    if step >= len(ladder["hints"]):
+        hint_lookups.inc(result="exhausted")
+        return None
+    conn.hint_steps[slug] = step + 1
+    hint_lookups.inc(result="served")
+    return ladder["hints"][step]
+
+
+async def handle_user_message(conn: ClientConnection, message: Dict, request_id: str):
+    user_text = (message.get("text") or "").strip()
+    code_context = message.get("code_context") or None
+    if not user_text:
+        await conn.send({"type": "error", "message": "Empty message."}, request_id)
+        return
+
+    async with conn.turn_lock:
+        reply = precomputed_hint(conn, message.get("problem_id"), user_text, code_context)
+        if reply is None:
+            await conn.send({"type": "status", "message": "thinking"}, request_id)
+            try:
+                async with conn.slots:
+                    reply = await call_gemini(user_text, code_context, conn.history, message.get("language"))
+            except HTTPException as exc:
+                await conn.send({"type": "error", "message": exc.detail}, request_id)
+                return
+            except Exception as exc:  # pragma: no cover - defensive
+                await conn.send({"type": "error", "message": str(exc)}, request_id)
+                return
+
+        conn.history.append({"user": user_text, "assistant": reply})
+    await conn.send({"type": "llm_message", "text": reply}, request_id)
+
+
+async def handle_visualization_request(conn: ClientConnection, message: Dict, request_id: str):
+    user_request = (message.get("request") or "").strip()
+    additional_context = message.get("context") or None
+
+    if not user_request:
+        await conn.send({
+            "type": "error",
+            "message": "Empty visualization request."
+        }, request_id)
+        return
+
+    await conn.send({
+        "type": "status",
+        "message": "generating_visualization"
+    }, request_id)
+
+    try:
+        async with conn.slots:
+            visualization_data = await generate_visualization(
+                user_request,
+                additional_context
+            )
+
+        await conn.send({
+            "type": "visualization_response",
+            "data": visualization_data
+        }, request_id)
+
+    except HTTPException as exc:
+        await conn.send({
+            "type": "error",
+            "message": exc.detail
+        }, request_id)
+    except Exception as exc:
+        await conn.send({
+            "type": "error",
+            "message": f"Visualization generation failed: {str(exc)}"
+        }, request_id)
+
+
+OPENING_TURN_PROMPT = """The student just opened the problem "{title}" (LeetCode {number}) and started a voice session.
+Greet them as Vela in one or two short spoken sentences and ask one question that gets them thinking about the problem.
+Don't hint at the approach yet."""
+
+
+async def get_opening_turn(slug: str) -> str:
+    """The mentor's opening turn for a problem (cached; joins an in-flight prefetch)."""
+    cached = opening_turns.get(slug)
+    if cached is not None:
+        cache_lookups.inc(cache="opening_turn", result="hit")
+        return cached
+    cache_lookups.inc(cache="opening_turn", result="joined" if opening_flights.in_flight(slug) else "miss")
+
+    async def generate():
+        problem = problem_registry.problems[slug]
+        prompt = (
+            f"{SYSTEM_PROMPT}\n"
+            f"{OPENING_TURN_PROMPT.format(title=problem.get('title', slug), number=problem.get('id', ''))}"
+        )
+        response = await generate_content("opening_turn", "mentor", prompt)
+        text = response.text.strip()
+        opening_turns.put(slug, text)
+        return text
+
+    return await opening_flights.run(slug, generate)
+
+
+async def prefetch_transcript(video_id: str) -> str:
+    if await asyncio.to_thread(transcript_store.has, video_id):
+        return "warm"
+    # The job is shared and its result is stored for everyone, so it keeps
+    # running even if this prefetch is cancelled
+    start_transcript_job(video_id)
+    return "started"
+
+
+async def prefetch_opening_turn(group: PrefetchGroup, slug: str, voice_id: Optional[str]) -> str:
+    if not GEMINI_API_KEY:
+        return "skipped"
+    outcome = "warm"
+    if slug not in opening_turns:
+        async with prefetch_slots:
+            await get_opening_turn(slug)
+        outcome = "ok"
+    if ELEVENLABS_API_KEY:
+        text = opening_turns.get(slug)
+        group.spawn("opening_audio", lambda: prefetch_audio(text, voice_id))
+    return outcome
+
+
+async def prefetch_audio(text: str, voice_id: Optional[str]) -> str:
+    if tts_cache_key(text, voice_id) in tts_cache:
+        return "warm"
+    async with prefetch_slots:
+        await fetch_tts_audio(text, voice_id)
+    return "ok"
+
+
+def start_prefetch(slug: str, voice_id: Optional[str] = None) -> PrefetchGroup:
+    """Start warming everything the first interaction with a problem needs."""
+    problem = problem_registry.problems[slug]
+    group = PrefetchGroup(slug)
+    if problem.get("video_id"):
+        group.spawn("transcript", lambda: prefetch_transcript(problem["video_id"]))
+    group.spawn("opening_turn", lambda: prefetch_opening_turn(group, slug, voice_id))
+    return group
+
+
+async def finish_prefetch(group: PrefetchGroup) -> Dict[str, str]:
+    results = await group.wait()
+    for step, outcome in results.items():
+        prefetch_steps.inc(step=step, outcome=outcome)
+    log("prefetch_done", problem_id=group.key, steps=results, errors=group.errors or None,
+        cancelled=group.cancelled)
+    return results
+
+
+async def handle_prefetch(conn: ClientConnection, message: Dict, request_id: str):
+    slug = problem_registry.resolve(str(message.get("problem_id") or ""))
+    if slug is None:
+        await conn.send({"type": "error", "message": "Unknown problem."}, request_id)
+        return
+    if conn.prefetch and conn.prefetch.key == slug and not conn.prefetch.cancelled:
+        return  # already warming this problem
+
+    conn.cancel_prefetch()
+    group = conn.prefetch = start_prefetch(slug, message.get("voice_id"))
+
+    async def report():
+        results = await finish_prefetch(group)
+        if not group.cancelled:
+            await conn.send({"type": "prefetch_ready", "problem_id": slug, "steps": results}, request_id)
+
+    task = asyncio.create_task(report())
+    conn.tasks.add(task)
+    task.add_done_callback(conn.tasks.discard)
+
+
+async def handle_opening_turn(conn: ClientConnection, message: Dict, request_id: str):
+    slug = problem_registry.resolve(str(message.get("problem_id") or ""))
+    if slug is None:
+        await conn.send({"type": "error", "message": "Unknown problem."}, request_id)
+        return
+
+    async with conn.turn_lock:
+        try:
+            text = opening_turns.get(slug)
+            if text is None:
+                async with conn.slots:
+                    text = await get_opening_turn(slug)
+        except HTTPException as exc:
+            await conn.send({"type": "error", "message": exc.detail}, request_id)
+            return
+        except Exception as exc:  # pragma: no cover - defensive
+            await conn.send({"type": "error", "message": str(exc)}, request_id)
+            return
+
+        title = problem_registry.problems[slug].get("title", slug)
+        conn.history.append({"user": f"(Started a voice session on {title})", "assistant": text})
+    await conn.send({"type": "llm_message", "text": text, "opening": True}, request_id)
+
+
+async def handle_ws_message(conn: ClientConnection, message: Dict, request_id: str, trace: Trace):
+    """Run one inbound message; each runs as its own task under its own trace."""
+    msg_type = message.get("type")
+
+    with use_trace(trace):
+        trace.mark("started")
+        try:
+            if msg_type == "user_message":
+                await handle_user_message(conn, message, request_id)
+
+            elif msg_type == "request_context":
+                # Client requesting current context (or resyncing after a version gap)
+                await conn.send(context_snapshot(conn), request_id)
+
+            elif msg_type == "visualization_request":
+                # Client requesting visualization generation
+                await handle_visualization_request(conn, message, request_id)
+
+            elif msg_type == "prefetch":
+                # Client opened a problem: warm what its first interaction needs
+                await handle_prefetch(conn, message, request_id)
+
+            elif msg_type == "prefetch_cancel":
+                conn.cancel_prefetch()
+
+            elif msg_type == "opening_turn":
+                await handle_opening_turn(conn, message, request_id)
+
+            else:
+                await conn.send(
+                    {"type": "error", "message": "Unsupported message type."}, request_id
+                )
+        except (WebSocketDisconnect, RuntimeError):
+            # Socket closed while this request was in flight
+            pass
+
+        if not trace.awaiting_send:
+            # No traced reply (errors, snapshots): the request ends here
+            trace.mark("done")
+            trace.finish()
+
+
 @app.websocket("/ws")
 async def chat_ws(websocket: WebSocket):
     await websocket.accept()
-    active_connections.add(websocket)
-    history: List[Dict[str, str]] = []
+    conn = ClientConnection(
+        websocket,
+        accepts_patches=websocket.query_params.get("patches") in ("1", "true"),
+        debug=websocket.query_params.get("debug") in ("1", "true"),
+    )
+    active_connections.add(conn)
+    ws_connections.inc()
 
-    # Send initial context
+    # Send initial context (a fresh snapshot; reconnects start over)
     if current_file_context:
-        await websocket.send_json({
-            "type": "context_sync",
-            "files": list(current_file_context.keys()),
-            "context": get_current_context()
-        })
+        await conn.send(context_snapshot(conn))
 
     try:
         while True:
-            raw = await websocket.receive_text()
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                break
             try:
-                message = json.loads(raw)
-            except json.JSONDecodeError:
-                await websocket.send_json(
-                    {"type": "error", "message": "Invalid JSON payload."}
-                )
+                message = conn.decode(frame)
+            except Exception:
+                await conn.send({"type": "error", "message": "Invalid message payload."})
+                continue
+            if not isinstance(message, dict):
+                await conn.send({"type": "error", "message": "Invalid message payload."})
                 continue
-
             msg_type = message.get("type")
-            
-            if msg_type == "user_message":
-                user_text = (message.get("text") or "").strip()
-                code_context = message.get("code_context") or None
-                if not user_text:
-                    await websocket.send_json(
-                        {"type": "error", "message": "Empty message."}
-                    )
-                    continue
-
-                await websocket.send_json({"type": "status", "message": "thinking"})
-                try:
-                    reply = await call_gemini(user_text, code_context, history)
-                except HTTPException as exc:
-                    await websocket.send_json({"type": "error", "message": exc.detail})
-                    continue
-                except Exception as exc:  # pragma: no cover - defensive
-                    await websocket.send_json({"type": "error", "message": str(exc)})
-                    continue
+            ws_messages.inc(direction="in", type=msg_type if msg_type in WS_MESSAGE_TYPES else "other")
 
-                history.append({"user": user_text, "assistant": reply})
-                await websocket.send_json({"type": "llm_message", "text": reply})
-            
-            elif msg_type == "request_context":
-                # Client requesting current context
-                await websocket.send_json({
-                    "type": "context_sync",
-                    "files": list(current_file_context.keys()),
-                    "context": get_current_context()
-                })
-
-            elif msg_type == "visualization_request":
-                # Client requesting visualization generation
-                user_request = (message.get("request") or "").strip()
-                additional_context = message.get("context") or None
-
-                if not user_request:
-                    await websocket.send_json({
-                        "type": "error",
-                        "message": "Empty visualization request."
-                    })
-                    continue
+            if message.get("type") == "hello":
+                # Encoding handshake; handled inline so later frames decode correctly
+                await conn.send(conn.negotiate(message), message.get("request_id"))
+                continue
 
-                await websocket.send_json({
-                    "type": "status",
-                    "message": "generating_visualization"
-                })
+            # Responses carry the client's request_id (or one we assign) so
+            # replies to concurrent requests can be matched up
+            request_id = str(message.get("request_id") or uuid.uuid4().hex[:12])
 
-                try:
-                    visualization_data = await generate_visualization(
-                        user_request,
-                        additional_context
-                    )
+            if len(conn.tasks) >= WS_MAX_PENDING_REQUESTS:
+                await conn.send({"type": "error", "message": "Too many requests in flight."}, request_id)
+                continue
 
-                    await websocket.send_json({
-                        "type": "visualization_response",
-                        "data": visualization_data
-                    })
+            trace = Trace(
+                "ws", msg_type or "unknown", debug=conn.debug or bool(message.get("debug")),
+                request_id=request_id,
+            )
+            trace.mark("received")
+            task = asyncio.create_task(handle_ws_message(conn, message, request_id, trace))
+            conn.tasks.add(task)
+            task.add_done_callback(conn.tasks.discard)
 
-                except HTTPException as exc:
-                    await websocket.send_json({
-                        "type": "error",
-                        "message": exc.detail
-                    })
-                    continue
-                except Exception as exc:
-                    await websocket.send_json({
-                        "type": "error",
-                        "message": f"Visualization generation failed: {str(exc)}"
-                    })
-                    continue
-
-            else:
-                await websocket.send_json(
-                    {"type": "error", "message": "Unsupported message type."}
-                )
-                
     except WebSocketDisconnect:
-        active_connections.discard(websocket)
+        pass
+    finally:
+        conn.close()
+        for task in list(conn.tasks):
+            task.cancel()
 
 
 @app.post("/tts")
 async def tts_endpoint(req: TtsRequest):
+    key = tts_cache_key(req.text, req.voice_id)
+    cached = tts_cache.get(key)
+    if cached is not None:
+        cache_lookups.inc(cache="tts", result="hit")
+        return Response(cached, media_type="audio/mpeg")
+    if tts_flights.in_flight(key):
+        # A prefetch is already synthesizing this clip; wait for it rather than start another
+        cache_lookups.inc(cache="tts", result="joined")
+        return Response(await fetch_tts_audio(req.text, req.voice_id), media_type="audio/mpeg")
+
+    cache_lookups.inc(cache="tts", result="miss")
     stream = await synthesize_tts(req.text, req.voice_id)
-    return StreamingResponse(stream, media_type="audio/mpeg")
+    return StreamingResponse(cache_audio(key, stream), media_type="audio/mpeg")
+
+
+# prefetch_id -> (group, runner task) for prefetches started over HTTP
+http_prefetches: Dict[str, tuple] = {}
+
+
+@app.post("/prefetch")
+async def prefetch_problem(req: PrefetchRequest):
+    """Warm the caches for a problem the user just opened (returns immediately)."""
+    slug = problem_registry.resolve(req.problem_id)
+    if slug is None:
+        raise HTTPException(status_code=404, detail=f"Unknown problem: {req.problem_id}")
+
+    prefetch_id = uuid.uuid4().hex[:12]
+    group = start_prefetch(slug, req.voice_id)
+    runner = asyncio.create_task(finish_prefetch(group))
+    http_prefetches[prefetch_id] = (group, runner)
+    runner.add_done_callback(lambda _: http_prefetches.pop(prefetch_id, None))
+    return {"prefetch_id": prefetch_id, "problem_id": slug, "status": "started"}
+
+
+@app.post("/prefetch/{prefetch_id}/cancel")
+async def cancel_prefetch(prefetch_id: str):
+    """Cancel a prefetch (POST so navigator.sendBeacon can call it on pagehide)."""
+    entry = http_prefetches.pop(prefetch_id, None)
+    if entry:
+        entry[0].cancel()
+    return {"prefetch_id": prefetch_id, "cancelled": entry is not None}
 
 
 @app.get("/health")
@@ -812,131 +1832,166 @@ async def health_check():
         "status": "healthy",
         "service": "VelocityAI",
         "gemini_configured": bool(GEMINI_API_KEY),
-        "elevenlabs_configured": bool(ELEVENLABS_API_KEY)
+        "elevenlabs_configured": bool(ELEVENLABS_API_KEY),
+        "context_files": len(current_file_context),
+        "watched_directories": len(app.state.watch_tree.watched) if hasattr(app.state, 'watch_tree') else 0,
+        "context_tokens": context_cache.tokens,
+        "websocket": websocket_stats(),
+        "startup": startup_report,
+        "state_backend": type(state_backend).__name__,
+        "model_routes": model_router.status(),
+        "hint_ladders": len(hint_bundle),
+        "worker": {"id": WORKER_ID, "watching": getattr(app.state, 'watching', False)},
     }
 
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus text exposition of the app's counters and histograms."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/")
-async def root():
+async def root(request: Request):
     """Serve landing page."""
     landing_file = FRONTEND_DIR / "landing.html"
     if landing_file.exists():
-        return FileResponse(landing_file)
+        return asset_response(landing_file, request.headers)
     return {"message": "Landing page not found."}
 
 
 @app.get("/app")
-async def app_page():
+async def app_page(request: Request):
     """Serve unified practice page with Voice Mentor and Watch Solutions."""
     # Serve the unified practice interface
     practice_file = FRONTEND_DIR / "practice-unified.html"
     if practice_file.exists():
-        return FileResponse(practice_file)
+        return asset_response(practice_file, request.headers)
     # Fallback to original
     app_file = FRONTEND_DIR / "app-enhanced.html"
     if not app_file.exists():
         app_file = FRONTEND_DIR / "app.html"
     if app_file.exists():
-        return FileResponse(app_file)
+        return asset_response(app_file, request.headers)
     return {"message": "App not found."}
 
 
 @app.get("/visualize")
-async def visualize_page():
+async def visualize_page(request: Request):
     """Serve Learn & Visualize page."""
     viz_file = FRONTEND_DIR / "visualize.html"
     if viz_file.exists():
-        return FileResponse(viz_file)
+        return asset_response(viz_file, request.headers)
     return {"message": "Visualization page not found."}
 
 
 @app.get("/legacy")
-async def legacy_app():
+async def legacy_app(request: Request):
     """Serve legacy application (old design)."""
     index_file = FRONTEND_DIR / "index.html"
     if index_file.exists():
-        return FileResponse(index_file)
+        return asset_response(index_file, request.headers)
     return {"message": "Legacy app not found."}
 
 
+def run_test_cases(code: str, test_cases: List[Dict]) -> Dict:
+    """Run a submission against each test case (blocking; called in a worker thread)."""
+    # Create a temporary file with the code
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as f:
+        f.write(code)
+        temp_file = f.name
+
+    results = []
+    all_passed = True
+
+    # Run each test case
+    for i, test_case in enumerate(test_cases):
+        try:
+            # Execute the code with timeout
+            process = subprocess.run(
+                ['python3', temp_file],
+                input=test_case.get('input', ''),
+                capture_output=True,
+                text=True,
+                timeout=5
+            )
+
+            output = process.stdout.strip()
+            expected = test_case.get('expected', '').strip()
+            passed = output == expected
+
+            results.append({
+                "test_num": i + 1,
+                "input": test_case.get('input', ''),
+                "expected": expected,
+                "output": output,
+                "passed": passed,
+                "error": process.stderr if process.stderr else None
+            })
+
+            if not passed:
+                all_passed = False
+
+        except subprocess.TimeoutExpired:
+            results.append({
+                "test_num": i + 1,
+                "input": test_case.get('input', ''),
+                "expected": test_case.get('expected', ''),
+                "output": "",
+                "passed": False,
+                "error": "Timeout: Code took too long to execute"
+            })
+            all_passed = False
+        except Exception as e:
+            results.append({
+                "test_num": i + 1,
+                "input": test_case.get('input', ''),
+                "expected": test_case.get('expected', ''),
+                "output": "",
+                "passed": False,
+                "error": str(e)
+            })
+            all_passed = False
+
+    # Clean up temp file
+    import os
+    try:
+        os.unlink(temp_file)
+    except:
+        pass
+
+    return {
+        "success": True,
+        "all_passed": all_passed,
+        "results": results,
+        "total_tests": len(results),
+        "passed_tests": sum(1 for r in results if r["passed"])
+    }
+
+
+execute_slots = asyncio.Semaphore(EXECUTE_MAX_PARALLEL)
+
+
 @app.post("/execute")
 async def execute_code(req: CodeExecutionRequest):
-    """Execute Python code with test cases."""
+    """Execute Python code against a registered problem or the given test cases."""
     if req.language != "python":
         raise HTTPException(status_code=400, detail="Only Python is supported currently")
-    
+
+    slug = None
+    if req.problem_id is not None:
+        slug = problem_registry.resolve(req.problem_id)
+        if slug is None:
+            raise HTTPException(status_code=404, detail=f"Unknown problem: {req.problem_id}")
+
     try:
-        # Create a temporary file with the code
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as f:
-            f.write(req.code)
-            temp_file = f.name
-        
-        results = []
-        all_passed = True
-        
-        # Run each test case
-        for i, test_case in enumerate(req.test_cases):
-            try:
-                # Execute the code with timeout
-                process = subprocess.run(
-                    ['python3', temp_file],
-                    input=test_case.get('input', ''),
-                    capture_output=True,
-                    text=True,
-                    timeout=5
-                )
-                
-                output = process.stdout.strip()
-                expected = test_case.get('expected', '').strip()
-                passed = output == expected
-                
-                results.append({
-                    "test_num": i + 1,
-                    "input": test_case.get('input', ''),
-                    "expected": expected,
-                    "output": output,
-                    "passed": passed,
-                    "error": process.stderr if process.stderr else None
-                })
-                
-                if not passed:
-                    all_passed = False
-                    
-            except subprocess.TimeoutExpired:
-                results.append({
-                    "test_num": i + 1,
-                    "input": test_case.get('input', ''),
-                    "expected": test_case.get('expected', ''),
-                    "output": "",
-                    "passed": False,
-                    "error": "Timeout: Code took too long to execute"
-                })
-                all_passed = False
-            except Exception as e:
-                results.append({
-                    "test_num": i + 1,
-                    "input": test_case.get('input', ''),
-                    "expected": test_case.get('expected', ''),
-                    "output": "",
-                    "passed": False,
-                    "error": str(e)
-                })
-                all_passed = False
-        
-        # Clean up temp file
-        import os
-        try:
-            os.unlink(temp_file)
-        except:
-            pass
-        
-        return {
-            "success": True,
-            "all_passed": all_passed,
-            "results": results,
-            "total_tests": len(results),
-            "passed_tests": sum(1 for r in results if r["passed"])
-        }
+        queued_at = time.perf_counter()
+        async with execute_slots:
+            execute_queue_wait.observe(time.perf_counter() - queued_at)
+            with execute_run_time.time():
+                if slug is not None:
+                    return await asyncio.to_thread(judge.run, slug, req.code)
+                return await asyncio.to_thread(run_test_cases, req.code, req.test_cases)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Execution error: {str(e)}")
@@ -944,20 +1999,27 @@ async def execute_code(req: CodeExecutionRequest):
 
 async def fetch_youtube_captions_official(video_id: str):
     """Fetch captions using official YouTube Data API v3 with OAuth2."""
+    # All client calls are synchronous HTTP, so run them off the event loop
+    return await asyncio.to_thread(fetch_youtube_captions_official_sync, video_id)
+
+
+def fetch_youtube_captions_official_sync(video_id: str):
+    from googleapiclient.errors import HttpError
+
     # Get OAuth credentials
     creds = get_youtube_credentials()
     if not creds:
         raise Exception("YouTube OAuth not authorized. Visit /auth/youtube to authorize.")
 
     try:
-        # Build YouTube service with OAuth
-        youtube = build('youtube', 'v3', credentials=creds)
+        # Reuse the YouTube service; each call gets its own authorized transport
+        youtube = get_youtube_service(creds)
 
         # Get caption tracks for the video
         captions_response = youtube.captions().list(
             part='snippet',
             videoId=video_id
-        ).execute()
+        ).execute(http=authorized_http(creds))
 
         if not captions_response.get('items'):
             raise Exception("No captions available for this video")
@@ -979,7 +2041,7 @@ async def fetch_youtube_captions_official(video_id: str):
         caption_download = youtube.captions().download(
             id=caption_id,
             tfmt='srt'  # SubRip format
-        ).execute()
+        ).execute(http=authorized_http(creds))
 
         # Parse SRT format to our format
         # Note: This is a simplified parser
@@ -1024,7 +2086,7 @@ async def auth_youtube():
         )
 
     # Create OAuth flow
-    flow = Flow.from_client_secrets_file(
+    flow = (await import_async("google_auth_oauthlib.flow")).Flow.from_client_secrets_file(
         str(client_secret_path),
         scopes=SCOPES,
         redirect_uri='http://localhost:8000/auth/callback'
@@ -1046,18 +2108,18 @@ async def auth_callback(code: str, state: str = None):
     """Handle OAuth2 callback."""
     client_secret_path = BASE_DIR / YOUTUBE_OAUTH_CLIENT_SECRET
 
-    flow = Flow.from_client_secrets_file(
+    flow = (await import_async("google_auth_oauthlib.flow")).Flow.from_client_secrets_file(
         str(client_secret_path),
         scopes=SCOPES,
         redirect_uri='http://localhost:8000/auth/callback'
     )
 
-    flow.fetch_token(code=code)
+    await asyncio.to_thread(flow.fetch_token, code=code)
     creds = flow.credentials
 
-    # Save credentials
-    with open(TOKEN_FILE, 'wb') as token:
-        pickle.dump(creds, token)
+    # Save credentials and swap them into the in-memory cache
+    await asyncio.to_thread(set_youtube_credentials, creds)
+    start_youtube_refresher()
 
     return {
         "status": "success",
@@ -1068,51 +2130,181 @@ async def auth_callback(code: str, state: str = None):
 @app.get("/auth/youtube/status")
 async def youtube_auth_status():
     """Check if YouTube OAuth is authorized."""
-    creds = get_youtube_credentials()
+    creds = await asyncio.to_thread(get_youtube_credentials)
     return {
         "authorized": creds is not None,
         "has_token": TOKEN_FILE.exists()
     }
 
 
+class TranscriptJob:
+    """A single in-flight transcript fetch shared by every request for a video."""
+
+    def __init__(self, video_id: str):
+        self.video_id = video_id
+        self.status = "running"
+        self.stage = "queued"
+        self.error: Optional[str] = None
+        self.started_at = datetime.now()
+        self.finished_at: Optional[datetime] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            "video_id": self.video_id,
+            "status": self.status,
+            "stage": self.stage,
+            "error": self.error,
+            "started_at": self.started_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+# One running job per video id. A job leaves this dict when it finishes:
+# successes are in the store, and the last few failures are kept so their
+# error can still be polled.
+transcript_jobs: Dict[str, TranscriptJob] = {}
+failed_transcript_jobs: "OrderedDict[str, TranscriptJob]" = OrderedDict()
+FAILED_TRANSCRIPT_JOBS_KEPT = 256
+
+
+def stored_transcript_response(video_id: str) -> Optional[Dict]:
+    """Build the transcript response from the store, if the video is stored."""
+    stored = transcript_store.get(video_id)
+    if not stored:
+        return None
+    segments = stored['segments']
+    return {
+        "video_id": video_id,
+        "transcript": " ".join(seg['text'] for seg in segments),
+        "segments": segments,
+        "length": len(segments),
+        "method": stored['method'],
+        "cached": True,
+    }
+
+
+def start_transcript_job(video_id: str) -> TranscriptJob:
+    """Return the running job for a video, starting one if needed."""
+    job = transcript_jobs.get(video_id)
+    if job:
+        return job
+
+    job = TranscriptJob(video_id)
+
+    def on_done(task: asyncio.Task):
+        job.finished_at = datetime.now()
+        if task.cancelled():
+            job.status, job.error = "failed", "cancelled"
+        elif task.exception() is not None:
+            exc = task.exception()
+            job.status = "failed"
+            job.error = exc.detail if isinstance(exc, HTTPException) else str(exc)
+        else:
+            job.status = "done"
+        if transcript_jobs.get(video_id) is job:
+            del transcript_jobs[video_id]
+        if job.status == "failed":
+            failed_transcript_jobs[video_id] = job
+            failed_transcript_jobs.move_to_end(video_id)
+            while len(failed_transcript_jobs) > FAILED_TRANSCRIPT_JOBS_KEPT:
+                failed_transcript_jobs.popitem(last=False)
+        else:
+            failed_transcript_jobs.pop(video_id, None)
+
+    job.task = asyncio.create_task(fetch_transcript(video_id, job))
+    job.task.add_done_callback(on_done)
+    transcript_jobs[video_id] = job
+    return job
+
+
 @app.get("/youtube/transcript/{video_id}")
-async def get_youtube_transcript(video_id: str):
+async def get_youtube_transcript(video_id: str, wait: float = TRANSCRIPT_WAIT_SECONDS):
+    """Return a video transcript, joining the shared fetch job if one is running.
+
+    Waits up to `wait` seconds for the job; if it is still running (e.g. a long
+    Whisper transcription) responds 202 with the job status so the client can
+    poll this endpoint or /status again.
+    """
+    cached = await asyncio.to_thread(stored_transcript_response, video_id)
+    if cached:
+        transcript_lookups.inc(route="transcript", method=cached["method"], tier="store")
+        return cached
+
+    job = start_transcript_job(video_id)
+    try:
+        # Shield so a client giving up never cancels the shared job
+        result = await asyncio.wait_for(asyncio.shield(job.task), timeout=max(wait, 0))
+        transcript_lookups.inc(route="transcript", method=result["method"], tier="fetch")
+        return result
+    except asyncio.TimeoutError:
+        transcript_lookups.inc(route="transcript", method=job.stage or "unknown", tier="pending")
+        return JSONResponse(status_code=202, content={"video_id": video_id, **job.to_dict()})
+
+
+@app.get("/youtube/transcript/{video_id}/status")
+async def get_youtube_transcript_status(video_id: str):
+    """Report whether a transcript is stored, being fetched, or failed."""
+    if await asyncio.to_thread(transcript_store.has, video_id):
+        return {"video_id": video_id, "status": "done", "stage": "stored"}
+    job = transcript_jobs.get(video_id) or failed_transcript_jobs.get(video_id)
+    if job:
+        return job.to_dict()
+    return {"video_id": video_id, "status": "not_started", "stage": None}
+
+
+async def fetch_youtube_captions_scraper(video_id: str) -> List[Dict]:
+    """Fetch captions with youtube-transcript-api, or from TRANSCRIPT_SCRAPER_URL if set."""
+    if TRANSCRIPT_SCRAPER_URL:
+        async with httpx.AsyncClient(timeout=30) as client:
+            resp = await client.get(f"{TRANSCRIPT_SCRAPER_URL.rstrip('/')}/{video_id}")
+            resp.raise_for_status()
+            return resp.json()
+    return await asyncio.to_thread(scrape_youtube_captions, video_id)
+
+
+def scrape_youtube_captions(video_id: str) -> List[Dict]:
+    from youtube_transcript_api import YouTubeTranscriptApi
+    return YouTubeTranscriptApi.get_transcript(video_id)
+
+
+async def fetch_transcript(video_id: str, job: TranscriptJob) -> Dict:
     """Fetch YouTube video transcript using official API or fallback to scraper."""
     transcript_list = None
     method_used = "unknown"
 
     # Try official YouTube API first (requires OAuth)
-    creds = get_youtube_credentials()
+    creds = await asyncio.to_thread(get_youtube_credentials)
     if creds:
+        job.stage = "official_api_oauth"
         try:
-            print(f"🎯 Trying official YouTube Data API with OAuth for {video_id}")
             transcript_list = await fetch_youtube_captions_official(video_id)
             method_used = "official_api_oauth"
-            print(f"✅ Official API (OAuth) succeeded! Got {len(transcript_list)} segments")
+            log("transcript_source_ok", video_id=video_id, source=method_used, segments=len(transcript_list))
         except Exception as e:
-            print(f"⚠️ Official API (OAuth) failed: {str(e)}")
-            print(f"📌 Falling back to scraper...")
+            log("transcript_source_failed", level="warning", video_id=video_id,
+                source="official_api_oauth", error=str(e))
     else:
-        print(f"⚠️ YouTube OAuth not authorized. Visit /auth/youtube to enable transcripts.")
+        log("youtube_oauth_missing", level="warning", hint="Visit /auth/youtube to enable transcripts")
 
     # Fallback to scraper if official API failed or not configured
     if not transcript_list:
+        job.stage = "scraper"
         try:
-            transcript_list = YouTubeTranscriptApi.get_transcript(video_id)
+            transcript_list = await fetch_youtube_captions_scraper(video_id)
             method_used = "scraper"
-            print(f"✅ Scraper succeeded! Got {len(transcript_list)} segments")
+            log("transcript_source_ok", video_id=video_id, source=method_used, segments=len(transcript_list))
         except Exception as scraper_error:
-            print(f"⚠️ Scraper failed: {str(scraper_error)}")
+            log("transcript_source_failed", level="warning", video_id=video_id,
+                source="scraper", error=str(scraper_error))
 
             # Final fallback: Whisper transcription
             if OPENAI_API_KEY:
+                job.stage = "whisper"
                 try:
-                    print(f"🎤 Falling back to Whisper transcription...")
                     transcript_list = await transcribe_youtube_with_whisper(video_id)
                     method_used = "whisper"
-                    print(f"✅ Whisper transcription succeeded!")
                 except Exception as whisper_error:
-                    print(f"❌ Whisper also failed: {str(whisper_error)}")
                     raise HTTPException(
                         status_code=404,
                         detail=f"All transcript methods failed. Scraper: {str(scraper_error)}, Whisper: {str(whisper_error)}"
@@ -1123,34 +2315,38 @@ async def get_youtube_transcript(video_id: str):
                     detail=f"Could not fetch transcript: {str(scraper_error)}. Set OPENAI_API_KEY to enable Whisper transcription."
                 )
 
-    # Format transcript as full text
-    full_text = " ".join([entry['text'] for entry in transcript_list])
-
     # Ensure segments have required fields
-    segments = [
-        {
-            "start": entry.get('start', 0),
-            "duration": entry.get('duration', 2.0),
-            "text": entry.get('text', '')
-        }
-        for entry in transcript_list
-    ]
+    segments = normalize_segments(transcript_list)
+
+    # Whisper results are persisted by the transcriber itself
+    if method_used != "whisper":
+        await asyncio.to_thread(transcript_store.put, video_id, segments, method_used)
+
+    # Format transcript as full text
+    full_text = " ".join(seg['text'] for seg in segments)
 
     return {
         "video_id": video_id,
         "transcript": full_text,
         "segments": segments,
         "length": len(segments),
-        "method": method_used
+        "method": method_used,
+        "cached": False,
     }
 
 
 class VideoSolutionChatRequest(BaseModel):
     video_id: str
     question: str
+    current_time: Optional[float] = None  # Current video position in seconds
+    # Legacy clients upload the transcript; only used if the server has none stored
     transcript: Optional[str] = None
     segments: Optional[List[Dict]] = None
-    current_time: Optional[float] = None  # Current video position in seconds
+
+
+def format_timestamp(seconds: float) -> str:
+    """Format seconds as m:ss."""
+    return f"{int(seconds // 60)}:{int(seconds % 60):02d}"
 
 
 @app.post("/video-solution/chat")
@@ -1159,24 +2355,59 @@ async def video_solution_chat(req: VideoSolutionChatRequest):
     if not GEMINI_API_KEY:
         raise HTTPException(status_code=400, detail="GEMINI_API_KEY is not set.")
 
+    # Load segments from the store by video id; fall back to an uploaded transcript
+    tier = "memory" if transcript_store.is_index_cached(req.video_id) else "store"
+    index = await asyncio.to_thread(transcript_store.get_index, req.video_id)
+    if index is None and not req.segments:
+        # Not stored yet: join (or start) the shared fetch for a bounded time
+        job = start_transcript_job(req.video_id)
+        try:
+            # Shield so a slow fetch keeps running for the next request
+            await asyncio.wait_for(asyncio.shield(job.task), timeout=VIDEO_CHAT_TRANSCRIPT_WAIT_SECONDS)
+            index = await asyncio.to_thread(transcript_store.get_index, req.video_id)
+            tier = "fetch"
+        except asyncio.TimeoutError:
+            log("video_chat_transcript_pending", video_id=req.video_id, stage=job.stage)
+        except Exception as e:
+            log("video_chat_transcript_failed", level="warning", video_id=req.video_id, error=str(e))
+    chunk_index = None
+    if index is not None:
+        chunk_index = await asyncio.to_thread(transcript_store.get_chunk_index, req.video_id)
+    elif req.segments:
+        segments = normalize_segments(req.segments)
+        index = SegmentIndex(segments, "upload")
+        chunk_index = ChunkIndex(build_chunks(segments))
+        tier = "upload"
+    else:
+        tier = "miss"
+    transcript_lookups.inc(
+        route="video_chat", method=(index.method if index else None) or "none", tier=tier
+    )
+
+    # Pick the transcript chunks most relevant to the question and playback position
+    if chunk_index:
+        top_chunks = chunk_index.search(req.question, TRANSCRIPT_TOP_K, req.current_time)
+        transcript_context = "\n".join(
+            f"[{format_timestamp(chunk['start'])}] {chunk['text']}" for chunk in top_chunks
+        )
+    elif req.transcript:
+        transcript_context = req.transcript[:6000]
+    else:
+        transcript_context = "Not available"
+
     # If timestamp is provided and we have segments, filter to relevant portion
-    if req.current_time is not None and req.segments:
+    if req.current_time is not None and index:
         # Get segments around current timestamp (±30 seconds window)
         window_start = max(0, req.current_time - 30)
         window_end = req.current_time + 30
 
-        relevant_segments = [
-            seg for seg in req.segments
-            if window_start <= seg['start'] <= window_end
-        ]
+        relevant_segments = index.window(window_start, window_end)
 
         # Build context from relevant segments
         context_text = " ".join([seg['text'] for seg in relevant_segments])
 
         # Format timestamp for display
-        minutes = int(req.current_time // 60)
-        seconds = int(req.current_time % 60)
-        timestamp_str = f"{minutes}:{seconds:02d}"
+        timestamp_str = format_timestamp(req.current_time)
 
         prompt = f"""You are helping a user understand a LeetCode solution video.
 
@@ -1185,14 +2416,14 @@ The user paused the video at timestamp {timestamp_str} ({int(req.current_time)}
 RELEVANT TRANSCRIPT SECTION (around {timestamp_str}):
 {context_text}
 
-FULL TRANSCRIPT CONTEXT:
-{req.transcript[:6000] if req.transcript else "Not available"}
+RELATED TRANSCRIPT EXCERPTS (most relevant to the question):
+{transcript_context}
 
 The user's question is specifically about what's happening at {timestamp_str} in the video.
 
 Answer based on:
 1. The transcript section around their current timestamp
-2. The broader context from the full transcript
+2. The related excerpts from elsewhere in the video
 3. Your knowledge of algorithms and data structures
 
 Be specific and reference what's being explained at this point in the video.
@@ -1201,11 +2432,11 @@ User's question: {req.question}
 
 Provide a clear, focused answer about what's happening at {timestamp_str}:"""
     else:
-        # No timestamp provided - use full transcript
+        # No timestamp provided - use the excerpts most relevant to the question
         prompt = f"""You are helping a user understand a LeetCode solution video.
 
-VIDEO TRANSCRIPT:
-{req.transcript[:8000] if req.transcript else "Not available"}
+VIDEO TRANSCRIPT EXCERPTS (most relevant to the question):
+{transcript_context}
 
 The user is watching this solution and has a question. Answer based on:
 1. The transcript content
@@ -1219,8 +2450,8 @@ User's question: {req.question}
 
 Provide a clear, concise answer:"""
 
-    model = genai.GenerativeModel(GEMINI_MODEL)
-    response = await asyncio.to_thread(model.generate_content, prompt)
+    mark("context_built")
+    response = await generate_content("video_solution_chat", "video_chat", prompt)
 
     return {
         "answer": response.text,
@@ -1229,24 +2460,137 @@ Provide a clear, concise answer:"""
     }
 
 
-# Initialize file watcher on startup
+async def start_workspace_watcher():
+    """Walk the workspace and start watching it (off the startup critical path)."""
+    started = time.perf_counter()
+    if not WORKSPACE_DIR.exists():
+        log("workspace_missing", level="warning", path=WORKSPACE_DIR)
+        return
+
+    rules = IgnoreRules.for_workspace(
+        WORKSPACE_DIR, Path(WATCH_IGNORE_FILE) if WATCH_IGNORE_FILE else None
+    )
+    event_handler = CodeFileWatcher(WORKSPACE_DIR, asyncio.get_running_loop(), rules)
+    observer = Observer()
+    tree = PrunedWatcher(observer, event_handler, WORKSPACE_DIR, rules, max_roots=WATCH_MAX_ROOTS)
+    event_handler.tree = tree
+    # Store observer in app state for cleanup
+    app.state.observer = observer
+    app.state.watch_tree = tree
+    watched = await asyncio.to_thread(tree.add_tree, WORKSPACE_DIR)
+    observer.start()
+    startup_report["watcher_seconds"] = round(time.perf_counter() - started, 3)
+    log("workspace_watching", path=WORKSPACE_DIR, watches=watched, recursive_fallback=tree.fallback)
+
+
+def stop_workspace_watcher():
+    observer = getattr(app.state, 'observer', None)
+    if observer is not None:
+        # stop() also unschedules emitters left running by a failed start()
+        observer.stop()
+        if observer.is_alive():
+            observer.join()
+    app.state.observer = None
+
+
+async def watch_when_leader():
+    """Watch the workspace while this worker holds the watcher lease.
+
+    With the in-memory backend the lease is always granted. With a shared
+    backend one worker watches; the others retry and take over if it dies.
+    """
+    watching = False
+    failures = 0
+    while True:
+        try:
+            leader = await state_backend.acquire_lease("watcher", WORKER_ID, WATCH_LEASE_SECONDS)
+        except Exception as e:
+            log("watch_lease_failed", level="warning", error=str(e))
+            leader = False
+
+        if leader and not watching:
+            try:
+                await start_workspace_watcher()
+            except Exception as e:
+                # e.g. inotify limits; clean up, let another worker try, back off
+                failures += 1
+                delay = min(WATCH_LEASE_SECONDS / 3 * 2 ** failures, WATCH_START_MAX_BACKOFF)
+                log("watch_start_failed", level="error", worker=WORKER_ID, error=str(e),
+                    failures=failures, retry_in=delay)
+                await asyncio.to_thread(stop_workspace_watcher)
+                try:
+                    await state_backend.release_lease("watcher", WORKER_ID)
+                except Exception as release_error:
+                    log("watch_lease_release_failed", level="warning", error=str(release_error))
+                app.state.watching = False
+                await asyncio.sleep(delay)
+                continue
+            failures = 0
+            watching = True
+            log("watch_lease_acquired", worker=WORKER_ID)
+        elif not leader and watching:
+            await asyncio.to_thread(stop_workspace_watcher)
+            watching = False
+            log("watch_lease_lost", level="warning", worker=WORKER_ID)
+        app.state.watching = watching
+        await asyncio.sleep(WATCH_LEASE_SECONDS / 3)
+
+
+async def warm_up():
+    """Import heavy client libraries in the background so first use is fast."""
+    for name in WARMUP_MODULES:
+        started = time.perf_counter()
+        try:
+            await import_async(name)
+        except ImportError as e:
+            log("warmup_failed", level="warning", module=name, error=str(e))
+            continue
+        startup_report["warmup"][name] = round(time.perf_counter() - started, 3)
+    log("warmup_complete", modules=startup_report["warmup"])
+
+
+async def prepare_judge():
+    """Compile every problem's judge harness before the first submission."""
+    started = time.perf_counter()
+    try:
+        built = await asyncio.to_thread(judge.prepare)
+    except Exception as e:
+        log("judge_prepare_failed", level="warning", error=str(e))
+        return
+    startup_report["judge_seconds"] = round(time.perf_counter() - started, 3)
+    log("judge_ready", problems=built, cache_dir=JUDGE_CACHE_DIR)
+
+
 @app.on_event("startup")
 async def startup_event():
-    if WORKSPACE_DIR.exists():
-        print(f"👀 Watching workspace: {WORKSPACE_DIR}")
-        event_handler = CodeFileWatcher(WORKSPACE_DIR)
-        observer = Observer()
-        observer.schedule(event_handler, str(WORKSPACE_DIR), recursive=True)
-        observer.start()
-        
-        # Store observer in app state for cleanup
-        app.state.observer = observer
-    else:
-        print(f"⚠️  Workspace directory not found: {WORKSPACE_DIR}")
+    started = time.perf_counter()
+    if TOKEN_FILE.exists():
+        # Without a token there is nothing to refresh; auth_callback starts it later
+        start_youtube_refresher()
+
+    migrated = await asyncio.to_thread(transcript_store.migrate_json_dir, TRANSCRIPTS_CACHE_DIR)
+    if migrated:
+        log("transcripts_migrated", count=migrated, db=TRANSCRIPTS_DB.name)
+
+    # Subscribe before starting the listener so no startup event is dropped;
+    # the snapshot then skips files an event already brought up to date
+    state_backend.subscribe(apply_context_event)
+    await state_backend.start()
+    await load_context_snapshot()
+
+    app.state.watcher_startup = asyncio.create_task(watch_when_leader())
+    app.state.judge_warmup = asyncio.create_task(prepare_judge())
+    if WARMUP_MODULES:
+        app.state.warmup = asyncio.create_task(warm_up())
+
+    startup_report["startup_seconds"] = round(time.perf_counter() - started, 3)
+    log("startup_complete", **{k: v for k, v in startup_report.items() if k != "warmup"})
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    if hasattr(app.state, 'observer'):
-        app.state.observer.stop()
-        app.state.observer.join()
+    for task_name in ('youtube_refresher', 'watcher_startup', 'judge_warmup', 'warmup'):
+        if hasattr(app.state, task_name):
+            getattr(app.state, task_name).cancel()
+    stop_workspace_watcher()
+    await state_backend.close()
@@ -0,0 +1,107 @@
+"""
+ffmpeg helpers for the Whisper pipeline.
+
+Audio is re-encoded once to a speech-grade stream (mono, 16 kHz, low
+bitrate) and split at silence boundaries so chunks can be transcribed in
+parallel without cutting words in half.
+"""
+
+import re
+import subprocess
+from pathlib import Path
+from typing import List, Tuple
+
+SILENCE_START = re.compile(r"silence_start:\s*(-?[\d.]+)")
+SILENCE_END = re.compile(r"silence_end:\s*(-?[\d.]+)")
+
+
+def extract_speech_audio(source: Path, dest: Path, bitrate: str = "32k") -> Path:
+    """Re-encode any audio/video file to mono 16 kHz MP3 at a speech bitrate."""
+    subprocess.run(
+        [
+            "ffmpeg", "-y", "-loglevel", "error",
+            "-i", str(source),
+            "-vn", "-ac", "1", "-ar", "16000",
+            "-c:a", "libmp3lame", "-b:a", bitrate,
+            str(dest),
+        ],
+        check=True,
+        capture_output=True,
+    )
+    return dest
+
+
+def probe_duration(path: Path) -> float:
+    """Return the media duration in seconds."""
+    result = subprocess.run(
+        [
+            "ffprobe", "-v", "error",
+            "-show_entries", "format=duration",
+            "-of", "default=noprint_wrappers=1:nokey=1",
+            str(path),
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return float(result.stdout.strip())
+
+
+def detect_silences(path: Path, noise_db: int = -30, min_silence: float = 0.5) -> List[float]:
+    """Return the midpoint of every silent stretch, in seconds."""
+    result = subprocess.run(
+        [
+            "ffmpeg", "-hide_banner", "-nostats",
+            "-i", str(path),
+            "-af", f"silencedetect=noise={noise_db}dB:d={min_silence}",
+            "-f", "null", "-",
+        ],
+        capture_output=True,
+        text=True,
+    )
+    starts = [float(m) for m in SILENCE_START.findall(result.stderr)]
+    ends = [float(m) for m in SILENCE_END.findall(result.stderr)]
+    return [(start + end) / 2 for start, end in zip(starts, ends)]
+
+
+def plan_chunks(duration: float, cut_points: List[float], target: float,
+                tolerance: float = 0.25) -> List[Tuple[float, float]]:
+    """Split [0, duration] into ~target-second spans, cutting at silences when possible.
+
+    A silence within +/- tolerance * target of the ideal cut is preferred;
+    otherwise the span is cut hard at the target length.
+    """
+    chunks = []
+    position = 0.0
+    cut_points = sorted(cut_points)
+
+    while duration - position > target * (1 + tolerance):
+        ideal = position + target
+        window = target * tolerance
+        candidates = [c for c in cut_points if abs(c - ideal) <= window and c > position]
+        cut = min(candidates, key=lambda c: abs(c - ideal)) if candidates else ideal
+        chunks.append((position, cut))
+        position = cut
+
+    chunks.append((position, duration))
+    return chunks
+
+
+def split_audio(path: Path, chunks: List[Tuple[float, float]], out_dir: Path) -> List[Path]:
+    """Write each (start, end) span to its own file without re-encoding."""
+    paths = []
+    for index, (start, end) in enumerate(chunks):
+        chunk_path = out_dir / f"chunk_{index:03d}{path.suffix}"
+        subprocess.run(
+            [
+                "ffmpeg", "-y", "-loglevel", "error",
+                "-ss", f"{start:.3f}", "-t", f"{end - start:.3f}",
+                "-i", str(path),
+                "-c", "copy",
+                str(chunk_path),
+            ],
+            check=True,
+            capture_output=True,
+        )
+        paths.append(chunk_path)
+    return paths
@@ -0,0 +1,180 @@
+"""
+Local stand-ins for every upstream the backend calls.
+
+One FastAPI app serves:
+  POST /v1beta/models/{model}:generateContent    Gemini (REST transport)
+  POST /v1/text-to-speech/{voice}/stream         ElevenLabs streaming TTS
+  GET  /captions/{video_id}                      caption scraper (TRANSCRIPT_SCRAPER_URL)
+  POST /v1/audio/transcriptions                  OpenAI Whisper (OPENAI_BASE_URL=.../v1)
+
+Latency and streaming shape come from an UpstreamProfile, so a benchmark
+run is reproducible without network access.
+
+Run standalone:
+    python -m bench.fake_upstreams --port 9100 --gemini-latency 0.8
+"""
+
+import argparse
+import asyncio
+import json
+import random
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+class UpstreamProfile:
+    """Simulated upstream behavior (all times in seconds)."""
+
+    def __init__(
+        self,
+        gemini_latency: float = 0.6,
+        gemini_error_rate: float = 0.0,
+        tts_first_byte: float = 0.25,
+        tts_chunks: int = 20,
+        tts_chunk_interval: float = 0.05,
+        tts_chunk_bytes: int = 4096,
+        scraper_latency: float = 0.3,
+        whisper_latency: float = 2.0,
+        jitter: float = 0.2,
+    ):
+        self.gemini_latency = gemini_latency
+        self.gemini_error_rate = gemini_error_rate
+        self.tts_first_byte = tts_first_byte
+        self.tts_chunks = tts_chunks
+        self.tts_chunk_interval = tts_chunk_interval
+        self.tts_chunk_bytes = tts_chunk_bytes
+        self.scraper_latency = scraper_latency
+        self.whisper_latency = whisper_latency
+        self.jitter = jitter
+
+    def delay(self, base: float) -> float:
+        """base seconds, +/- jitter as a fraction of base."""
+        return max(0.0, base * (1 + random.uniform(-self.jitter, self.jitter)))
+
+    @classmethod
+    def add_arguments(cls, parser: argparse.ArgumentParser):
+        defaults = cls()
+        for name, value in vars(defaults).items():
+            parser.add_argument(f"--{name.replace('_', '-')}", type=type(value), default=value)
+
+    @classmethod
+    def from_args(cls, args: argparse.Namespace) -> "UpstreamProfile":
+        return cls(**{name: getattr(args, name) for name in vars(cls())})
+
+
+SAMPLE_VISUALIZATION = {
+    "title": "Bubble Sort",
+    "steps": [
+        {
+            "description": "Create the array",
+            "commands": [{"command": "CREATE_ARRAY", "id": "arr", "values": [5, 2, 8, 1, 9],
+                          "position": {"x": 100, "y": 200}}],
+        }
+    ],
+    "summary": "Bubble sort complete",
+}
+
+
+def fake_segments(video_id: str, count: int = 240) -> list:
+    words = ["two", "pointers", "hash", "map", "window", "left", "right", "complexity", "sorted", "array"]
+    rng = random.Random(video_id)
+    return [
+        {"start": i * 5.0, "duration": 5.0, "text": " ".join(rng.choice(words) for _ in range(12))}
+        for i in range(count)
+    ]
+
+
+def create_app(profile: UpstreamProfile) -> FastAPI:
+    upstream = FastAPI(title="Fake upstreams")
+    upstream.state.requests = {}
+
+    def count(name: str):
+        upstream.state.requests[name] = upstream.state.requests.get(name, 0) + 1
+
+    @upstream.post("/v1beta/models/{model_call}")
+    async def gemini_generate(model_call: str, request: Request):
+        count("gemini")
+        body = await request.json()
+        config = body.get("generationConfig") or body.get("generation_config") or {}
+        await asyncio.sleep(profile.delay(profile.gemini_latency))
+        if random.random() < profile.gemini_error_rate:
+            return JSONResponse({"error": {"code": 503, "message": "overloaded", "status": "UNAVAILABLE"}},
+                                status_code=503)
+
+        prompt = " ".join(
+            part.get("text", "") for content in body.get("contents", []) for part in content.get("parts", [])
+        )
+        if (config.get("responseMimeType") or config.get("response_mime_type")) == "application/json":
+            if "hint ladder" in prompt:  # generate_hints.py
+                text = json.dumps({"hints": [f"Hint {i}: what does the input look like?" for i in range(1, 9)]})
+            else:
+                text = json.dumps(SAMPLE_VISUALIZATION)
+        else:
+            text = "What do you think the loop invariant should be here?"
+        return {
+            "candidates": [{
+                "content": {"role": "model", "parts": [{"text": text}]},
+                "finishReason": "STOP",
+                "index": 0,
+            }],
+            # Rough 4-characters-per-token counts, so cost metrics have something to add up
+            "usageMetadata": {
+                "promptTokenCount": len(prompt) // 4,
+                "candidatesTokenCount": len(text) // 4,
+                "totalTokenCount": (len(prompt) + len(text)) // 4,
+            },
+        }
+
+    @upstream.post("/v1/text-to-speech/{voice_id}/stream")
+    async def tts_stream(voice_id: str):
+        count("tts")
+
+        async def audio():
+            await asyncio.sleep(profile.delay(profile.tts_first_byte))
+            chunk = b"\xff" * profile.tts_chunk_bytes
+            for i in range(profile.tts_chunks):
+                if i:
+                    await asyncio.sleep(profile.delay(profile.tts_chunk_interval))
+                yield chunk
+
+        return StreamingResponse(audio(), media_type="audio/mpeg")
+
+    @upstream.get("/captions/{video_id}")
+    async def captions(video_id: str):
+        count("scraper")
+        await asyncio.sleep(profile.delay(profile.scraper_latency))
+        return fake_segments(video_id)
+
+    @upstream.post("/v1/audio/transcriptions")
+    async def whisper(request: Request):
+        count("whisper")
+        await request.body()
+        await asyncio.sleep(profile.delay(profile.whisper_latency))
+        segments = fake_segments("whisper", 36)
+        return JSONResponse({
+            "text": " ".join(s["text"] for s in segments),
+            "language": "english",
+            "duration": 180.0,
+            "segments": [
+                {"id": i, "start": s["start"], "end": s["start"] + s["duration"], "text": s["text"]}
+                for i, s in enumerate(segments)
+            ],
+        })
+
+    @upstream.get("/stats")
+    async def stats():
+        return upstream.state.requests
+
+    return upstream
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve fake Gemini/ElevenLabs/YouTube/Whisper upstreams")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    UpstreamProfile.add_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(UpstreamProfile.from_args(args)), host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,361 @@
+"""
+Benchmark the backend against local fake upstreams.
+
+Starts bench/fake_upstreams.py in-process and the real app (uvicorn app:app)
+as a subprocess pointed at it, then drives each scenario at each concurrency
+level and prints one JSON document with throughput and p50/p95/p99 latency
+per scenario and metric. No network access or API keys are needed.
+
+Usage:
+    cd backend
+    python -m bench.run_bench --concurrency 1,8,32 --requests 64 --output bench.json
+    python -m bench.run_bench --scenarios voice,tts --gemini-latency 1.2
+
+Scenarios:
+    voice           /ws sessions: user_message turns, then /tts of each reply
+    execute         /execute bursts with ad hoc test cases (one process per test)
+    judge           /execute bursts by problem_id (registry tests, one cached harness)
+    tts             /tts streams (first byte and total); unique text, so no clip cache hits
+    transcript      /youtube/transcript for videos not yet stored (scraper path)
+    transcript_warm the same videos again, served from the store
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List
+
+import httpx
+import uvicorn
+import websockets
+
+from bench.fake_upstreams import UpstreamProfile, create_app
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+SCENARIOS = ["voice", "execute", "judge", "tts", "transcript", "transcript_warm"]
+
+EXECUTE_CODE = "n = int(input())\nprint(sum(range(n + 1)))\n"
+EXECUTE_TESTS = [{"input": str(n), "expected": str(n * (n + 1) // 2)} for n in (3, 10, 100)]
+JUDGE_CODE = (
+    "def two_sum(nums, target):\n"
+    "    seen = {}\n"
+    "    for i, n in enumerate(nums):\n"
+    "        if target - n in seen:\n"
+    "            return [seen[target - n], i]\n"
+    "        seen[n] = i\n"
+)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list.
+
+    >>> values = list(range(1, 21))
+    >>> percentile(values, 95), percentile(values, 50), percentile(values, 100)
+    (19, 10, 20)
+    >>> percentile([7], 99), percentile([], 50)
+    (7, 0.0)
+    """
+    if not sorted_values:
+        return 0.0
+    index = math.ceil(pct * len(sorted_values) / 100) - 1
+    return sorted_values[min(max(index, 0), len(sorted_values) - 1)]
+
+
+def summarize(samples: List[float]) -> Dict:
+    values = sorted(samples)
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 50) * 1000, 2),
+        "p95_ms": round(percentile(values, 95) * 1000, 2),
+        "p99_ms": round(percentile(values, 99) * 1000, 2),
+        "mean_ms": round(sum(values) / len(values) * 1000, 2) if values else 0.0,
+        "max_ms": round(values[-1] * 1000, 2) if values else 0.0,
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+            capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or "unknown"
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+
+
+class UpstreamServer:
+    """Fake upstreams served by uvicorn on a background thread."""
+
+    def __init__(self, profile: UpstreamProfile, port: int):
+        self.port = port
+        config = uvicorn.Config(create_app(profile), host="127.0.0.1", port=port, log_level="warning")
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self):
+        self.thread.start()
+        deadline = time.time() + 10
+        while not self.server.started:
+            if time.time() > deadline:
+                raise RuntimeError("Fake upstreams did not start")
+            time.sleep(0.05)
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
+
+
+class AppServer:
+    """The real backend as a uvicorn subprocess wired to the fake upstreams."""
+
+    def __init__(self, port: int, upstream_url: str, workdir: Path):
+        self.port = port
+        self.env = {
+            **os.environ,
+            "GEMINI_API_KEY": "bench",
+            "GEMINI_API_ENDPOINT": upstream_url,
+            "ELEVENLABS_API_KEY": "bench",
+            "ELEVENLABS_VOICE_ID": "bench-voice",
+            "ELEVENLABS_API_BASE": upstream_url,
+            "OPENAI_API_KEY": "bench",
+            "OPENAI_BASE_URL": f"{upstream_url}/v1",
+            "TRANSCRIPT_SCRAPER_URL": f"{upstream_url}/captions",
+            "TRANSCRIPTS_DB": str(workdir / "transcripts.db"),
+            "JUDGE_CACHE_DIR": str(workdir / "judge"),
+            "WORKSPACE_DIR": str(workdir / "workspace"),
+        }
+        (workdir / "workspace").mkdir(parents=True, exist_ok=True)
+        self.process = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self):
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1",
+             "--port", str(self.port), "--log-level", "warning"],
+            cwd=BACKEND_DIR, env=self.env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        deadline = time.time() + 60
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"App exited during startup (code {self.process.returncode})")
+            try:
+                if httpx.get(f"{self.url}/health", timeout=1).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError("App did not become healthy within 60s")
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+# Each operation returns {metric_name: [seconds, ...]}; a scenario aggregates them per metric
+Operation = Callable[[httpx.AsyncClient, int], Awaitable[Dict[str, List[float]]]]
+
+
+def make_operations(app_url: str, turns: int, run_id: str) -> Dict[str, Operation]:
+    ws_url = app_url.replace("http://", "ws://") + "/ws"
+
+    async def tts(client: httpx.AsyncClient, text: str) -> Dict[str, List[float]]:
+        start = time.perf_counter()
+        first_byte = None
+        async with client.stream("POST", "/tts", json={"text": text}) as resp:
+            resp.raise_for_status()
+            async for chunk in resp.aiter_bytes():
+                if first_byte is None and chunk:
+                    first_byte = time.perf_counter() - start
+        return {"tts_first_byte": [first_byte or 0.0], "tts_total": [time.perf_counter() - start]}
+
+    async def voice(client: httpx.AsyncClient, i: int):
+        samples: Dict[str, List[float]] = {"turn": [], "tts_first_byte": [], "tts_total": [], "session": []}
+        session_start = time.perf_counter()
+        async with websockets.connect(ws_url, max_size=None) as ws:
+            for turn in range(turns):
+                request_id = f"s{i}t{turn}"
+                start = time.perf_counter()
+                await ws.send(json.dumps({
+                    "type": "user_message",
+                    "text": "Why is my two pointer loop off by one?",
+                    "request_id": request_id,
+                }))
+                while True:
+                    reply = json.loads(await ws.recv())
+                    if reply.get("request_id") != request_id:
+                        continue
+                    if reply["type"] == "error":
+                        raise RuntimeError(reply.get("message"))
+                    if reply["type"] == "llm_message":
+                        break
+                samples["turn"].append(time.perf_counter() - start)
+                # Unique per turn: /tts caches clips, and this measures synthesis
+                spoken = f"{reply['text']} ({run_id} {request_id})"
+                for name, values in (await tts(client, spoken)).items():
+                    samples[name].extend(values)
+        samples["session"].append(time.perf_counter() - session_start)
+        return samples
+
+    async def execute(client: httpx.AsyncClient, i: int):
+        start = time.perf_counter()
+        resp = await client.post("/execute", json={"code": EXECUTE_CODE, "test_cases": EXECUTE_TESTS})
+        resp.raise_for_status()
+        if not resp.json().get("all_passed"):
+            raise RuntimeError("execute: tests did not pass")
+        return {"request": [time.perf_counter() - start]}
+
+    async def judge(client: httpx.AsyncClient, i: int):
+        start = time.perf_counter()
+        resp = await client.post("/execute", json={"code": JUDGE_CODE, "problem_id": "two-sum"})
+        resp.raise_for_status()
+        if not resp.json().get("all_passed"):
+            raise RuntimeError("judge: tests did not pass")
+        return {"request": [time.perf_counter() - start]}
+
+    async def tts_only(client: httpx.AsyncClient, i: int):
+        # Unique per request, so every call misses the /tts clip cache
+        return await tts(client, f"Think about what the left pointer means when the sum is too small. ({run_id} {i})")
+
+    async def transcript(client: httpx.AsyncClient, i: int):
+        start = time.perf_counter()
+        resp = await client.get(f"/youtube/transcript/bench-{run_id}-{i}", params={"wait": 60})
+        if resp.status_code != 200:
+            raise RuntimeError(f"transcript: HTTP {resp.status_code}")
+        return {"request": [time.perf_counter() - start]}
+
+    return {
+        "voice": voice,
+        "execute": execute,
+        "judge": judge,
+        "tts": tts_only,
+        "transcript": transcript,
+        "transcript_warm": transcript,
+    }
+
+
+async def run_scenario(app_url: str, operation: Operation, concurrency: int, total: int) -> Dict:
+    samples: Dict[str, List[float]] = {}
+    errors: List[str] = []
+    counter = iter(range(total))
+
+    async with httpx.AsyncClient(base_url=app_url, timeout=120) as client:
+        async def worker():
+            for i in counter:
+                try:
+                    for name, values in (await operation(client, i)).items():
+                        samples.setdefault(name, []).extend(values)
+                except Exception as e:
+                    errors.append(f"{type(e).__name__}: {e}")
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "operations": total,
+        "errors": len(errors),
+        "error_samples": errors[:3],
+        "wall_seconds": round(wall, 3),
+        "throughput_ops": round((total - len(errors)) / wall, 2) if wall else 0.0,
+        "latency": {name: summarize(values) for name, values in samples.items()},
+    }
+
+
+async def run_all(app_url: str, scenarios: List[str], levels: List[int], total: int, turns: int) -> Dict:
+    # Transcript video ids are unique per level so the cold pass never hits the
+    # store; the warm pass reuses them
+    run_ids = {level: f"{level}-{uuid.uuid4().hex[:6]}" for level in levels}
+    results: Dict[str, List[Dict]] = {}
+    for scenario in scenarios:
+        results[scenario] = []
+        for level in levels:
+            operations = make_operations(app_url, turns, run_ids[level])
+            if scenario == "transcript_warm" and "transcript" not in scenarios:
+                await run_scenario(app_url, operations["transcript"], level, total)  # seed the store
+            result = await run_scenario(app_url, operations[scenario], level, total)
+            results[scenario].append(result)
+            print(f"  {scenario} x{level}: {result['throughput_ops']} ops/s, {result['errors']} errors",
+                  file=sys.stderr)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the backend against fake upstreams")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"Comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=64, help="Operations per scenario and level")
+    parser.add_argument("--turns", type=int, default=3, help="Mentor turns per voice session")
+    parser.add_argument("--output", help="Write results to this file instead of stdout")
+    UpstreamProfile.add_arguments(parser)
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    profile = UpstreamProfile.from_args(args)
+
+    upstream = UpstreamServer(profile, free_port())
+    with tempfile.TemporaryDirectory(prefix="velocity-bench-") as workdir:
+        server = AppServer(free_port(), upstream.url, Path(workdir))
+        upstream.start()
+        try:
+            server.start()
+            print(f"Benchmarking {server.url} (upstreams at {upstream.url})", file=sys.stderr)
+            results = asyncio.run(run_all(server.url, scenarios, levels, args.requests, args.turns))
+        finally:
+            server.stop()
+            upstream.stop()
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": datetime.now().isoformat(),
+            "requests_per_level": args.requests,
+            "profile": vars(profile),
+        },
+        "scenarios": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text)
+        print(f"Wrote {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
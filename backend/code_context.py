@@ -0,0 +1,205 @@
+"""
+Structure-aware code context for prompts.
+
+Watched files are split into units (functions, classes and the module-level
+code between them) when they change, so nothing is parsed on the prompt
+path. For each question the units are ranked by how recently they were
+edited and how many of the question's identifiers they mention, then
+packed into a token budget. Unsupported languages (and Python that doesn't
+parse) fall back to a single whole-file unit.
+"""
+
+import ast
+import keyword
+import re
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+CAMEL_BOUNDARY = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+
+COMMON_WORDS = set(keyword.kwlist) | {
+    "self", "cls", "none", "true", "false", "return", "print", "the", "this",
+    "what", "why", "how", "my", "is", "it", "in", "on", "to", "of", "and", "do",
+    "does", "code", "function", "line", "can", "you", "me", "look", "at",
+}
+
+# How much each signal contributes to a unit's score
+RELEVANCE_WEIGHT = 0.6
+RECENCY_WEIGHT = 0.4
+RECENCY_HALF_LIFE = 300.0  # seconds
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for prompt budgeting (~4 characters per token)."""
+    return (len(text) + 3) // 4
+
+
+def identifier_terms(text: str) -> Set[str]:
+    """Lowercased identifier pieces, splitting snake_case and camelCase."""
+    terms = set()
+    for ident in IDENTIFIER.findall(text):
+        for part in CAMEL_BOUNDARY.sub("_", ident).split("_"):
+            part = part.lower()
+            if len(part) > 1 and part not in COMMON_WORDS:
+                terms.add(part)
+    return terms
+
+
+class CodeUnit:
+    """A contiguous, self-contained span of a file (1-based inclusive lines)."""
+
+    def __init__(self, name: str, kind: str, start: int, end: int, text: str):
+        self.name = name
+        self.kind = kind
+        self.start = start
+        self.end = end
+        self.text = text
+        self.tokens = estimate_tokens(text)
+        self.terms = identifier_terms(text)
+        self.edited_at = 0.0
+
+    @property
+    def key(self) -> Tuple[str, str]:
+        return (self.kind, self.name)
+
+
+def parse_units(filename: str, content: str) -> List[CodeUnit]:
+    lines = content.splitlines(keepends=True)
+    whole_file = [CodeUnit(filename, "file", 1, len(lines), content)] if content.strip() else []
+    if not filename.endswith(".py"):
+        return whole_file
+    try:
+        tree = ast.parse(content)
+    except SyntaxError:
+        return whole_file
+
+    units = []
+    covered = [False] * (len(lines) + 1)
+    for node in tree.body:
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            continue
+        start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+        end = node.end_lineno or node.lineno
+        kind = "class" if isinstance(node, ast.ClassDef) else "function"
+        units.append(CodeUnit(node.name, kind, start, end, "".join(lines[start - 1:end])))
+        for i in range(start, end + 1):
+            covered[i] = True
+
+    # Module-level code between definitions (imports, constants, driver code)
+    block_start = None
+    for i in range(1, len(lines) + 2):
+        in_block = i <= len(lines) and not covered[i]
+        if in_block and block_start is None:
+            block_start = i
+        elif not in_block and block_start is not None:
+            text = "".join(lines[block_start - 1:i - 1])
+            if text.strip():
+                units.append(CodeUnit(f"<module:{block_start}>", "module", block_start, i - 1, text))
+            block_start = None
+
+    units.sort(key=lambda u: u.start)
+    return units
+
+
+def omitted(first: int, last: int) -> str:
+    span = f"line {first}" if first == last else f"lines {first}-{last}"
+    return f"... ({span} omitted)\n"
+
+
+# Editor buffers have no filename; name them by language so only Python is parsed
+EDITOR_FILENAMES = {
+    "python": "editor.py",
+    "javascript": "editor.js",
+    "typescript": "editor.ts",
+    "java": "editor.java",
+    "cpp": "editor.cpp",
+}
+
+
+def editor_filename(language: Optional[str]) -> str:
+    """Filename for an editor buffer; unknown languages get a whole-file unit."""
+    if not language:
+        return "editor.py"  # older clients only send Python
+    return EDITOR_FILENAMES.get(language.lower(), "editor.txt")
+
+
+class CodeContextIndex:
+    """Parsed units for every watched file, with per-unit edit times."""
+
+    def __init__(self):
+        self.files: Dict[str, List[CodeUnit]] = {}
+
+    def update(self, filename: str, content: str, now: Optional[float] = None):
+        now = now if now is not None else time.time()
+        previous = {u.key: u for u in self.files.get(filename, [])}
+        units = parse_units(filename, content)
+        for unit in units:
+            prev = previous.get(unit.key)
+            unit.edited_at = prev.edited_at if prev and prev.text == unit.text else now
+        self.files[filename] = units
+
+    def remove(self, filename: str):
+        self.files.pop(filename, None)
+
+    def total_tokens(self) -> int:
+        return sum(u.tokens for units in self.files.values() for u in units)
+
+    def build(self, question: str, budget_tokens: int, file_order: List[str],
+              now: Optional[float] = None) -> str:
+        """Pack the best-scoring units into budget_tokens, grouped by file."""
+        now = now if now is not None else time.time()
+        query = identifier_terms(question)
+        mentioned = {w.lower() for w in IDENTIFIER.findall(question)}
+
+        scored = []
+        for filename, units in self.files.items():
+            for unit in units:
+                relevance = len(query & unit.terms) / len(query) if query else 0.0
+                if unit.name.lower() in mentioned:
+                    relevance += 1.0
+                recency = 0.5 ** (max(now - unit.edited_at, 0.0) / RECENCY_HALF_LIFE)
+                score = RELEVANCE_WEIGHT * relevance + RECENCY_WEIGHT * recency
+                scored.append((score, filename, unit))
+        scored.sort(key=lambda item: item[0], reverse=True)
+
+        chosen: Dict[str, List[CodeUnit]] = {}
+        remaining = budget_tokens
+        for score, filename, unit in scored:
+            if unit.tokens <= remaining:
+                chosen.setdefault(filename, []).append(unit)
+                remaining -= unit.tokens
+            elif not chosen and remaining > 0:
+                # Nothing fits whole: keep the head of the best unit rather than nothing
+                head = unit.text[:remaining * 4]
+                chosen.setdefault(filename, []).append(
+                    CodeUnit(unit.name, unit.kind, unit.start, unit.end, head + "\n... (truncated)\n")
+                )
+                remaining = 0
+
+        parts = []
+        for filename in file_order:
+            units = sorted(chosen.get(filename, []), key=lambda u: u.start)
+            if not units:
+                continue
+            all_units = self.files.get(filename, units)
+
+            def skipped(first: int, last: int, edge: bool) -> str:
+                # Lines outside every unit are blank; only mark gaps that drop code
+                if any(first <= u.start <= last for u in all_units):
+                    return omitted(first, last)
+                return "" if edge else "\n" * (last - first + 1)
+
+            body = []
+            last_end = 0
+            for unit in units:
+                if unit.start > last_end + 1:
+                    body.append(skipped(last_end + 1, unit.start - 1, edge=last_end == 0))
+                body.append(unit.text if unit.text.endswith("\n") else unit.text + "\n")
+                last_end = unit.end
+            total_lines = max(u.end for u in all_units)
+            if last_end < total_lines:
+                body.append(skipped(last_end + 1, total_lines, edge=True))
+            parts.append(f"### File: {filename}\n```\n{''.join(body)}```")
+
+        return "\n\n".join(parts)
@@ -0,0 +1,80 @@
+"""
+Build-time frontend asset preparation (run by the Dockerfile).
+
+1. Stamps /static/ script and stylesheet URLs in every HTML page with
+   ?v=<content hash>, so they can be cached as immutable (see static_assets.py).
+2. Writes gzip (.gz) and, if the brotli module is installed, brotli (.br)
+   variants next to each text asset when they are smaller than the original.
+
+Usage:
+    python compress_assets.py frontend
+"""
+
+import argparse
+import gzip
+import hashlib
+import re
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:  # gzip variants only
+    brotli = None
+
+COMPRESSIBLE_SUFFIXES = {".html", ".js", ".css", ".json", ".svg", ".txt", ".map", ".md"}
+STATIC_URL = re.compile(r"""((?:src|href)=["'])/static/([^"'?#]+)(["'])""")
+
+
+def content_version(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()[:10]
+
+
+def stamp_versions(root: Path) -> int:
+    """Add ?v=<hash> to /static/ URLs that point at files under root."""
+    stamped = 0
+    for page in root.rglob("*.html"):
+        html = page.read_text(encoding="utf-8")
+
+        def add_version(match):
+            nonlocal stamped
+            asset = root / match.group(2)
+            if not asset.is_file():
+                return match.group(0)
+            stamped += 1
+            return f"{match.group(1)}/static/{match.group(2)}?v={content_version(asset)}{match.group(3)}"
+
+        updated = STATIC_URL.sub(add_version, html)
+        if updated != html:
+            page.write_text(updated, encoding="utf-8")
+    return stamped
+
+
+def compress_tree(root: Path, min_bytes: int) -> int:
+    written = 0
+    for path in sorted(root.rglob("*")):
+        if not path.is_file() or path.suffix not in COMPRESSIBLE_SUFFIXES:
+            continue
+        data = path.read_bytes()
+        if len(data) < min_bytes:
+            continue
+
+        variants = [(".gz", gzip.compress(data, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append((".br", brotli.compress(data, quality=11)))
+        for suffix, compressed in variants:
+            if len(compressed) < len(data):
+                path.with_name(path.name + suffix).write_bytes(compressed)
+                written += 1
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Version and precompress frontend assets")
+    parser.add_argument("root", type=Path, help="Frontend directory")
+    parser.add_argument("--min-bytes", type=int, default=1024, help="Skip files smaller than this")
+    args = parser.parse_args()
+
+    stamped = stamp_versions(args.root)
+    written = compress_tree(args.root, args.min_bytes)
+    print(f"Versioned {stamped} asset URL(s), wrote {written} compressed variant(s)"
+          f"{'' if brotli else ' (brotli not installed, gzip only)'}")
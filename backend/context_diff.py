@@ -0,0 +1,47 @@
+"""
+Line-based patches for incremental context updates.
+
+A patch is a list of [start, end, lines] ops against the base version's
+lines (split on "\n" with endings kept, exactly as the browser splits them):
+lines[start:end] is replaced by `lines`. Ops are ordered by position and
+apply cleanly in reverse order, so clients don't need to track index shifts.
+"""
+
+import difflib
+import json
+import re
+from typing import List, Optional
+
+LINE_PATTERN = re.compile(r"[^\n]*\n|[^\n]+$")
+
+
+def split_lines(text: str) -> List[str]:
+    return LINE_PATTERN.findall(text)
+
+
+def make_patch(base: str, new: str) -> List[list]:
+    base_lines = split_lines(base)
+    new_lines = split_lines(new)
+    matcher = difflib.SequenceMatcher(None, base_lines, new_lines, autojunk=False)
+    return [
+        [i1, i2, new_lines[j1:j2]]
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+        if tag != 'equal'
+    ]
+
+
+def apply_patch(base: str, ops: List[list]) -> str:
+    lines = split_lines(base)
+    for start, end, replacement in reversed(ops):
+        lines[start:end] = replacement
+    return "".join(lines)
+
+
+def compact_patch(base: Optional[str], new: str) -> Optional[List[list]]:
+    """Return a patch only when it is smaller on the wire than the full content."""
+    if base is None:
+        return None
+    ops = make_patch(base, new)
+    if len(json.dumps(ops)) >= len(json.dumps(new)):
+        return None
+    return ops
@@ -0,0 +1,158 @@
+"""
+Pre-generate hint ladders for every problem in the catalog.
+
+Run this LOCALLY (or in CI) before deploying, like prefetch_transcripts.py.
+For each problem in problems.json, Gemini writes a graded ladder of Socratic
+hints under the mentor's SYSTEM_PROMPT rules. The ladders are written to
+hints.bundle (see hint_bundle.py), which gets bundled into the Docker image.
+At runtime a hint request against untouched starter code is answered from
+the bundle without a model call.
+
+Ladders whose problem, starter code and prompt are unchanged are kept, so
+a rerun only generates what's new; the bundle is rewritten after each
+problem, so an interrupted run resumes where it left off.
+
+Usage:
+    cd backend
+    python generate_hints.py
+    python generate_hints.py --steps 5 --model gemini-2.5-pro --force
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+import google.generativeai as genai
+from dotenv import load_dotenv
+
+from hint_bundle import HintBundle, code_fingerprint, write_bundle
+from prompts import SYSTEM_PROMPT
+
+BASE_DIR = Path(__file__).resolve().parent
+PROBLEMS_FILE = BASE_DIR / "problems.json"
+BUNDLE_PATH = BASE_DIR / "hints.bundle"
+
+HINT_LADDER_PROMPT = """Write a hint ladder for the problem "{title}" (LeetCode {number}).
+The student has only this starter code so far:
+
+{starter_code}
+
+Return JSON: {{"hints": [...]}} with exactly {steps} hints, each written as what you would say out loud
+when the student asks for a hint, in order:
+- Hint 1 is the gentlest nudge (a clarifying question or a tiny example); each hint gives a little more.
+- The last hint names the key insight or pattern, still without code or the full algorithm.
+- Each hint is one or two short sentences and ends with exactly ONE question.
+- Follow the voice rules: no code, no backticks, say complexities in words."""
+
+# Changes whenever the prompts do, so stale ladders get regenerated
+PROMPT_VERSION = hashlib.sha256((SYSTEM_PROMPT + HINT_LADDER_PROMPT).encode()).hexdigest()[:12]
+
+
+def validate_hints(hints, steps: int) -> List[str]:
+    if not isinstance(hints, list) or len(hints) < steps:
+        raise ValueError(f"expected {steps} hints, got {hints!r:.200}")
+    cleaned = [str(h).strip() for h in hints[:steps]]
+    for hint in cleaned:
+        if not hint or "```" in hint or "def " in hint:
+            raise ValueError(f"hint breaks the rules: {hint!r:.200}")
+    return cleaned
+
+
+def generate_ladder(model: "genai.GenerativeModel", slug: str, problem: Dict, steps: int) -> List[str]:
+    prompt = HINT_LADDER_PROMPT.format(
+        title=problem.get("title", slug),
+        number=problem.get("id", ""),
+        starter_code=problem.get("starter_code", ""),
+        steps=steps,
+    )
+    response = model.generate_content(f"{SYSTEM_PROMPT}\n{prompt}")
+    return validate_hints(json.loads(response.text).get("hints"), steps)
+
+
+async def generate(problems: Dict[str, Dict], bundle_path: Path, model_name: str, steps: int,
+                   concurrency: int, retries: int, force: bool) -> dict:
+    existing = HintBundle.load(bundle_path)
+    meta = {"model": model_name, "steps": steps, "prompt_version": PROMPT_VERSION}
+    reuse = not force and all(existing.meta.get(k) == v for k, v in meta.items() if k != "model")
+    ladders = {
+        slug: ladder for slug, ladder in existing.ladders().items()
+        if reuse and slug in problems
+        and ladder.get("starter") == code_fingerprint(problems[slug].get("starter_code", ""))
+    }
+
+    model = genai.GenerativeModel(
+        model_name,
+        generation_config={"response_mime_type": "application/json", "temperature": 0.4},
+    )
+    stats = {"kept": len(ladders), "generated": 0, "failed": 0}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def worker(slug: str, problem: Dict):
+        if slug in ladders:
+            return
+        async with semaphore:
+            for attempt in range(retries + 1):
+                try:
+                    hints = await asyncio.to_thread(generate_ladder, model, slug, problem, steps)
+                    break
+                except Exception as e:
+                    if attempt == retries:
+                        stats["failed"] += 1
+                        print(f"  ❌ Failed {slug}: {e}")
+                        return
+                    print(f"  ⚠️ {slug} attempt {attempt + 1} failed ({e}); retrying")
+
+        ladders[slug] = {"starter": code_fingerprint(problem.get("starter_code", "")), "hints": hints}
+        stats["generated"] += 1
+        write_bundle(bundle_path, ladders, {**meta, "generated_at": datetime.now().isoformat()})
+        print(f"  ✅ {slug}: {len(hints)} hints")
+
+    await asyncio.gather(*(worker(slug, problem) for slug, problem in problems.items()))
+    write_bundle(bundle_path, ladders, {**meta, "generated_at": datetime.now().isoformat()})
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-generate hint ladders into hints.bundle.")
+    parser.add_argument("--problems", type=Path, default=PROBLEMS_FILE, help="Problem registry")
+    parser.add_argument("--output", type=Path, default=BUNDLE_PATH, help="Bundle path")
+    parser.add_argument("--model", default=os.getenv("GEMINI_STRONG_MODEL", "gemini-2.5-pro"))
+    parser.add_argument("--steps", type=int, default=4, help="Hints per ladder")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum parallel generations")
+    parser.add_argument("--retries", type=int, default=2, help="Retries per problem after the first attempt")
+    parser.add_argument("--force", action="store_true", help="Regenerate every ladder")
+    args = parser.parse_args()
+
+    load_dotenv()
+    if not os.getenv("GEMINI_API_KEY"):
+        raise SystemExit("GEMINI_API_KEY is not set.")
+    endpoint = os.getenv("GEMINI_API_ENDPOINT")
+    if endpoint:
+        genai.configure(api_key=os.getenv("GEMINI_API_KEY"), transport="rest",
+                        client_options={"api_endpoint": endpoint})
+    else:
+        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+
+    problems = json.loads(args.problems.read_text())
+    print(f"Generating {args.steps}-step hint ladders for {len(problems)} problems "
+          f"with {args.model} into {args.output}\n")
+    started = time.perf_counter()
+    stats = asyncio.run(generate(problems, args.output, args.model, args.steps,
+                                 args.concurrency, args.retries, args.force))
+    elapsed = time.perf_counter() - started
+
+    print(f"\n{stats['generated'] + stats['kept']}/{len(problems)} ladders in {args.output} "
+          f"({stats['generated']} generated, {stats['kept']} kept, {stats['failed']} failed) in {elapsed:.1f}s.")
+    if stats["failed"]:
+        print("Re-run the same command to resume — finished ladders are kept.")
+    print("Now redeploy to Cloud Run — the ladders will be bundled in the image.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Precomputed hint ladders, stored as a compact indexed bundle.
+
+generate_hints.py writes one ladder per problem: graded Socratic hints,
+from a gentle nudge to the key insight. When a student asks for a hint
+and their code is still the starter code, the app serves the next step of
+the ladder instead of calling the model (see precomputed_hint in app.py).
+
+Bundle layout (hints.bundle):
+    b"VHB1"                      magic
+    4-byte big-endian length     of the index
+    index                        JSON: {"meta": {...}, "problems": {slug: [offset, length]}}
+    blobs                        zlib-compressed JSON per problem:
+                                 {"starter": <fingerprint>, "hints": [...]}
+
+Only the index is read at startup; each problem's ladder is inflated on
+first use.
+"""
+
+import hashlib
+import json
+import os
+import re
+import struct
+import zlib
+from pathlib import Path
+from typing import Dict, Optional
+
+MAGIC = b"VHB1"
+
+# Short requests for help getting started or for the next hint
+HINT_WORD = r"(hints?|clues?|nudges?)"
+# Only phrasings that ask for help; a bare "hint" or "stuck" also shows up in
+# "the hint you gave me" or "the stuck flag"
+HINT_REQUEST = re.compile(
+    r"^\W*(" + HINT_WORD + r"|stuck)\W*(please\W*)?$|"
+    r"\b(give|show|send|need|want|have|get|got) (me )?(a|an|another|one more|some|any|the next)"
+    r"( (small|little|quick|tiny))? " + HINT_WORD + r"\b|"
+    r"\b(any|another|one more|next|small|little|quick) " + HINT_WORD + r"\b|"
+    r"\b" + HINT_WORD + r",? please\b|"
+    r"\b(i'?m|i am|i'?ve been|i got|i'?m (so|really|kind of|a bit)) stuck\b|"
+    r"\b(where|how) (do|should|can) i (start|begin)\b|"
+    r"\b(don'?t|do not) know (how|where) to (start|begin)\b|"
+    r"\b(get me started|help me (start|get started)|point me in the right direction)\b",
+    re.IGNORECASE,
+)
+# A negation a few words before the hint word: "don't give me a hint", "not stuck"
+HINT_REFUSAL = re.compile(
+    r"\b(don'?t|do not|doesn'?t|no|not|never|without|stop)( [\w']+){0,3} (" + HINT_WORD[1:-1] + r"|stuck)\b",
+    re.IGNORECASE,
+)
+HINT_REQUEST_MAX_WORDS = 16
+
+
+def is_hint_request(text: str) -> bool:
+    """True for a short request for a hint or help getting started.
+
+    >>> is_hint_request("any hints?"), is_hint_request("Can I get a hint")
+    (True, True)
+    >>> is_hint_request("I'm stuck, where do I start?")
+    True
+    >>> is_hint_request("I don't know, any hint?"), is_hint_request("hint please")
+    (True, True)
+    >>> is_hint_request("Why does my loop skip the last element?")
+    False
+    >>> is_hint_request("Please don't give me a hint, I want to try it myself")
+    False
+    >>> is_hint_request("no hints please"), is_hint_request("I'm not stuck anymore, thanks!")
+    (False, False)
+    >>> is_hint_request("The hint you gave me earlier was confusing")
+    False
+    >>> is_hint_request("What does the stuck variable do")
+    False
+    """
+    return (
+        len(text.split()) <= HINT_REQUEST_MAX_WORDS
+        and bool(HINT_REQUEST.search(text))
+        and not HINT_REFUSAL.search(text)
+    )
+
+
+def code_fingerprint(code: str) -> str:
+    """Hash of code with line endings, trailing spaces and blank lines normalized."""
+    lines = [line.rstrip() for line in code.replace("\r\n", "\n").split("\n")]
+    normalized = "\n".join(line for line in lines if line)
+    return hashlib.sha256(normalized.encode()).hexdigest()[:16]
+
+
+def write_bundle(path: Path, ladders: Dict[str, Dict], meta: Dict):
+    """Write ladders ({slug: {"starter": ..., "hints": [...]}}) to path atomically."""
+    blobs = []
+    index = {}
+    offset = 0
+    for slug, ladder in sorted(ladders.items()):
+        blob = zlib.compress(json.dumps(ladder, separators=(",", ":")).encode(), 9)
+        index[slug] = [offset, len(blob)]
+        blobs.append(blob)
+        offset += len(blob)
+
+    header = json.dumps({"meta": meta, "problems": index}, separators=(",", ":")).encode()
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + struct.pack(">I", len(header)) + header)
+        for blob in blobs:
+            f.write(blob)
+    os.replace(tmp, path)
+
+
+class HintBundle:
+    """Read side of hints.bundle; a missing file is an empty bundle."""
+
+    def __init__(self, data: bytes = b""):
+        self.meta: Dict = {}
+        self.index: Dict[str, list] = {}
+        self._data = data
+        self._body = 0
+        self._ladders: Dict[str, Dict] = {}
+        if data:
+            if data[:4] != MAGIC:
+                raise ValueError("Not a hint bundle")
+            (length,) = struct.unpack(">I", data[4:8])
+            header = json.loads(data[8:8 + length])
+            self.meta = header.get("meta", {})
+            self.index = header["problems"]
+            self._body = 8 + length
+
+    @classmethod
+    def load(cls, path: Path) -> "HintBundle":
+        if not path.exists():
+            return cls()
+        return cls(path.read_bytes())
+
+    def ladder(self, slug: str) -> Optional[Dict]:
+        if slug in self._ladders:
+            return self._ladders[slug]
+        entry = self.index.get(slug)
+        if entry is None:
+            return None
+        offset, length = entry
+        start = self._body + offset
+        ladder = json.loads(zlib.decompress(self._data[start:start + length]))
+        self._ladders[slug] = ladder
+        return ladder
+
+    def ladders(self) -> Dict[str, Dict]:
+        return {slug: self.ladder(slug) for slug in self.index}
+
+    def __len__(self):
+        return len(self.index)
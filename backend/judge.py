@@ -0,0 +1,383 @@
+"""
+Server-side problem registry and judge.
+
+problems.json holds each problem's entry function and its full test suite,
+including hidden tests the browser never sees, so /execute only needs a
+problem_id and the code. The registry is loaded once at startup.
+
+Each problem gets a judge harness: HARNESS_TEMPLATE with that problem's
+entry function and adapter filled in, byte-compiled once and cached on disk
+(the .pyc is run directly, so there is nothing to compile per submission).
+A submission runs in a single subprocess that loads the code once and
+calls the entry function for every test, instead of starting one
+interpreter per test case.
+
+Judge.run talks to the harness in lock step over two dedicated pipes: it
+sends one test's arguments, waits for what the entry function returned,
+then sends the next. Expected values and the comparison stay in this
+process, and no test's input is in the submission's process before its
+turn, so a submission can't read other tests or tamper with the verdict.
+
+Hidden tests report only pass/fail and the kind of error, never their
+input, expected value or what the submission returned (which could echo
+the input).
+"""
+
+import hashlib
+import json
+import os
+import py_compile
+import select
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Node cap when converting a returned linked list (guards against cycles)
+LINKED_LIST_LIMIT = 100_000
+# Slack on top of the time limit before an unresponsive harness is killed
+HARNESS_GRACE_SECONDS = 2.0
+# Largest single message accepted from a harness
+MAX_RESULT_BYTES = 8 * 1024 * 1024
+TIMEOUT_ERROR = "Timeout: Code took too long to execute"
+
+# Runs as its own process: python <harness>.pyc <solution.py> <args fd> <results fd>
+HARNESS_TEMPLATE = '''\
+import contextlib, copy, io, json, os, signal, sys
+
+FUNCTION = {function!r}
+ADAPTER = {adapter!r}
+TIME_LIMIT = {time_limit!r}
+LINKED_LIST_LIMIT = {linked_list_limit!r}
+
+
+class Timeout(Exception):
+    pass
+
+
+def on_alarm(signum, frame):
+    raise Timeout()
+
+
+class ListNode:
+    def __init__(self, val=0, next=None):
+        self.val = val
+        self.next = next
+
+
+def to_linked(values, node_class):
+    head = None
+    for value in reversed(values):
+        head = node_class(value, head)
+    return head
+
+
+def from_linked(node):
+    values = []
+    while node is not None and len(values) <= LINKED_LIST_LIMIT:
+        values.append(node.val)
+        node = node.next
+    return values
+
+
+def normalize(value):
+    if isinstance(value, (list, tuple)):
+        return [normalize(v) for v in value]
+    return value
+
+
+def describe(error):
+    return "".join(f"{{type(error).__name__}}: {{error}}".splitlines(True)[:5])
+
+
+def timed(call):
+    signal.setitimer(signal.ITIMER_REAL, TIME_LIMIT)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            return call()
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+def outcome(actual):
+    """What the call returned: the value if it is JSON data, and always its repr."""
+    result = {{"repr": repr(actual)}}
+    try:
+        json.dumps(actual)
+        result["value"] = actual
+    except (TypeError, ValueError):
+        pass
+    return result
+
+
+def main(path, args_fd, results_fd):
+    # One line per message in each direction, on dedicated fds (never stdio).
+    # The parent sends a test's arguments only after the previous result, so
+    # no other test's input is ever in this process, and expected values and
+    # the comparison stay in the parent.
+    inbox = os.fdopen(args_fd, "r")
+    out = os.fdopen(results_fd, "w")
+
+    def send(message):
+        out.write(json.dumps(message) + "\\n")
+        out.flush()
+
+    signal.signal(signal.SIGALRM, on_alarm)
+    namespace = {{"__name__": "solution"}}
+    load_error = None
+    try:
+        code = compile(open(path).read(), "solution.py", "exec")
+        timed(lambda: exec(code, namespace))
+    except Timeout:
+        load_error = "Timeout: Code took too long to execute"
+    except BaseException as e:
+        load_error = describe(e)
+    func = namespace.get(FUNCTION)
+    if load_error is None and not callable(func):
+        load_error = f"NameError: function {{FUNCTION}}() is not defined"
+    send({{"error": load_error}})
+    if load_error:
+        return
+
+    for line in inbox:
+        args = json.loads(line)
+        if ADAPTER == "linked_list":
+            node_class = namespace.get("ListNode", ListNode)
+            args = [to_linked(a, node_class) for a in args]
+        try:
+            actual = timed(lambda: func(*args))
+            if ADAPTER == "linked_list":
+                actual = from_linked(actual)
+            send(outcome(normalize(actual)))
+        except Timeout:
+            send({{"error": "Timeout: Code took too long to execute"}})
+        except BaseException as e:
+            send({{"error": describe(e)}})
+
+
+main(sys.argv[1], int(sys.argv[2]), int(sys.argv[3]))
+'''
+
+
+def matches(actual, expected, compare: str = "exact") -> bool:
+    """Compare a returned value with the expected one under the problem's rule."""
+    try:
+        if compare == "unordered":
+            return sorted(actual) == sorted(expected)
+        if compare == "unordered_nested":
+            return sorted(sorted(x) for x in actual) == sorted(sorted(x) for x in expected)
+    except TypeError:
+        return False
+    return actual == expected
+
+
+class ProblemRegistry:
+    """Problems by slug (e.g. "two-sum"), also reachable by numeric id."""
+
+    def __init__(self, problems: Dict[str, Dict]):
+        self.problems = problems
+        self.aliases = {str(p["id"]): slug for slug, p in problems.items() if "id" in p}
+
+    @classmethod
+    def load(cls, path: Path) -> "ProblemRegistry":
+        if not path.exists():
+            return cls({})
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def resolve(self, problem_id: str) -> Optional[str]:
+        if problem_id in self.problems:
+            return problem_id
+        return self.aliases.get(problem_id)
+
+    def __len__(self):
+        return len(self.problems)
+
+
+class Judge:
+    """Builds, caches and runs per-problem harnesses."""
+
+    def __init__(self, registry: ProblemRegistry, cache_dir: Path, time_limit: float = 5.0):
+        self.registry = registry
+        self.cache_dir = cache_dir
+        self.time_limit = time_limit
+        self._harnesses: Dict[str, Path] = {}
+        self._lock = threading.Lock()
+
+    def harness(self, slug: str) -> Path:
+        """Compiled harness for a problem (built on first use, then cached)."""
+        path = self._harnesses.get(slug)
+        if path is not None:
+            return path
+        with self._lock:
+            if slug not in self._harnesses:
+                self._harnesses[slug] = self._build(slug)
+            return self._harnesses[slug]
+
+    def _build(self, slug: str) -> Path:
+        problem = self.registry.problems[slug]
+        source = HARNESS_TEMPLATE.format(
+            function=problem["function"],
+            adapter=problem.get("adapter"),
+            time_limit=self.time_limit,
+            linked_list_limit=LINKED_LIST_LIMIT,
+        )
+        # Keyed by content and interpreter, so a changed registry or Python
+        # version never reuses a stale file
+        digest = hashlib.sha256((source + sys.version).encode()).hexdigest()[:12]
+        compiled = self.cache_dir / f"{slug}-{digest}.pyc"
+        if not compiled.exists():
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile("w", suffix=".py", dir=self.cache_dir, delete=False) as f:
+                f.write(source)
+            try:
+                py_compile.compile(f.name, cfile=str(compiled), doraise=True)
+            finally:
+                Path(f.name).unlink(missing_ok=True)
+        return compiled
+
+    def prepare(self) -> int:
+        """Build every harness ahead of the first submission."""
+        for slug in self.registry.problems:
+            self.harness(slug)
+        return len(self._harnesses)
+
+    def run(self, slug: str, code: str) -> Dict:
+        """Judge a submission (blocking; called in a worker thread)."""
+        problem = self.registry.problems[slug]
+        tests = problem["tests"]
+        compare = problem.get("compare", "exact")
+        harness = self.harness(slug)
+        with tempfile.NamedTemporaryFile("w", suffix=".py", delete=False) as f:
+            f.write(code)
+            solution = f.name
+
+        args_read, args_write = os.pipe()
+        results_read, results_write = os.pipe()
+        stderr_file = tempfile.TemporaryFile()
+        # Visible tests go first, so nothing a visible result shows (output,
+        # error, stderr) can echo a hidden test's input
+        order = sorted(range(len(tests)), key=lambda i: tests[i].get("hidden", False))
+        outcomes: List[Dict] = []
+        failure = None
+        try:
+            # Same interpreter that compiled the harness, so the .pyc magic matches
+            process = subprocess.Popen(
+                [sys.executable, str(harness), solution, str(args_read), str(results_write)],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=stderr_file,
+                pass_fds=(args_read, results_write),
+            )
+            os.close(args_read)
+            os.close(results_write)
+            reader = HarnessReader(results_read)
+            try:
+                loaded = reader.read(self.time_limit + HARNESS_GRACE_SECONDS)
+                if loaded is not None and loaded.get("error"):
+                    outcomes = [{"error": str(loaded["error"])}] * len(tests)
+                elif loaded is not None:
+                    with os.fdopen(args_write, "w") as inbox:
+                        args_write = None
+                        for i in order:
+                            inbox.write(json.dumps(tests[i]["args"]) + "\n")
+                            inbox.flush()
+                            outcome = reader.read(self.time_limit + HARNESS_GRACE_SECONDS)
+                            if outcome is None:
+                                break
+                            outcomes.append(outcome)
+            except BrokenPipeError:
+                pass  # the harness died; handled below
+            finally:
+                if process.poll() is None:
+                    process.kill()
+                process.wait()
+
+            if len(outcomes) < len(tests):
+                if reader.timed_out:
+                    failure = TIMEOUT_ERROR
+                else:
+                    stderr_file.seek(0)
+                    stderr = stderr_file.read().decode("utf-8", "replace").strip()
+                    failure = f"Judge exited with code {process.returncode}"
+                    # stderr may echo the arguments of the test that was running
+                    if stderr and not tests[order[len(outcomes)]].get("hidden", False):
+                        failure = "\n".join(stderr.splitlines()[-5:])
+        finally:
+            for fd in (args_read, args_write, results_read, results_write):
+                if fd is not None:
+                    try:
+                        os.close(fd)
+                    except OSError:
+                        pass  # already closed
+            stderr_file.close()
+            Path(solution).unlink(missing_ok=True)
+        outcomes += [{"error": failure}] * (len(tests) - len(outcomes))
+        outcomes = [outcome for _, outcome in sorted(zip(order, outcomes))]
+
+        results = []
+        for i, (test, outcome) in enumerate(zip(tests, outcomes)):
+            hidden = test.get("hidden", False)
+            error = outcome.get("error")
+            error = None if error is None else str(error)
+            passed = error is None and "value" in outcome and matches(outcome["value"], test["expected"], compare)
+            if hidden:
+                # The submission controls what it returns and raises, so either
+                # could echo a hidden input; only say how it failed
+                output = None
+                error = error and error.split(":", 1)[0]
+            else:
+                output = str(outcome.get("repr", ""))
+            results.append({
+                "test_num": i + 1,
+                "input": None if hidden else ", ".join(repr(a) for a in test["args"]),
+                "expected": None if hidden else repr(test["expected"]),
+                "output": output,
+                "passed": passed,
+                "error": error,
+                "hidden": hidden,
+            })
+
+        passed_tests = sum(1 for r in results if r["passed"])
+        return {
+            "success": True,
+            "problem_id": slug,
+            "all_passed": passed_tests == len(results),
+            "results": results,
+            "total_tests": len(results),
+            "passed_tests": passed_tests,
+        }
+
+
+class HarnessReader:
+    """Reads the harness's one-JSON-object-per-line messages with a deadline."""
+
+    def __init__(self, fd: int):
+        self.fd = fd
+        self.buffer = b""
+        self.timed_out = False
+
+    def read(self, timeout: float) -> Optional[Dict]:
+        """The next message, or None on timeout, EOF or a malformed line."""
+        deadline = time.monotonic() + timeout
+        while b"\n" not in self.buffer:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.timed_out = True
+                return None
+            ready, _, _ = select.select([self.fd], [], [], remaining)
+            if not ready:
+                continue
+            chunk = os.read(self.fd, 65536)
+            if not chunk or len(self.buffer) + len(chunk) > MAX_RESULT_BYTES:
+                return None
+            self.buffer += chunk
+        line, _, self.buffer = self.buffer.partition(b"\n")
+        try:
+            message = json.loads(line)
+        except ValueError:
+            return None
+        return message if isinstance(message, dict) else None
@@ -0,0 +1,174 @@
+"""
+Model routing by request class.
+
+Each route (request class: "mentor", "visualization", "video_chat") has an
+ordered list of model tiers, e.g. a fast model for short mentor turns and a
+stronger one for structured visualization JSON. Every call's latency and
+outcome go into a rolling window per (route, model). When a tier's p95
+latency exceeds the route's budget or its error rate is too high, it is
+tripped for a cooldown: the route downgrades to its next tier and the
+tripped one is only used as a last resort. After the cooldown the tier is
+tried again with a fresh window.
+
+Specs are "route=model,model;route=model" strings, e.g.
+    MODEL_ROUTES="mentor=gemini-2.5-flash-lite,gemini-2.5-flash"
+    MODEL_P95_BUDGETS="mentor=3;visualization=30"
+    MODEL_PRICES="gemini-2.5-flash=0.30/2.50"   (USD per 1M input/output tokens)
+"""
+
+import math
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+# USD per 1M tokens (input, output); unknown models are counted at zero cost
+DEFAULT_PRICES = {
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-pro": (1.25, 10.00),
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-2.0-flash-lite": (0.075, 0.30),
+}
+
+
+def parse_spec(spec: str) -> Dict[str, str]:
+    """Parse "a=x;b=y" into {"a": "x", "b": "y"}."""
+    parsed = {}
+    for part in spec.split(";"):
+        name, sep, value = part.partition("=")
+        if sep and name.strip():
+            parsed[name.strip()] = value.strip()
+    return parsed
+
+
+def parse_routes(spec: str) -> Dict[str, List[str]]:
+    return {
+        route: [m.strip() for m in models.split(",") if m.strip()]
+        for route, models in parse_spec(spec).items()
+    }
+
+
+def parse_prices(spec: str) -> Dict[str, Tuple[float, float]]:
+    prices = {}
+    for model, value in parse_spec(spec).items():
+        prompt_price, _, output_price = value.partition("/")
+        prices[model] = (float(prompt_price), float(output_price or prompt_price))
+    return prices
+
+
+class RollingStats:
+    """Latency and outcome of the last `window` calls."""
+
+    def __init__(self, window: int):
+        self.samples: Deque[Tuple[float, bool]] = deque(maxlen=window)
+
+    def add(self, seconds: float, ok: bool):
+        self.samples.append((seconds, ok))
+
+    def __len__(self):
+        return len(self.samples)
+
+    def p95(self) -> float:
+        if not self.samples:
+            return 0.0
+        latencies = sorted(seconds for seconds, _ in self.samples)
+        return latencies[max(0, math.ceil(0.95 * len(latencies)) - 1)]
+
+    def error_rate(self) -> float:
+        if not self.samples:
+            return 0.0
+        return sum(1 for _, ok in self.samples if not ok) / len(self.samples)
+
+
+class ModelRouter:
+    """Chooses the model order for each route from recent latency and errors."""
+
+    def __init__(
+        self,
+        routes: Dict[str, List[str]],
+        p95_budgets: Dict[str, float],
+        max_error_rate: float = 0.25,
+        window: int = 50,
+        min_samples: int = 10,
+        cooldown: float = 60.0,
+        prices: Optional[Dict[str, Tuple[float, float]]] = None,
+    ):
+        self.routes = routes
+        self.p95_budgets = p95_budgets
+        self.max_error_rate = max_error_rate
+        self.window = window
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        self.prices = {**DEFAULT_PRICES, **(prices or {})}
+        self._stats: Dict[Tuple[str, str], RollingStats] = {}
+        self._tripped_until: Dict[Tuple[str, str], float] = {}
+
+    def _window(self, route: str, model: str) -> RollingStats:
+        key = (route, model)
+        if key not in self._stats:
+            self._stats[key] = RollingStats(self.window)
+        return self._stats[key]
+
+    def is_tripped(self, route: str, model: str) -> bool:
+        until = self._tripped_until.get((route, model))
+        if until is None:
+            return False
+        if time.monotonic() >= until:
+            del self._tripped_until[(route, model)]
+            return False
+        return True
+
+    def candidates(self, route: str) -> List[str]:
+        """Models to try, in order: healthy tiers first, tripped ones as a last resort."""
+        models = self.routes[route]
+        healthy = [m for m in models if not self.is_tripped(route, m)]
+        return healthy + [m for m in models if m not in healthy]
+
+    def record(self, route: str, model: str, seconds: float, ok: bool) -> Optional[str]:
+        """Add a call to the window; returns the trip reason if this call tripped the tier."""
+        stats = self._window(route, model)
+        stats.add(seconds, ok)
+        if len(stats) < self.min_samples or self.is_tripped(route, model):
+            return None
+
+        reason = None
+        budget = self.p95_budgets.get(route)
+        if stats.error_rate() > self.max_error_rate:
+            reason = "error_rate"
+        elif budget is not None and stats.p95() > budget:
+            reason = "latency"
+        # Never trip the only tier; there is nothing to downgrade to
+        if reason and len(self.routes[route]) > 1:
+            self._tripped_until[(route, model)] = time.monotonic() + self.cooldown
+            self._stats[(route, model)] = RollingStats(self.window)
+            return reason
+        return None
+
+    def attempt_timeout(self, route: str) -> float:
+        """How long to wait on a tier before failing over: twice the route's p95 budget."""
+        return 2 * self.p95_budgets.get(route, 30.0)
+
+    def cost(self, model: str, prompt_tokens: int, output_tokens: int) -> float:
+        prompt_price, output_price = self.prices.get(model, (0.0, 0.0))
+        return (prompt_tokens * prompt_price + output_tokens * output_price) / 1_000_000
+
+    def status(self) -> Dict:
+        """Per-route tier health, for /health."""
+        report = {}
+        for route, models in self.routes.items():
+            tiers = []
+            for model in models:
+                stats = self._stats.get((route, model))
+                tiers.append({
+                    "model": model,
+                    "tripped": self.is_tripped(route, model),
+                    "samples": len(stats) if stats else 0,
+                    "p95_seconds": round(stats.p95(), 3) if stats else None,
+                    "error_rate": round(stats.error_rate(), 3) if stats else None,
+                })
+            report[route] = {
+                "active": self.candidates(route)[0],
+                "p95_budget_seconds": self.p95_budgets.get(route),
+                "tiers": tiers,
+            }
+        return report
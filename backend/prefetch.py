@@ -0,0 +1,127 @@
+"""
+Caches and task helpers for speculative prefetch.
+
+When a user opens a problem, the backend starts the work their first real
+interaction will need (the solution video's transcript, the mentor's
+opening turn and its audio) in the background. Results go into caches,
+so the real request finds them warm.
+
+- LruCache: bounded by entry count and total size (bytes or characters).
+- SingleFlight: one in-flight task per key, shared by every caller. A real
+  request that arrives while a prefetch is still generating joins it
+  instead of starting a duplicate. The shared task is cancelled only when
+  every caller waiting on it has been cancelled.
+- PrefetchGroup: the tasks started for one opened problem, cancelled
+  together when the user leaves the page or opens another problem.
+"""
+
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set
+
+
+class LruCache:
+    """Least-recently-used cache bounded by entry count and total len() of values."""
+
+    def __init__(self, max_entries: int = 256, max_size: Optional[int] = None):
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.size = 0
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        if self.max_size is not None and len(value) > self.max_size:
+            return  # would evict everything else
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.size -= len(old)
+        self._entries[key] = value
+        self.size += len(value)
+        while len(self._entries) > self.max_entries or (self.max_size is not None and self.size > self.max_size):
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SingleFlight:
+    """Run at most one task per key; concurrent callers share its result."""
+
+    def __init__(self):
+        self._flights: Dict[Hashable, Dict] = {}
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._flights
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = {"task": asyncio.create_task(factory()), "waiters": 0}
+            self._flights[key] = flight
+
+            def forget(_task, key=key, flight=flight):
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+
+            flight["task"].add_done_callback(forget)
+
+        flight["waiters"] += 1
+        try:
+            # Shielded so one caller's cancellation doesn't cancel the others' work
+            return await asyncio.shield(flight["task"])
+        except asyncio.CancelledError:
+            if flight["waiters"] == 1:
+                flight["task"].cancel()  # nobody else is waiting for it
+            raise
+        finally:
+            flight["waiters"] -= 1
+
+
+class PrefetchGroup:
+    """Background warm-up tasks for one opened problem."""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.tasks: Set[asyncio.Task] = set()
+        self.results: Dict[str, str] = {}  # step -> "warm" | "ok" | "skipped" | "error" | "cancelled"
+        self.errors: Dict[str, str] = {}
+        self.cancelled = False
+
+    def spawn(self, step: str, factory: Callable[[], Awaitable[str]]) -> asyncio.Task:
+        async def run():
+            try:
+                self.results[step] = await factory()
+            except asyncio.CancelledError:
+                self.results[step] = "cancelled"
+                raise
+            except Exception as e:
+                self.results[step] = "error"
+                self.errors[step] = str(e)
+            return self.results[step]
+
+        task = asyncio.create_task(run())
+        self.tasks.add(task)
+        return task
+
+    async def wait(self) -> Dict[str, str]:
+        """Wait for every step, including ones spawned by other steps."""
+        while True:
+            pending = [task for task in self.tasks if not task.done()]
+            if not pending:
+                return dict(self.results)
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def cancel(self):
+        self.cancelled = True
+        for task in self.tasks:
+            task.cancel()
@@ -1,65 +1,130 @@
 """
 Run this LOCALLY before deploying to Cloud Run.
 YouTube blocks transcript scraping from GCP IPs, so we pre-cache them here.
-Cached JSON files get bundled into the Docker image.
+Transcripts are written to the SQLite transcript store (transcripts.db),
+which gets bundled into the Docker image.
+
+The video list comes from a manifest (one video id per line, or a JSON
+list) or, by default, from the problem catalog in frontend/problems.js.
+Each transcript is committed to the store as soon as it is fetched, so an
+interrupted run resumes where it left off.
 
 Usage:
     cd backend
     python prefetch_transcripts.py
+    python prefetch_transcripts.py --manifest videos.txt --concurrency 8
 """
 
+import argparse
+import asyncio
 import json
-import os
+import random
+import re
+import time
 from pathlib import Path
+from typing import List, Optional
+
 from youtube_transcript_api import YouTubeTranscriptApi
 
-VIDEO_IDS = [
-    "KLlXCFG5TnA",  # Two Sum
-    "WTzjTskDFMg",  # Valid Parentheses
-    "G0_I-ZF0S38",  # Reverse Linked List
-    "1pkOgXD63yU",  # Best Time to Buy and Sell Stock
-    "3OamzN90kPg",  # Contains Duplicate
-    "5WZl3MMT0Eg",  # Maximum Subarray
-    "bNvIQI2wAjk",  # Product of Array Except Self
-    "jzZsG8n2R9A",  # 3Sum
+from transcript_store import TranscriptStore
+
+BASE_DIR = Path(__file__).resolve().parent
+DB_PATH = BASE_DIR / "transcripts.db"
+
+# problems.js lives in frontend/ next to backend/ locally, and in /app/frontend in the image
+CATALOG_CANDIDATES = [
+    BASE_DIR.parent / "frontend" / "problems.js",
+    BASE_DIR / "frontend" / "problems.js",
 ]
 
-CACHE_DIR = Path(__file__).parent / "transcripts_cache"
-CACHE_DIR.mkdir(exist_ok=True)
+VIDEO_ID_PATTERN = re.compile(r"videoId:\s*['\"]([\w-]{11})['\"]")
 
 
-def fetch_and_cache(video_id: str):
-    cache_file = CACHE_DIR / f"{video_id}.json"
+def load_video_ids(manifest: Optional[Path] = None) -> List[str]:
+    """Read video ids from a manifest file or the problem catalog."""
+    if manifest:
+        text = manifest.read_text()
+        if manifest.suffix == ".json":
+            ids = json.loads(text)
+        else:
+            ids = [line.split("#")[0].strip() for line in text.splitlines()]
+    else:
+        catalog = next((p for p in CATALOG_CANDIDATES if p.exists()), None)
+        if catalog is None:
+            raise SystemExit("No manifest given and frontend/problems.js not found.")
+        ids = VIDEO_ID_PATTERN.findall(catalog.read_text())
 
-    if cache_file.exists():
-        print(f"  ✅ Already cached: {video_id}")
-        return True
+    # Preserve order, drop blanks and duplicates
+    return list(dict.fromkeys(vid for vid in ids if vid))
 
-    try:
-        segments = YouTubeTranscriptApi.get_transcript(video_id)
-        data = {
-            "video_id": video_id,
-            "segments": [
-                {"start": s["start"], "duration": s["duration"], "text": s["text"]}
-                for s in segments
-            ],
-            "full_text": " ".join(s["text"] for s in segments),
-        }
-        with open(cache_file, "w") as f:
-            json.dump(data, f, indent=2)
-        print(f"  ✅ Fetched {len(segments)} segments: {video_id}")
-        return True
-    except Exception as e:
-        print(f"  ❌ Failed {video_id}: {e}")
-        return False
 
+async def fetch_with_retry(video_id: str, retries: int, base_delay: float):
+    """Fetch one transcript, retrying with exponential backoff and jitter."""
+    for attempt in range(retries + 1):
+        try:
+            return await asyncio.to_thread(YouTubeTranscriptApi.get_transcript, video_id)
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = base_delay * (2 ** attempt) + random.uniform(0, base_delay)
+            print(f"  ⚠️ {video_id} attempt {attempt + 1} failed ({e}); retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
 
-if __name__ == "__main__":
-    print(f"Pre-fetching transcripts into {CACHE_DIR}\n")
-    success = 0
-    for vid in VIDEO_IDS:
-        if fetch_and_cache(vid):
-            success += 1
 
-    print(f"\n{success}/{len(VIDEO_IDS)} transcripts cached.")
+async def prefetch(video_ids: List[str], store: TranscriptStore, concurrency: int,
+                   retries: int, base_delay: float) -> dict:
+    stats = {"cached": 0, "fetched": 0, "failed": 0, "segments": 0}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def worker(video_id: str):
+        # The store doubles as the checkpoint: anything already in it is done
+        if store.has(video_id):
+            stats["cached"] += 1
+            return
+
+        async with semaphore:
+            try:
+                segments = await fetch_with_retry(video_id, retries, base_delay)
+            except Exception as e:
+                stats["failed"] += 1
+                print(f"  ❌ Failed {video_id}: {e}")
+                return
+
+        count = await asyncio.to_thread(store.put, video_id, segments, "prefetch")
+        stats["fetched"] += 1
+        stats["segments"] += count
+        print(f"  ✅ Fetched {count} segments: {video_id}")
+
+    await asyncio.gather(*(worker(vid) for vid in video_ids))
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-fetch YouTube transcripts into the transcript store.")
+    parser.add_argument("--manifest", type=Path, help="File with video ids (one per line, or a JSON list)")
+    parser.add_argument("--db", type=Path, default=DB_PATH, help="Transcript store path")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum parallel fetches")
+    parser.add_argument("--retries", type=int, default=3, help="Retries per video after the first attempt")
+    parser.add_argument("--backoff", type=float, default=1.0, help="Base backoff delay in seconds")
+    args = parser.parse_args()
+
+    video_ids = load_video_ids(args.manifest)
+    store = TranscriptStore(args.db)
+
+    print(f"Pre-fetching {len(video_ids)} transcripts into {args.db} "
+          f"(concurrency={args.concurrency})\n")
+    started = time.perf_counter()
+    stats = asyncio.run(prefetch(video_ids, store, args.concurrency, args.retries, args.backoff))
+    elapsed = time.perf_counter() - started
+
+    rate = stats["fetched"] / elapsed if elapsed > 0 else 0.0
+    print(f"\n{stats['cached'] + stats['fetched']}/{len(video_ids)} transcripts cached "
+          f"({stats['fetched']} fetched, {stats['cached']} already stored, {stats['failed']} failed).")
+    print(f"Fetched {stats['segments']} segments in {elapsed:.1f}s ({rate:.2f} videos/s).")
+    if stats["failed"]:
+        print("Re-run the same command to resume — stored transcripts are skipped.")
     print("Now redeploy to Cloud Run — transcripts will be bundled in the image.")
+
+
+if __name__ == "__main__":
+    main()
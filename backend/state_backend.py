@@ -0,0 +1,202 @@
+"""
+Shared code-context state and pub/sub, so the app can run as several
+workers or instances.
+
+Each worker keeps a local mirror of the code context (for prompts and
+snapshots) and owns its own WebSocket connections. Context updates go
+through a state backend: the publisher stores the new file record and
+publishes an event, and every subscribed worker (the publisher included)
+applies it to its mirror and broadcasts to its own clients.
+
+STATE_BACKEND_URL selects the backend:
+    memory://               default; one process, events delivered in-process
+    redis://host:6379/0     any Redis-compatible server (Redis, Valkey, a local
+                            redis-server as stand-in); needs the `redis` package
+
+Only one process should watch the workspace and publish; acquire_lease()
+elects it, and another worker takes over when the lease expires.
+"""
+
+import asyncio
+import json
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from tracing import log
+
+EventHandler = Callable[[Dict], Awaitable[None]]
+
+# Backoff between pub/sub reconnect attempts, in seconds
+RESUBSCRIBE_MIN_DELAY = 0.5
+RESUBSCRIBE_MAX_DELAY = 30.0
+
+# Renew a lease only if this owner still holds it, in one atomic step
+RENEW_LEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('expire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# Delete a lease only if this owner still holds it
+RELEASE_LEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+async def dispatch(handlers: List[EventHandler], event: Dict):
+    """Run every handler; one failing handler doesn't stop the others."""
+    for handler in handlers:
+        try:
+            await handler(event)
+        except Exception as e:
+            log("state_event_handler_failed", level="error",
+                handler=getattr(handler, "__name__", repr(handler)),
+                filename=event.get("filename"), error=str(e))
+
+
+class MemoryStateBackend:
+    """Single-process backend: a dict plus direct calls to subscribers."""
+
+    def __init__(self):
+        self.files: Dict[str, Dict] = {}
+        self.handlers: List[EventHandler] = []
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def load_files(self) -> Dict[str, Dict]:
+        return dict(self.files)
+
+    async def publish_file(self, filename: str, record: Dict, evicted: List[str]):
+        self.files[filename] = record
+        for name in evicted:
+            self.files.pop(name, None)
+        event = {"filename": filename, "record": record, "evicted": evicted}
+        await dispatch(self.handlers, event)
+
+    def subscribe(self, handler: EventHandler):
+        self.handlers.append(handler)
+
+    async def acquire_lease(self, name: str, owner: str, ttl: int) -> bool:
+        return True
+
+    async def release_lease(self, name: str, owner: str):
+        pass
+
+
+class RedisStateBackend:
+    """Redis-compatible backend: file records in a hash, updates on a channel."""
+
+    def __init__(self, url: str, prefix: str = "velocity"):
+        import redis.asyncio as redis  # optional dependency, only for this backend
+
+        self.client = redis.from_url(url, decode_responses=True)
+        self.files_key = f"{prefix}:context:files"
+        self.channel = f"{prefix}:context:updates"
+        self.lease_prefix = f"{prefix}:lease:"
+        self.handlers: List[EventHandler] = []
+        self._renew_lease = self.client.register_script(RENEW_LEASE_SCRIPT)
+        self._release_lease = self.client.register_script(RELEASE_LEASE_SCRIPT)
+        self._listener: Optional[asyncio.Task] = None
+        self._pubsub = None
+
+    async def start(self):
+        """Subscribe (raising if the server is unreachable), then listen in the background.
+
+        Register handlers with subscribe() first so no early event is missed.
+        """
+        await self._subscribe()
+        self._listener = asyncio.create_task(self._listen())
+
+    async def close(self):
+        if self._listener:
+            self._listener.cancel()
+        await self._drop_pubsub()
+        await self.client.aclose()
+
+    async def _subscribe(self):
+        self._pubsub = self.client.pubsub()
+        await self._pubsub.subscribe(self.channel)
+
+    async def _drop_pubsub(self):
+        pubsub, self._pubsub = self._pubsub, None
+        if pubsub is not None:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass  # the connection is already gone
+
+    async def _listen(self):
+        """Deliver channel events to handlers, resubscribing with backoff if the connection drops."""
+        delay = RESUBSCRIBE_MIN_DELAY
+        while True:
+            try:
+                if self._pubsub is None:
+                    await self._subscribe()
+                    log("state_backend_resubscribed", channel=self.channel)
+                    await self._replay_files()
+                async for message in self._pubsub.listen():
+                    delay = RESUBSCRIBE_MIN_DELAY
+                    if message.get("type") != "message":
+                        continue
+                    try:
+                        event = json.loads(message["data"])
+                    except ValueError as e:
+                        log("state_event_invalid", level="warning", error=str(e))
+                        continue
+                    await dispatch(self.handlers, event)
+                log("state_backend_disconnected", level="warning", channel=self.channel, error="stream ended")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log("state_backend_disconnected", level="warning", channel=self.channel,
+                    error=str(e), retry_in=delay)
+            await self._drop_pubsub()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RESUBSCRIBE_MAX_DELAY)
+
+    async def _replay_files(self):
+        """Re-deliver stored records after a reconnect; handlers skip versions they already have."""
+        for filename, record in (await self.load_files()).items():
+            await dispatch(self.handlers, {"filename": filename, "record": record, "evicted": []})
+
+    async def load_files(self) -> Dict[str, Dict]:
+        raw = await self.client.hgetall(self.files_key)
+        return {name: json.loads(record) for name, record in raw.items()}
+
+    async def publish_file(self, filename: str, record: Dict, evicted: List[str]):
+        event = {"filename": filename, "record": record, "evicted": evicted}
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.hset(self.files_key, filename, json.dumps(record))
+            if evicted:
+                pipe.hdel(self.files_key, *evicted)
+            pipe.publish(self.channel, json.dumps(event))
+            await pipe.execute()
+
+    def subscribe(self, handler: EventHandler):
+        self.handlers.append(handler)
+
+    async def acquire_lease(self, name: str, owner: str, ttl: int) -> bool:
+        """Take or renew a named lease; True while this owner holds it."""
+        key = self.lease_prefix + name
+        if await self.client.set(key, owner, nx=True, ex=ttl):
+            return True
+        return bool(await self._renew_lease(keys=[key], args=[owner, ttl]))
+
+    async def release_lease(self, name: str, owner: str):
+        """Give up a lease early so another worker can take it."""
+        await self._release_lease(keys=[self.lease_prefix + name], args=[owner])
+
+
+def create_state_backend(url: str):
+    if url.startswith("memory://"):
+        return MemoryStateBackend()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisStateBackend(url)
+    raise ValueError(f"Unsupported STATE_BACKEND_URL: {url}")
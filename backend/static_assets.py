@@ -0,0 +1,92 @@
+"""
+Precompressed, cache-validated frontend assets.
+
+compress_assets.py runs at image build time: it stamps /static/ URLs in the
+HTML pages with ?v=<content hash> and writes name.br / name.gz next to each
+text asset. At request time the smallest variant the client accepts is
+served with Content-Encoding and Vary: Accept-Encoding. ETag and
+Last-Modified come from the variant actually sent, so conditional requests
+get a 304. Versioned URLs (?v=...) are cached as immutable for a year;
+everything else is "no-cache", so browsers revalidate and usually get a 304.
+"""
+
+import os
+from email.utils import parsedate
+from mimetypes import guess_type
+from pathlib import Path
+from typing import Optional, Set
+from urllib.parse import parse_qs
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+# Preferred first
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+
+
+def accepted_encodings(header: Optional[str]) -> Set[str]:
+    """Codings from an Accept-Encoding header, minus any refused with q=0."""
+    accepted = set()
+    for part in (header or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = params.strip()
+        if quality.startswith("q=") and quality[2:].strip() in ("0", "0.0", "0.00", "0.000"):
+            continue
+        if coding:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def is_not_modified(response_headers: Headers, request_headers: Headers) -> bool:
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return if_none_match.strip() == "*" or response_headers["etag"] in tags
+
+    if_modified_since = parsedate(request_headers.get("if-modified-since", ""))
+    last_modified = parsedate(response_headers.get("last-modified", ""))
+    return bool(if_modified_since and last_modified and if_modified_since >= last_modified)
+
+
+def asset_response(path: Path, request_headers: Headers, versioned: bool = False,
+                   status_code: int = 200) -> Response:
+    """Serve path (or its best precompressed variant) with caching headers."""
+    accepted = accepted_encodings(request_headers.get("accept-encoding"))
+    chosen, encoding = path, None
+    for coding, suffix in ENCODINGS:
+        candidate = path.with_name(path.name + suffix)
+        if coding in accepted and candidate.is_file():
+            chosen, encoding = candidate, coding
+            break
+
+    headers = {
+        "Vary": "Accept-Encoding",
+        "Cache-Control": IMMUTABLE_CACHE if versioned else REVALIDATE_CACHE,
+    }
+    if encoding:
+        headers["Content-Encoding"] = encoding
+
+    response = FileResponse(
+        chosen,
+        status_code=status_code,
+        headers=headers,
+        media_type=guess_type(path.name)[0] or "text/plain",
+        stat_result=os.stat(chosen),
+    )
+    if status_code == 200 and is_not_modified(response.headers, request_headers):
+        return NotModifiedResponse(response.headers)
+    return response
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles that serves .br/.gz variants and sets cache headers."""
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope,
+                      status_code: int = 200) -> Response:
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        return asset_response(Path(full_path), Headers(scope=scope), "v" in query, status_code)
@@ -0,0 +1,102 @@
+"""
+Request traces and structured logs.
+
+Every HTTP request and every /ws message gets a Trace: an id plus
+timestamped stage marks (milliseconds since the trace began), e.g.
+
+    received -> started -> context_built -> upstream_start -> first_token -> done -> sent
+
+The active trace lives in a contextvar, so code deep inside a request
+(prompt assembly, the Gemini call, worker threads started with
+asyncio.to_thread) can mark stages without the trace being passed around.
+log() writes one JSON object per line to stdout, tagged with the active
+trace id.
+"""
+
+import contextvars
+import json
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("trace", default=None)
+
+
+def log(event: str, level: str = "info", **fields):
+    """Write one structured log line."""
+    record = {
+        "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+        "level": level,
+        "event": event,
+    }
+    trace = _current_trace.get()
+    if trace is not None:
+        record["trace_id"] = trace.trace_id
+    record.update(fields)
+    sys.stdout.write(json.dumps(record, default=str) + "\n")
+    sys.stdout.flush()
+
+
+class Trace:
+    """Stage timeline for one request or /ws message."""
+
+    def __init__(self, kind: str, name: str, trace_id: Optional[str] = None, debug: bool = False, **attrs):
+        self.trace_id = trace_id or uuid.uuid4().hex[:16]
+        self.kind = kind
+        self.name = name
+        self.debug = debug  # echo the timeline back to the client
+        self.attrs = attrs
+        self.started = time.perf_counter()
+        self.stages: List[Tuple[str, float]] = []
+        self.awaiting_send = False
+        self.finished = False
+
+    def mark(self, stage: str):
+        if not self.finished:
+            self.stages.append((stage, round((time.perf_counter() - self.started) * 1000, 2)))
+
+    def to_dict(self) -> Dict:
+        return {"trace_id": self.trace_id, "stages": [[stage, ms] for stage, ms in self.stages]}
+
+    def finish(self, **fields):
+        """Log the completed timeline once."""
+        if self.finished:
+            return
+        self.finished = True
+        duration = round((time.perf_counter() - self.started) * 1000, 2)
+        record = {
+            "kind": self.kind,
+            "name": self.name,
+            "duration_ms": duration,
+            "stages": self.to_dict()["stages"],
+            **self.attrs,
+            **fields,
+        }
+        token = _current_trace.set(self)
+        try:
+            log("trace", **record)
+        finally:
+            _current_trace.reset(token)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def mark(stage: str):
+    """Mark a stage on the active trace, if any."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.mark(stage)
+
+
+@contextmanager
+def use_trace(trace: Trace):
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
@@ -0,0 +1,109 @@
+"""
+Lexical retrieval over time-stamped transcript chunks.
+
+Transcripts are grouped into fixed-length chunks when they are stored, and
+each chunk's term frequencies are saved alongside it. At query time the
+chunks are ranked with BM25 against the question, blended with how close
+each chunk is to the user's current playback position.
+"""
+
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Optional
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "can", "do", "does",
+    "for", "from", "how", "i", "if", "in", "is", "it", "its", "just", "me", "my",
+    "of", "on", "or", "so", "that", "the", "then", "there", "this", "to", "um",
+    "uh", "was", "we", "what", "when", "where", "which", "why", "will", "with",
+    "you", "your", "okay", "like",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+
+def build_chunks(segments: List[Dict], chunk_seconds: float = 45.0) -> List[Dict]:
+    """Group consecutive segments into ~chunk_seconds spans with term counts."""
+    chunks = []
+    current: List[Dict] = []
+
+    def flush():
+        text = " ".join(s['text'] for s in current)
+        last = current[-1]
+        chunks.append({
+            'start': current[0]['start'],
+            'end': last['start'] + last['duration'],
+            'text': text,
+            'terms': dict(Counter(tokenize(text))),
+        })
+
+    for segment in segments:
+        if current and segment['start'] - current[0]['start'] >= chunk_seconds:
+            flush()
+            current = []
+        current.append(segment)
+    if current:
+        flush()
+    return chunks
+
+
+class ChunkIndex:
+    """BM25 index over one video's chunks."""
+
+    def __init__(self, chunks: List[Dict], k1: float = 1.5, b: float = 0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        self.lengths = [sum(c['terms'].values()) for c in chunks]
+        self.avg_length = (sum(self.lengths) / len(chunks)) if chunks else 0.0
+
+        doc_freq: Counter = Counter()
+        for chunk in chunks:
+            doc_freq.update(chunk['terms'].keys())
+        n = len(chunks)
+        self.idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for term, df in doc_freq.items()
+        }
+
+    def bm25(self, query_terms: List[str], i: int) -> float:
+        terms = self.chunks[i]['terms']
+        norm = self.k1 * (1 - self.b + self.b * self.lengths[i] / (self.avg_length or 1))
+        score = 0.0
+        for term in query_terms:
+            tf = terms.get(term, 0)
+            if tf:
+                score += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+        return score
+
+    def search(self, query: str, top_k: int = 4, current_time: Optional[float] = None,
+               time_weight: float = 0.5, time_scale: float = 60.0) -> List[Dict]:
+        """Return the top_k chunks for a query, in chronological order.
+
+        BM25 scores are normalized to [0, 1]; when current_time is given each
+        chunk also earns up to time_weight for being near that position.
+        """
+        if not self.chunks:
+            return []
+
+        query_terms = list(dict.fromkeys(tokenize(query)))
+        scores = [self.bm25(query_terms, i) for i in range(len(self.chunks))]
+        best = max(scores) or 1.0
+        scores = [s / best for s in scores]
+
+        if current_time is not None:
+            for i, chunk in enumerate(self.chunks):
+                if chunk['start'] <= current_time <= chunk['end']:
+                    distance = 0.0
+                else:
+                    distance = min(abs(current_time - chunk['start']), abs(current_time - chunk['end']))
+                scores[i] += time_weight / (1 + distance / time_scale)
+
+        ranked = sorted(range(len(self.chunks)), key=lambda i: scores[i], reverse=True)
+        top = sorted(ranked[:top_k], key=lambda i: self.chunks[i]['start'])
+        return [self.chunks[i] for i in top]
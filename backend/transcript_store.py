@@ -0,0 +1,284 @@
+"""
+SQLite-backed transcript store.
+
+Every transcript source (prefetch script, official API, scraper, Whisper)
+writes into one normalized schema instead of per-video JSON files. Segments
+are indexed by (video_id, start) so lookups and time-window queries are
+index range scans rather than whole-file parses. Each transcript is also
+stored as time-stamped chunks with term counts for BM25 retrieval (see
+transcript_search.py).
+
+Migrate the legacy JSON files from transcripts_cache/:
+    cd backend
+    python transcript_store.py migrate
+"""
+
+import bisect
+import json
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+from transcript_search import ChunkIndex, build_chunks
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    video_id      TEXT PRIMARY KEY,
+    method        TEXT NOT NULL,
+    segment_count INTEGER NOT NULL,
+    created_at    TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS segments (
+    video_id TEXT NOT NULL REFERENCES videos(video_id) ON DELETE CASCADE,
+    seq      INTEGER NOT NULL,
+    start    REAL NOT NULL,
+    duration REAL NOT NULL,
+    text     TEXT NOT NULL,
+    PRIMARY KEY (video_id, seq)
+);
+
+CREATE INDEX IF NOT EXISTS idx_segments_video_start ON segments(video_id, start);
+
+CREATE TABLE IF NOT EXISTS chunks (
+    video_id TEXT NOT NULL REFERENCES videos(video_id) ON DELETE CASCADE,
+    seq      INTEGER NOT NULL,
+    start    REAL NOT NULL,
+    "end"    REAL NOT NULL,
+    text     TEXT NOT NULL,
+    terms    TEXT NOT NULL,  -- JSON {term: count}
+    PRIMARY KEY (video_id, seq)
+);
+"""
+
+
+def normalize_segments(raw: Iterable[Dict]) -> List[Dict]:
+    """Coerce segments from any source into {start, duration, text} dicts."""
+    segments = []
+    for entry in raw:
+        text = (entry.get('text') or '').strip()
+        if not text:
+            continue
+        segments.append({
+            'start': float(entry.get('start', 0) or 0),
+            'duration': float(entry.get('duration', 2.0) or 0),
+            'text': text,
+        })
+    segments.sort(key=lambda s: s['start'])
+    return segments
+
+
+class SegmentIndex:
+    """One video's segments with a sorted start-time index for bisect lookups."""
+
+    def __init__(self, segments: List[Dict], method: Optional[str] = None):
+        self.method = method
+        self.segments = sorted(segments, key=lambda s: s['start'])
+        self.starts = [s['start'] for s in self.segments]
+        self.full_text = " ".join(s['text'] for s in self.segments)
+
+    def __len__(self) -> int:
+        return len(self.segments)
+
+    def window(self, start: float, end: float) -> List[Dict]:
+        """Segments whose start time falls within [start, end], in O(log n)."""
+        lo = bisect.bisect_left(self.starts, start)
+        hi = bisect.bisect_right(self.starts, end)
+        return self.segments[lo:hi]
+
+
+class TranscriptStore:
+    """Transcript segments for all videos in a single SQLite database."""
+
+    def __init__(self, db_path: Path, index_cache_size: int = 64):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.index_cache_size = index_cache_size
+        self._indexes: OrderedDict = OrderedDict()  # (kind, video_id) -> index
+        self._indexes_lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(str(self.db_path), timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys=ON")
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def has(self, video_id: str) -> bool:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT 1 FROM videos WHERE video_id = ?", (video_id,)
+            ).fetchone()
+        return row is not None
+
+    def video_ids(self) -> List[str]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT video_id FROM videos ORDER BY video_id").fetchall()
+        return [row['video_id'] for row in rows]
+
+    def get(self, video_id: str) -> Optional[Dict]:
+        """Return {video_id, method, segments} or None if not stored."""
+        with self._connect() as conn:
+            video = conn.execute(
+                "SELECT video_id, method FROM videos WHERE video_id = ?", (video_id,)
+            ).fetchone()
+            if video is None:
+                return None
+            rows = conn.execute(
+                "SELECT start, duration, text FROM segments WHERE video_id = ? ORDER BY seq",
+                (video_id,),
+            ).fetchall()
+        return {
+            'video_id': video['video_id'],
+            'method': video['method'],
+            'segments': [dict(row) for row in rows],
+        }
+
+    def _cached_index(self, key, build: Callable):
+        """LRU cache shared by the segment and chunk indexes."""
+        with self._indexes_lock:
+            index = self._indexes.get(key)
+            if index is not None:
+                self._indexes.move_to_end(key)
+                return index
+
+        index = build()
+        if index is None:
+            return None
+
+        with self._indexes_lock:
+            self._indexes[key] = index
+            while len(self._indexes) > self.index_cache_size:
+                self._indexes.popitem(last=False)
+        return index
+
+    def _invalidate(self, video_id: str):
+        with self._indexes_lock:
+            self._indexes.pop(("segments", video_id), None)
+            self._indexes.pop(("chunks", video_id), None)
+
+    def is_index_cached(self, video_id: str) -> bool:
+        with self._indexes_lock:
+            return ("segments", video_id) in self._indexes
+
+    def get_index(self, video_id: str) -> Optional[SegmentIndex]:
+        """Return an in-memory SegmentIndex for a video (LRU-cached)."""
+        def build():
+            stored = self.get(video_id)
+            return SegmentIndex(stored['segments'], stored['method']) if stored else None
+        return self._cached_index(("segments", video_id), build)
+
+    def get_chunk_index(self, video_id: str) -> Optional[ChunkIndex]:
+        """Return the BM25 ChunkIndex for a video (LRU-cached)."""
+        def build():
+            with self._connect() as conn:
+                rows = conn.execute(
+                    'SELECT start, "end", text, terms FROM chunks WHERE video_id = ? ORDER BY seq',
+                    (video_id,),
+                ).fetchall()
+            if not rows:
+                # Stored before chunking existed; index it now
+                stored = self.get(video_id)
+                if not stored:
+                    return None
+                chunks = self._write_chunks(video_id, stored['segments'])
+            else:
+                chunks = [
+                    {'start': r['start'], 'end': r['end'], 'text': r['text'], 'terms': json.loads(r['terms'])}
+                    for r in rows
+                ]
+            return ChunkIndex(chunks)
+        return self._cached_index(("chunks", video_id), build)
+
+    def _write_chunks(self, video_id: str, segments: List[Dict], conn=None) -> List[Dict]:
+        chunks = build_chunks(segments)
+        rows = [
+            (video_id, seq, c['start'], c['end'], c['text'], json.dumps(c['terms']))
+            for seq, c in enumerate(chunks)
+        ]
+        sql = 'INSERT OR REPLACE INTO chunks (video_id, seq, start, "end", text, terms) VALUES (?, ?, ?, ?, ?, ?)'
+        if conn is not None:
+            conn.executemany(sql, rows)
+        else:
+            with self._connect() as conn:
+                conn.executemany(sql, rows)
+        return chunks
+
+    def put(self, video_id: str, segments: Iterable[Dict], method: str) -> int:
+        """Replace the stored transcript for a video. Returns the segment count."""
+        segments = normalize_segments(segments)
+        with self._connect() as conn:
+            conn.execute("DELETE FROM videos WHERE video_id = ?", (video_id,))
+            conn.execute(
+                "INSERT INTO videos (video_id, method, segment_count, created_at) VALUES (?, ?, ?, ?)",
+                (video_id, method, len(segments), datetime.now().isoformat()),
+            )
+            conn.executemany(
+                "INSERT INTO segments (video_id, seq, start, duration, text) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (video_id, seq, s['start'], s['duration'], s['text'])
+                    for seq, s in enumerate(segments)
+                ],
+            )
+            self._write_chunks(video_id, segments, conn)
+        self._invalidate(video_id)
+        return len(segments)
+
+    def migrate_json_dir(self, directory: Path) -> int:
+        """Import legacy {video_id}.json caches not yet in the store.
+
+        Handles both the prefetch format ({video_id, segments, full_text})
+        and the bare segment list written by the old Whisper path.
+        """
+        directory = Path(directory)
+        if not directory.exists():
+            return 0
+
+        migrated = 0
+        for json_file in sorted(directory.glob("*.json")):
+            video_id = json_file.stem
+            if self.has(video_id):
+                continue
+            try:
+                with open(json_file, 'r') as f:
+                    data = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"⚠️ Skipping unreadable transcript cache {json_file.name}: {e}")
+                continue
+
+            if isinstance(data, dict):
+                segments = data.get('segments') or []
+                method = data.get('method', 'prefetch')
+            else:
+                segments = data
+                method = 'whisper'
+
+            self.put(video_id, segments, method)
+            migrated += 1
+        return migrated
+
+
+if __name__ == "__main__":
+    base_dir = Path(__file__).resolve().parent
+    if len(sys.argv) < 2 or sys.argv[1] != "migrate":
+        print("Usage: python transcript_store.py migrate [cache_dir] [db_path]")
+        sys.exit(1)
+
+    cache_dir = Path(sys.argv[2]) if len(sys.argv) > 2 else base_dir / "transcripts_cache"
+    db_path = Path(sys.argv[3]) if len(sys.argv) > 3 else base_dir / "transcripts.db"
+    store = TranscriptStore(db_path)
+    count = store.migrate_json_dir(cache_dir)
+    print(f"Migrated {count} transcript(s) from {cache_dir} into {db_path}")
@@ -0,0 +1,182 @@
+"""
+Pruned, ignore-aware workspace watching.
+
+A single recursive watch over WORKSPACE_DIR also covers node_modules, .venv
+and build output. PrunedWatcher instead gives the workspace root a
+non-recursive watch, plus one recursive watch per non-ignored top-level
+directory. Ignored top-level trees are never watched. Deeper ignored paths
+are dropped by the event handler using the same rules.
+
+With watchdog's inotify backend every scheduled watch is its own inotify
+instance and thread (fs.inotify.max_user_instances is often 128). So the
+number of watches is capped (WATCH_MAX_ROOTS in app.py). Past that, one recursive
+watch on the root is used instead.
+
+Ignore rules come from built-in defaults, the workspace .gitignore and an
+optional .velocityignore (or WATCH_IGNORE_FILE). They use a practical
+subset of gitignore syntax: `#` comments, `!` negation, trailing `/` for
+directories, leading `/` to anchor at the workspace root, and fnmatch globs.
+"""
+
+import fnmatch
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_IGNORES = [
+    ".*",
+    "node_modules/",
+    "__pycache__/",
+    ".venv/",
+    "venv/",
+    "transcripts_cache/",
+]
+
+BINARY_SNIFF_BYTES = 8192
+
+# Most watches to schedule before falling back to one recursive watch on the
+# root; each is an inotify instance, and the default per-user limit is 128
+DEFAULT_MAX_ROOTS = 64
+
+
+class IgnoreRules:
+    """gitignore-style matcher over workspace-relative POSIX paths."""
+
+    def __init__(self, patterns: Iterable[str]):
+        # (pattern, negated, dir_only, anchored)
+        self.rules: List[Tuple[str, bool, bool, bool]] = []
+        for raw in patterns:
+            line = raw.strip()
+            if not line or line.startswith('#'):
+                continue
+            negated = line.startswith('!')
+            if negated:
+                line = line[1:]
+            dir_only = line.endswith('/')
+            line = line.rstrip('/')
+            anchored = line.startswith('/') or '/' in line
+            line = line.lstrip('/')
+            if line:
+                self.rules.append((line, negated, dir_only, anchored))
+
+    @classmethod
+    def for_workspace(cls, root: Path, extra_file: Optional[Path] = None) -> "IgnoreRules":
+        patterns = list(DEFAULT_IGNORES)
+        for path in (root / ".gitignore", root / ".velocityignore", extra_file):
+            if path and path.is_file():
+                patterns.extend(path.read_text(encoding='utf-8', errors='ignore').splitlines())
+        return cls(patterns)
+
+    def _matches(self, rel_path: str, is_dir: bool) -> Optional[bool]:
+        result = None
+        name = rel_path.rsplit('/', 1)[-1]
+        for pattern, negated, dir_only, anchored in self.rules:
+            if dir_only and not is_dir:
+                continue
+            target = rel_path if anchored else name
+            if fnmatch.fnmatchcase(target, pattern):
+                result = not negated
+        return result
+
+    def is_ignored(self, rel_path: str, is_dir: bool = False) -> bool:
+        """True if the path or any of its parent directories is ignored."""
+        parts = rel_path.split('/')
+        for i in range(1, len(parts)):
+            if self._matches('/'.join(parts[:i]), True):
+                return True
+        return bool(self._matches(rel_path, is_dir))
+
+
+class PrunedWatcher:
+    """Watches the workspace root plus one recursive watch per non-ignored top-level directory."""
+
+    def __init__(self, observer, handler, root: Path, rules: IgnoreRules, max_roots: int = DEFAULT_MAX_ROOTS):
+        self.observer = observer
+        self.handler = handler
+        self.root = root
+        self.rules = rules
+        self.max_roots = max_roots
+        self.watched: Dict[str, Any] = {}  # watched path -> its ObservedWatch
+        self.fallback = False  # True once the whole root is watched recursively
+        self._lock = threading.Lock()
+
+    def relative(self, path: str) -> Optional[str]:
+        try:
+            return Path(path).relative_to(self.root).as_posix()
+        except ValueError:
+            return None
+
+    def _is_top_level(self, path: str) -> bool:
+        rel = self.relative(path)
+        return rel is not None and rel != '.' and '/' not in rel
+
+    def _schedule(self, path: str, recursive: bool) -> bool:
+        with self._lock:
+            if path in self.watched:
+                return False
+            self.watched[path] = None  # claimed; the watch is filled in below
+        try:
+            watch = self.observer.schedule(self.handler, path, recursive=recursive)
+        except OSError:
+            with self._lock:
+                self.watched.pop(path, None)  # gone before we got to it
+            return False
+        with self._lock:
+            claimed = path in self.watched
+            if claimed:
+                self.watched[path] = watch
+        if not claimed:
+            self.observer.unschedule(watch)  # removed while we were scheduling
+        return claimed
+
+    def _unschedule(self, path: str):
+        with self._lock:
+            watch = self.watched.pop(path, None)
+        if watch is not None:
+            try:
+                self.observer.unschedule(watch)
+            except KeyError:
+                pass  # the emitter already stopped when its directory vanished
+
+    def _use_fallback(self):
+        """Replace every watch with a single recursive watch on the root."""
+        self.fallback = True
+        for path in list(self.watched):
+            self._unschedule(path)
+        self._schedule(str(self.root), recursive=True)
+
+    def add_tree(self, top: Path) -> int:
+        """Watch the workspace at `top`; returns how many watches are scheduled."""
+        subdirs = []
+        with os.scandir(top) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False) and not self.rules.is_ignored(entry.name, is_dir=True):
+                    subdirs.append(entry.path)
+        if len(subdirs) + 1 > self.max_roots:
+            self._use_fallback()
+        else:
+            self._schedule(str(top), recursive=False)
+            for path in subdirs:
+                self._schedule(path, recursive=True)
+        return len(self.watched)
+
+    def on_directory_created(self, path: str):
+        # Deeper directories are already covered by their top-level recursive watch
+        if self.fallback or not self._is_top_level(path):
+            return
+        if self.rules.is_ignored(self.relative(path), is_dir=True):
+            return
+        if len(self.watched) >= self.max_roots:
+            self._use_fallback()
+        else:
+            self._schedule(path, recursive=True)
+
+    def on_directory_removed(self, path: str):
+        if not self.fallback and self._is_top_level(path):
+            self._unschedule(path)
+
+
+def is_probably_binary(path: Path) -> bool:
+    with open(path, 'rb') as f:
+        return b'\0' in f.read(BINARY_SNIFF_BYTES)
@@ -0,0 +1,95 @@
+"""
+Negotiated wire encoding for /ws frames.
+
+Clients that say nothing keep getting JSON text frames. A client can open
+with a hello frame to pick a compact encoding and/or compression:
+
+    {"type": "hello", "encodings": ["msgpack", "json"], "compression": ["deflate"]}
+
+The server picks the first option it supports from each list and answers
+with a JSON text hello naming the choice. Every later frame in both
+directions is then a binary frame: one flag byte (bit 0 set = raw deflate,
+as read by the browser's DecompressionStream("deflate-raw")) followed by
+the encoded message. Frames under COMPRESS_MIN_BYTES are sent uncompressed.
+
+This is for clients whose WebSocket stack doesn't negotiate
+permessage-deflate; browsers already get that from uvicorn at the
+transport level.
+"""
+
+import json
+import zlib
+from typing import Dict, List, Optional, Union
+
+try:
+    import msgpack
+except ImportError:  # optional; without it only JSON is offered
+    msgpack = None
+
+FLAG_DEFLATED = 0x01
+COMPRESS_MIN_BYTES = 512
+# Largest inflated inbound frame; matches uvicorn's default --ws-max-size
+MAX_FRAME_BYTES = 16 * 1024 * 1024
+
+
+def supported_encodings() -> List[str]:
+    return (["msgpack"] if msgpack is not None else []) + ["json"]
+
+
+SUPPORTED_COMPRESSION = ["deflate"]
+
+
+class WireCodec:
+    """Encodes and decodes one connection's frames."""
+
+    def __init__(self, encoding: str = "json", compression: Optional[str] = None):
+        self.encoding = encoding
+        self.compression = compression
+
+    @classmethod
+    def negotiate(cls, hello: Dict) -> "WireCodec":
+        encodings = supported_encodings()
+        encoding = next((e for e in hello.get("encodings") or [] if e in encodings), "json")
+        compression = next(
+            (c for c in hello.get("compression") or [] if c in SUPPORTED_COMPRESSION), None
+        )
+        return cls(encoding, compression)
+
+    @property
+    def binary(self) -> bool:
+        return self.encoding != "json" or self.compression is not None
+
+    def describe(self) -> Dict:
+        return {"encoding": self.encoding, "compression": self.compression}
+
+    def encode(self, message: Dict) -> Union[str, bytes]:
+        if not self.binary:
+            return json.dumps(message, separators=(",", ":"))
+
+        if self.encoding == "msgpack":
+            payload = msgpack.packb(message, use_bin_type=True)
+        else:
+            payload = json.dumps(message, separators=(",", ":")).encode("utf-8")
+
+        if self.compression == "deflate" and len(payload) >= COMPRESS_MIN_BYTES:
+            compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+            return bytes([FLAG_DEFLATED]) + compressor.compress(payload) + compressor.flush()
+        return b"\x00" + payload
+
+    def decode(self, data: Union[str, bytes]) -> Dict:
+        """Decode an inbound frame. Text frames are always JSON."""
+        if isinstance(data, str):
+            return json.loads(data)
+
+        if not data:
+            raise ValueError("Empty frame")
+        flags, payload = data[0], data[1:]
+        if flags & FLAG_DEFLATED:
+            # Bounded, so a small frame can't inflate into a huge one
+            inflater = zlib.decompressobj(-15)
+            payload = inflater.decompress(payload, MAX_FRAME_BYTES)
+            if inflater.unconsumed_tail or not inflater.eof:
+                raise ValueError("Compressed frame is too large or truncated")
+        if self.encoding == "msgpack":
+            return msgpack.unpackb(payload, raw=False)
+        return json.loads(payload)
@@ -32,8 +32,21 @@ const state = {
   currentVideoSegments: null,
   videoRecognition: null,
   isVideoListening: false,
+  transcriptPoll: null, // AbortController for the in-flight transcript long-poll
 };
 
+// Each poll waits up to TRANSCRIPT_WAIT_SECONDS server-side before answering 202
+const TRANSCRIPT_MAX_POLLS = 10;
+
+function cancelTranscriptPoll() {
+  if (state.transcriptPoll) {
+    state.transcriptPoll.abort();
+    state.transcriptPoll = null;
+  }
+}
+
+window.addEventListener('pagehide', cancelTranscriptPoll);
+
 // ===== INITIALIZATION =====
 document.addEventListener('DOMContentLoaded', () => {
   loadProblems();
@@ -84,6 +97,7 @@ function loadProblem(problemKey) {
   const problem = PROBLEMS[problemKey];
   if (!problem) return;
 
+  cancelTranscriptPoll();
   state.currentProblem = problem;
   state.currentProblemKey = problemKey;
 
@@ -132,6 +146,18 @@ function loadProblem(problemKey) {
 
   // Add system message
   addVoiceMessage('system', `📚 Loaded: ${problem.title}`);
+
+  requestPrefetch();
+}
+
+// Ask the backend to warm the transcript, Vela's opening turn and its audio
+// for the open problem. A newer prefetch or closing the socket cancels it.
+function requestPrefetch() {
+  if (!state.isConnected || !state.currentProblemKey) return;
+  state.socket.send(JSON.stringify({
+    type: 'prefetch',
+    problem_id: state.currentProblemKey
+  }));
 }
 
 function updateCodeEditor() {
@@ -220,13 +246,15 @@ function switchMode(mode) {
 function connectWebSocket() {
   const proto = window.location.protocol === 'https:' ? 'wss' : 'ws';
   // Connect to backend server on port 8000
-  const wsUrl = `${proto}://${WS_HOST}/ws`;
+  // patches=1: receive compact context_patch frames instead of full file contents
+  const wsUrl = `${proto}://${WS_HOST}/ws?patches=1`;
 
   state.socket = new WebSocket(wsUrl);
 
   state.socket.addEventListener('open', () => {
     state.isConnected = true;
     updateStatus('connected', 'Connected');
+    requestPrefetch();
   });
 
   state.socket.addEventListener('close', () => {
@@ -260,7 +288,7 @@ function handleWebSocketMessage(data) {
     if (state.isListening) {
       playTTS(data.text);
     }
-  } else if (data.type === 'context_update') {
+  } else if (data.type === 'context_update' || data.type === 'context_patch') {
     addVoiceMessage('system', `📝 Updated: ${data.filename}`);
   } else if (data.type === 'error') {
     addVoiceMessage('system', `❌ Error: ${data.message}`);
@@ -280,7 +308,9 @@ function sendVoiceMessage() {
   state.socket.send(JSON.stringify({
     type: 'user_message',
     text: text,
-    code_context: code || null
+    code_context: code || null,
+    language: state.currentLanguage,
+    problem_id: state.currentProblemKey || null
   }));
 
   input.value = '';
@@ -388,12 +418,20 @@ function startVoiceSession() {
     state.shouldRestart = true;
     state.recognition.start();
 
-    // Vela's greeting with ElevenLabs voice
-    setTimeout(() => {
-      const greeting = "Hi! I'm Vela, your AI pair programming mentor. How can I help you today?";
-      addVoiceMessage('assistant', greeting);
-      playTTS(greeting);
-    }, 1000);
+    // Vela's opening turn for this problem (usually prefetched, so it and its
+    // audio are already warm); a generic greeting when offline
+    if (state.isConnected && state.currentProblemKey) {
+      state.socket.send(JSON.stringify({
+        type: 'opening_turn',
+        problem_id: state.currentProblemKey
+      }));
+    } else {
+      setTimeout(() => {
+        const greeting = "Hi! I'm Vela, your AI pair programming mentor. How can I help you today?";
+        addVoiceMessage('assistant', greeting);
+        playTTS(greeting);
+      }, 1000);
+    }
   } catch (err) {
     console.error('Failed to start voice:', err);
     addVoiceMessage('system', '❌ Failed to start voice session');
@@ -584,10 +622,26 @@ async function loadVideoSolution() {
     }
   });
 
-  // Fetch transcript
+  // Fetch transcript (long-polls while a Whisper job is still running,
+  // until the user leaves the page or opens another problem)
+  cancelTranscriptPoll();
+  const poll = new AbortController();
+  state.transcriptPoll = poll;
   try {
-    const response = await fetch(`${API_BASE}/youtube/transcript/${video.videoId}`);
-    if (response.ok) {
+    const url = `${API_BASE}/youtube/transcript/${video.videoId}`;
+    let response = await fetch(url, { signal: poll.signal });
+    for (let polls = 1; response.status === 202 && polls < TRANSCRIPT_MAX_POLLS; polls++) {
+      response = await fetch(url, { signal: poll.signal });
+    }
+    if (response.status === 202) {
+      state.currentVideoTranscript = null;
+      state.currentVideoSegments = null;
+
+      addVideoMessage(
+        'assistant',
+        `The transcript is still being prepared, but I can still help explain the concepts!`
+      );
+    } else if (response.ok) {
       const data = await response.json();
       state.currentVideoTranscript = data.transcript;
       state.currentVideoSegments = data.segments;
@@ -606,9 +660,12 @@ async function loadVideoSolution() {
       );
     }
   } catch (error) {
+    if (error.name === 'AbortError') return; // user moved on
     console.error('Transcript fetch error:', error);
     state.currentVideoTranscript = null;
     state.currentVideoSegments = null;
+  } finally {
+    if (state.transcriptPoll === poll) state.transcriptPoll = null;
   }
 }
 
@@ -671,8 +728,6 @@ async function sendVideoMessage() {
         body: JSON.stringify({
           video_id: state.currentProblem.solutionVideo.videoId,
           question: text,
-          transcript: state.currentVideoTranscript,
-          segments: state.currentVideoSegments,
           current_time: currentTime
         })
       });
@@ -751,7 +806,7 @@ async function runTests() {
       body: JSON.stringify({
         code: code,
         language: state.currentLanguage,
-        test_cases: state.currentProblem.testCases || []
+        problem_id: state.currentProblemKey
       })
     });
 
@@ -770,7 +825,8 @@ async function runTests() {
       const failedTests = result.results.filter(r => !r.passed);
       failedTests.forEach(test => {
         const errorMsg = test.error ? `\nError: ${test.error}` : '';
-        addVoiceMessage('system', `❌ Test ${test.test_num} failed:\nExpected: ${test.expected}\nGot: ${test.output}${errorMsg}`);
+        const expected = test.hidden ? '(hidden test)' : test.expected;
+        addVoiceMessage('system', `❌ Test ${test.test_num} failed:\nExpected: ${expected}\nGot: ${test.output}${errorMsg}`);
       });
     }
   } catch (error) {
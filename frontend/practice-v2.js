@@ -7,6 +7,19 @@ let currentVideoTranscript = null;
 let currentVideoSegments = null;
 let currentLanguage = 'python';
 let youtubePlayer = null;  // YouTube iframe API player instance
+let transcriptPoll = null;  // AbortController for the in-flight transcript long-poll
+
+// Each poll waits up to TRANSCRIPT_WAIT_SECONDS server-side before answering 202
+const TRANSCRIPT_MAX_POLLS = 10;
+
+function cancelTranscriptPoll() {
+  if (transcriptPoll) {
+    transcriptPoll.abort();
+    transcriptPoll = null;
+  }
+}
+
+window.addEventListener('pagehide', cancelTranscriptPoll);
 
 // Load YouTube iframe API
 const tag = document.createElement('script');
@@ -75,6 +88,7 @@ function setupEventListeners() {
 }
 
 function loadProblem(problemKey) {
+  cancelTranscriptPoll();
   currentProblem = PROBLEMS[problemKey];
   if (!currentProblem) return;
 
@@ -209,10 +223,25 @@ async function loadVideoSolution() {
     }
   });
 
-  // Fetch transcript in background
+  // Fetch transcript in background (long-polls while a Whisper job is still running,
+  // until the user leaves the page or opens another problem)
+  cancelTranscriptPoll();
+  const poll = new AbortController();
+  transcriptPoll = poll;
   try {
-    const response = await fetch(`/youtube/transcript/${video.videoId}`);
-    if (response.ok) {
+    const url = `/youtube/transcript/${video.videoId}`;
+    let response = await fetch(url, { signal: poll.signal });
+    for (let polls = 1; response.status === 202 && polls < TRANSCRIPT_MAX_POLLS; polls++) {
+      response = await fetch(url, { signal: poll.signal });
+    }
+    if (response.status === 202) {
+      currentVideoTranscript = null;
+      currentVideoSegments = null;
+      addChatMessage(
+        `The transcript is still being prepared. I can still help explain the concepts in the meantime!`,
+        'ai'
+      );
+    } else if (response.ok) {
       const data = await response.json();
       currentVideoTranscript = data.transcript;
       currentVideoSegments = data.segments;
@@ -233,6 +262,7 @@ async function loadVideoSolution() {
       );
     }
   } catch (error) {
+    if (error.name === 'AbortError') return;  // user moved on
     console.error('Failed to fetch transcript:', error);
     currentVideoTranscript = null;
     currentVideoSegments = null;
@@ -241,6 +271,8 @@ async function loadVideoSolution() {
       `Couldn't load the transcript, but I can still help! What questions do you have?`,
       'ai'
     );
+  } finally {
+    if (transcriptPoll === poll) transcriptPoll = null;
   }
 }
 
@@ -277,15 +309,13 @@ async function sendChatMessage(message) {
     let answer;
 
     if (currentVideoTranscript) {
-      // Use video-solution endpoint with transcript and timestamp
+      // Use video-solution endpoint; the server loads the transcript by video id
       const response = await fetch(`/video-solution/chat`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
           video_id: currentProblem.solutionVideo.videoId,
           question: message,
-          transcript: currentVideoTranscript,
-          segments: currentVideoSegments,
           current_time: currentTime  // Include timestamp for context
         })
       });